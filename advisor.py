@@ -0,0 +1,353 @@
+import argparse
+import json
+import re
+import sys
+
+import bench
+import cache
+import connect
+import natural
+
+
+# Longest index recommended; every extra column makes writes and the index itself bigger
+MAX_INDEX_COLUMNS = 5
+# MySQL's limit on identifier length
+MAX_NAME_LENGTH = 64
+
+EXISTING_INDEXES_QUERY = """
+SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME
+FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+"""
+
+# A `db`.`table`.`column` reference and the comparison after it, as EXPLAIN prints attached conditions
+_CONDITION = re.compile(r"`\w+`\.`(\w+)`\.`(\w+)`\s*(<=>|<>|!=|>=|<=|=|>|<|\bin\b|\bbetween\b|\blike\b|\bis\b)", re.I)
+# column = column, where the right hand side is an equality on its own table too
+_COLUMN_EQUALITY = re.compile(r"`\w+`\.`\w+`\.`\w+`\s*=\s*`\w+`\.`(\w+)`\.`(\w+)`")
+_SORT_CLAUSE = re.compile(r"\b(?:GROUP|ORDER)\s+BY\s+(.*?)(?=\bHAVING\b|\bORDER\s+BY\b|\bLIMIT\b|\bWINDOW\b|$)", re.I | re.S)
+_SORT_ITEM = re.compile(r"^`?(?:(\w+)`?\.`?)?(\w+)`?(?:\s+(ASC|DESC))?$", re.I)
+EQUALITY_OPERATORS = {'=', '<=>', 'is'}
+RANGE_OPERATORS = {'>', '<', '>=', '<=', 'in', 'between', 'like'}
+
+
+def _nodes(node):
+    """Every dict in an EXPLAIN FORMAT=JSON document."""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _nodes(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _nodes(value)
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def sort_columns(sql: str) -> list:
+    """
+    (table or None, column) pairs of the GROUP BY list, or of the ORDER BY list when
+    there is no grouping. Returns None when the list holds an expression or mixes
+    directions, since no plain index can then produce the order.
+    """
+    clause = _SORT_CLAUSE.search(sql)
+    if not clause:
+        return []
+    columns, directions = [], set()
+    for item in clause.group(1).split(','):
+        match = _SORT_ITEM.match(item.strip())
+        if not match:
+            return None
+        table, column, direction = match.groups()
+        directions.add((direction or 'ASC').upper())
+        if (table, column) not in columns:
+            columns.append((table, column))
+    return columns if len(directions) <= 1 else None
+
+
+def analyze_plan(plan: dict) -> dict:
+    """
+    Summarize an EXPLAIN FORMAT=JSON plan: its cost, whether it sorts or uses a temporary
+    table, and for each table accessed how (access_type), how many rows it reads and keeps,
+    and which columns its conditions compare by equality or by range.
+    """
+    analysis = {'cost': 0.0, 'filesort': False, 'temporary': False, 'tables': []}
+    for node in _nodes(plan):
+        if 'query_cost' in node.get('cost_info', {}) and not analysis['cost']:
+            analysis['cost'] = _number(node['cost_info']['query_cost'])
+        analysis['filesort'] |= node.get('using_filesort') is True
+        analysis['temporary'] |= node.get('using_temporary_table') is True
+        table = node.get('table')
+        if not isinstance(table, dict) or 'table_name' not in table:
+            continue
+        equality, ranges = [], []
+        condition = table.get('attached_condition', '')
+        for table_name, column, operator in _CONDITION.findall(condition):
+            operator = operator.lower()
+            if table_name.lower() != table['table_name'].lower():
+                continue
+            target = equality if operator in EQUALITY_OPERATORS else ranges if operator in RANGE_OPERATORS else None
+            if target is not None and column not in target:
+                target.append(column)
+        for table_name, column in _COLUMN_EQUALITY.findall(condition):
+            if table_name.lower() == table['table_name'].lower() and column not in equality:
+                equality.append(column)
+        analysis['tables'].append({
+            'table': table['table_name'],
+            'access_type': table.get('access_type', ''),
+            'key': table.get('key'),
+            'rows_examined': _number(table.get('rows_examined_per_scan')),
+            'rows_produced': _number(table.get('rows_produced_per_join')),
+            'filtered': _number(table.get('filtered', 100)),
+            'used_columns': list(table.get('used_columns', [])),
+            'equality': equality,
+            'range': [column for column in ranges if column not in equality]
+        })
+    return analysis
+
+
+def index_name(table: str, columns: tuple) -> str:
+    return f"idx_{table}_{'_'.join(columns)}".lower()[:MAX_NAME_LENGTH]
+
+
+class IndexAdvisor:
+    """
+    Collects EXPLAIN plans of a workload and recommends composite indexes for the tables
+    it scans in full or has to sort. Columns go equality first, then the GROUP BY / ORDER BY
+    columns (so the index yields rows in order), then one range column; the rest of the
+    columns a query reads are appended when few enough for the index to cover it.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        # Lower-cased table name -> {index name: lower-cased column tuple}, read on first use
+        self.existing = None
+        self.candidates = {}
+        self.findings = {}
+        self.explained = 0
+        self.failed = []
+
+    def explain(self, sql: str, params: tuple = None) -> dict:
+        rows = list(self.db.stream_rows(f"EXPLAIN FORMAT=JSON {sql}", params))
+        document = rows[0][0]
+        if isinstance(document, (bytes, bytearray)):
+            document = document.decode('utf-8')
+        return json.loads(document)
+
+    def add(self, sql: str, params: tuple = None, weight: int = 1):
+        """EXPLAIN one query, run weight times in the workload, and record what an index could save."""
+        try:
+            analysis = analyze_plan(self.explain(sql, params))
+        except (self.db.backend.Error, ValueError, IndexError) as err:
+            self.failed.append((sql, str(err)))
+            return
+        self.explained += 1
+        if self.existing is None:
+            self.existing = self.existing_indexes()
+        ordering = sort_columns(sql)
+        needs_order = analysis['filesort'] or analysis['temporary']
+        for position, access in enumerate(analysis['tables']):
+            table = access['table']
+            if table.startswith('<'):
+                # Derived tables and subquery results can't be indexed
+                continue
+            full_scan = access['access_type'] in ('ALL', 'index')
+            finding = self.findings.setdefault(table, {'queries': 0, 'full_scans': 0, 'full_index_scans': 0,
+                                                       'rows_examined': 0.0, 'filesorts': 0, 'temporary_tables': 0})
+            finding['queries'] += weight
+            finding['full_scans'] += weight * (access['access_type'] == 'ALL')
+            finding['full_index_scans'] += weight * (access['access_type'] == 'index')
+            finding['rows_examined'] += weight * access['rows_examined']
+            # Only the first table of the join order can hand rows over already sorted
+            sort = []
+            if position == 0 and needs_order:
+                finding['filesorts'] += weight * analysis['filesort']
+                finding['temporary_tables'] += weight * analysis['temporary']
+                used = {column.lower() for column in access['used_columns']}
+                if ordering and all((name or table).lower() == table.lower() and column.lower() in used
+                                    for name, column in ordering):
+                    sort = [column for _, column in ordering]
+            if not full_scan and not sort:
+                continue
+            self._propose(access, sort, sql, weight)
+
+    def _propose(self, access: dict, sort: list, sql: str, weight: int):
+        columns = list(access['equality'])
+        columns += [column for column in sort if column not in columns]
+        columns += [column for column in access['range'] if column not in columns][:1]
+        if not columns:
+            return
+        covering = False
+        # InnoDB secondary indexes already end with the primary key
+        primary = self.existing.get(access['table'].lower(), {}).get('PRIMARY', ())
+        rest = [column for column in access['used_columns'] if column not in columns and column.lower() not in primary]
+        if len(columns) + len(rest) <= MAX_INDEX_COLUMNS:
+            columns += rest
+            covering = bool(access['used_columns'])
+        columns = tuple(columns[:MAX_INDEX_COLUMNS])
+
+        # Rows are only skipped when the index starts with a column the query filters on
+        examined = access['rows_examined']
+        filters = columns[0] in access['equality'] or (not access['equality'] and not sort and columns[0] in access['range'])
+        rows_saved = examined - examined * access['filtered'] / 100 if filters and access['access_type'] == 'ALL' else 0.0
+        entry = self.candidates.setdefault((access['table'], columns), {
+            'table': access['table'], 'columns': columns, 'covering': covering, 'queries': 0,
+            'rows_saved': 0.0, 'sorted_rows': 0.0, 'example': sql})
+        entry['covering'] = entry['covering'] and covering
+        entry['queries'] += weight
+        entry['rows_saved'] += weight * rows_saved
+        entry['sorted_rows'] += weight * access['rows_produced'] * bool(sort)
+
+    def existing_indexes(self) -> dict:
+        """Lower-cased table name -> {index name: lower-cased column tuple} of the indexes it already has."""
+        indexes = {}
+        try:
+            for table, name, column in self.db.stream_rows(EXISTING_INDEXES_QUERY):
+                indexes.setdefault(table.lower(), {}).setdefault(name, []).append(column.lower())
+        except self.db.backend.Error as err:
+            print(f"Could not read the existing indexes: {err}", file=sys.stderr)
+        return {table: {name: tuple(columns) for name, columns in by_name.items()} for table, by_name in indexes.items()}
+
+    def recommendations(self, top: int = None) -> list:
+        """
+        Candidate indexes ranked by estimated benefit: rows no longer examined plus rows
+        no longer sorted, summed over the queries they serve. A candidate that is a prefix
+        of a longer one is folded into it, and ones an existing index already starts with dropped.
+        """
+        existing = self.existing or {}
+        kept = []
+        for candidate in sorted(self.candidates.values(), key=lambda item: -len(item['columns'])):
+            lowered = tuple(column.lower() for column in candidate['columns'])
+            if any(index[:len(lowered)] == lowered for index in existing.get(candidate['table'].lower(), {}).values()):
+                continue
+            longer = [other for other in kept if other['table'] == candidate['table']
+                      and tuple(column.lower() for column in other['columns'][:len(lowered)]) == lowered]
+            if longer:
+                target = max(longer, key=lambda item: item['rows_saved'] + item['sorted_rows'])
+                for field in ('queries', 'rows_saved', 'sorted_rows'):
+                    target[field] += candidate[field]
+                continue
+            kept.append(dict(candidate))
+        for candidate in kept:
+            candidate['benefit'] = candidate['rows_saved'] + candidate['sorted_rows']
+            candidate['name'] = index_name(candidate['table'], candidate['columns'])
+            candidate['ddl'] = f"CREATE INDEX {candidate['name']} ON {candidate['table']} ({', '.join(candidate['columns'])})"
+        kept.sort(key=lambda item: (-item['benefit'], -item['queries'], item['name']))
+        return kept[:top] if top else kept
+
+    def apply(self, recommendations: list) -> int:
+        """Create the recommended indexes, returning how many succeeded."""
+        created = 0
+        for recommendation in recommendations:
+            if self.db.execute_query(recommendation['ddl'], origin='advisor') is not None:
+                created += 1
+        return created
+
+
+def read_workload(paths: list) -> dict:
+    """
+    Count the queries in workload files: slow query logs (JSON lines with 'query' and
+    'params'), bench.py corpora (JSON lines with 'question'), or text files of one
+    SQL statement or natural language question per line. Questions are translated.
+    Returns {(sql, params): count}.
+    """
+    workload = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as workload_file:
+            for line in workload_file:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith('{'):
+                    record = json.loads(line)
+                    if 'query' in record:
+                        params = record.get('params')
+                        _count(workload, record['query'], tuple(params) if params is not None else None)
+                        continue
+                    line = record.get('question', '')
+                # Questions often start with 'show' too, and only queries can be explained anyway
+                if cache.statement_kind(line) == 'select':
+                    _count(workload, line, None)
+                else:
+                    _count_question(workload, line)
+    return workload
+
+
+def _count(workload: dict, sql: str, params):
+    key = (cache.normalize_sql(sql), params)
+    workload[key] = workload.get(key, 0) + 1
+
+
+def _count_question(workload: dict, question: str):
+    success, sql, params = natural.natural_language_to_sql_params(question)
+    if success:
+        _count(workload, sql, params)
+
+
+def print_report(advisor: IndexAdvisor, recommendations: list, out=sys.stdout):
+    out.write(f"Explained {advisor.explained} distinct queries ({len(advisor.failed)} failed)\n\n")
+    out.write(f"{'table':<16}{'queries':>9}{'full scans':>12}{'index scans':>13}{'rows read':>14}"
+              f"{'filesorts':>11}{'temp tables':>13}\n")
+    for table, finding in sorted(advisor.findings.items(), key=lambda item: -item[1]['rows_examined']):
+        out.write(f"{table:<16}{finding['queries']:>9}{finding['full_scans']:>12}{finding['full_index_scans']:>13}"
+                  f"{finding['rows_examined']:>14.0f}{finding['filesorts']:>11}{finding['temporary_tables']:>13}\n")
+    out.write("\nRecommended indexes (estimated rows saved over the workload):\n")
+    if not recommendations:
+        out.write("  none\n")
+    for rank, item in enumerate(recommendations, 1):
+        out.write(f"{rank:>3}. {item['ddl']};\n     benefit {item['benefit']:.0f} rows "
+                  f"({item['rows_saved']:.0f} not read, {item['sorted_rows']:.0f} not sorted), "
+                  f"{item['queries']} queries{', covering' if item['covering'] else ''}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommend indexes from the EXPLAIN plans of a query workload.")
+    parser.add_argument('workload', nargs='*',
+                        help="slow query logs (run with CHATDB_SLOW_QUERY_SECONDS=0 to capture every query), "
+                             "bench.py corpora, or files of SQL statements or questions")
+    parser.add_argument('-n', '--corpus', type=int, default=0,
+                        help="also translate a generated benchmark corpus of this many questions")
+    parser.add_argument('--seed', type=int, default=551)
+    parser.add_argument('-t', '--top', type=int, default=10, help="recommendations to show (default 10)")
+    parser.add_argument('--apply', action='store_true', help="create the recommended indexes")
+    parser.add_argument('-o', '--output', help="also write findings and recommendations as JSON")
+    args = parser.parse_args(argv)
+
+    workload = read_workload(args.workload)
+    for _, question in bench.generate_corpus(args.corpus, args.seed) if args.corpus else ():
+        _count_question(workload, question)
+    if not workload:
+        print("No queries to explain; pass workload files or --corpus", file=sys.stderr)
+        return 1
+
+    db = connect.chatDB(result_cache=None, query_metrics=None)
+    if db.pool is None:
+        return 1
+    if not db.backend.information_schema:
+        print(f"The index advisor needs EXPLAIN FORMAT=JSON, which the {db.backend.name} backend lacks",
+              file=sys.stderr)
+        return 1
+    advisor = IndexAdvisor(db)
+    for (sql, params), count in workload.items():
+        advisor.add(sql, params, count)
+    recommendations = advisor.recommendations(args.top)
+    print_report(advisor, recommendations)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            json.dump({'findings': advisor.findings, 'recommendations': recommendations,
+                       'failed': advisor.failed}, out, indent=1)
+    if args.apply and recommendations:
+        created = advisor.apply(recommendations)
+        print(f"Created {created} of {len(recommendations)} indexes", file=sys.stderr)
+        return 0 if created == len(recommendations) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
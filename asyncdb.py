@@ -0,0 +1,135 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import connect
+
+
+async def read_ahead(batches, limit: int):
+    """
+    Async generator over batches that reads up to limit batches ahead of its consumer, so a
+    result that fits is read to the end (and gives its connection back) however slowly it is
+    consumed. Errors are raised where the consumer reaches them.
+    """
+    buffer = asyncio.Queue()
+    room = asyncio.Semaphore(limit)
+    stopped = False
+    end = object()
+
+    async def fill():
+        try:
+            async for batch in batches:
+                buffer.put_nowait(batch)
+                await room.acquire()
+                if stopped:
+                    break
+        except Exception as err:
+            buffer.put_nowait(err)
+        else:
+            buffer.put_nowait(end)
+        finally:
+            # At a yield point, so closing it can't race a fetch
+            await batches.aclose()
+
+    filler = asyncio.create_task(fill())
+    try:
+        while True:
+            item = await buffer.get()
+            room.release()
+            if item is end:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped = True
+        room.release()
+        await filler
+
+
+class AsyncChatDB:
+    """
+    Asyncio counterpart of connect.chatDB.
+    Queries run on a thread pool over the shared connection pool, with at most
+    max_concurrency of them (by default the pool size) holding a connection at once,
+    so many coroutines can share one process without one thread per user.
+    Results have the same shapes as the synchronous methods.
+    """
+
+    def __init__(self, db=None, max_concurrency: int = None):
+        self.db = db if db is not None else connect.chatDB()
+        if max_concurrency is None:
+            max_concurrency = self.db.pool.size if self.db.pool is not None else connect.POOL_SIZE
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='chatdb')
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def execute_query(self, query, params: tuple = None, origin: str = 'other'):
+        """Run a query and return its formatted table, or None on error (like chatDB.execute_query)."""
+        async with self._slots:
+            return await self._run(self.db.execute_query, query, params, origin)
+
+    async def execute_columnar(self, query, params: tuple = None, batch_size: int = connect.STREAM_BATCH_SIZE):
+        """Run a query and return {column name: NumPy array}, or None on error (like chatDB.execute_columnar)."""
+        async with self._slots:
+            return await self._run(self.db.execute_columnar, query, params, batch_size)
+
+    async def check_cost(self, query, params: tuple = None):
+        """The cost guard's guard.Decision for query, or None when it has no guard."""
+        if self.db.cost_guard is None:
+            return None
+        async with self._slots:
+            return await self._run(self.db.cost_guard.check, self.db, query, params)
+
+    async def stream(self, query, params: tuple = None, batch_size: int = connect.STREAM_BATCH_SIZE, timer=None):
+        """
+        Async generator of (column_names, rows) batches, like chatDB.stream_batches. It holds a
+        connection until the last batch is taken; wrap it in read_ahead so slow consumers don't.
+        """
+        async with self._slots:
+            batches = self.db.stream_batches(query, params, batch_size, timer=timer)
+            try:
+                while True:
+                    batch = await self._run(next, batches, None)
+                    if batch is None:
+                        break
+                    yield batch
+            finally:
+                # Returns the connection to the pool if the consumer stopped early
+                await self._run(batches.close)
+
+    async def stream_table(self, query, params: tuple = None, batch_size: int = connect.STREAM_BATCH_SIZE):
+        """Async generator of formatted table chunks, like chatDB.stream_table."""
+        async with self._slots:
+            chunks = self.db.stream_table(query, params, batch_size)
+            try:
+                while True:
+                    chunk = await self._run(next, chunks, None)
+                    if chunk is None:
+                        break
+                    yield chunk
+            finally:
+                await self._run(chunks.close)
+
+    async def gather(self, queries, return_exceptions: bool = False) -> list:
+        """
+        Run many queries concurrently and return their results in order.
+        Each item is a query string or a (query, params) pair.
+        """
+        tasks = []
+        for item in queries:
+            query, params = (item, None) if isinstance(item, str) else item
+            tasks.append(self.execute_query(query, params))
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
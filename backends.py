@@ -0,0 +1,224 @@
+import os
+import re
+import sqlite3
+import threading
+
+
+DATA_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.sql')
+# The keyword an optimizer hint has to follow
+_SELECT = re.compile(r"^\s*SELECT\b", re.I)
+
+
+class MySQLBackend:
+    """
+    A MySQL server reached through mysql.connector, which is only imported when this
+    backend is created so the SQLite backend works without it installed.
+    """
+    name = 'mysql'
+    prepared_statements = True
+    # Catalog queries other modules run (schema introspection, external write polling)
+    information_schema = True
+    # Whether with_time_limit makes the server stop long statements itself
+    server_time_limit = True
+    update_times_query = "SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+    primary_key_query = """
+SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'
+ORDER BY ORDINAL_POSITION"""
+
+    def __init__(self, config: dict):
+        import mysql.connector
+        self.config = config
+        self.driver = mysql.connector
+        self.Error = mysql.connector.Error
+        self.DatabaseError = mysql.connector.DatabaseError
+        self.OperationalError = mysql.connector.OperationalError
+        self.PoolError = mysql.connector.errors.PoolError
+
+    def connect(self):
+        return self.driver.connect(**self.config)
+
+    def ping(self, connection) -> bool:
+        """Check that an idle connection still works, reconnecting once if the server dropped it."""
+        try:
+            connection.ping(reconnect=True, attempts=1, delay=0)
+            return True
+        except self.Error:
+            return False
+
+    def reset(self, connection):
+        connection.reset_session()
+
+    def read_only(self, connection):
+        """Have the server refuse any change to a table for the rest of the session."""
+        cursor = connection.cursor()
+        cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        cursor.close()
+
+    def cursor(self, connection, prepared: bool = False):
+        """An unbuffered cursor, so results stream, or a server-side prepared statement cursor."""
+        return connection.cursor(prepared=True) if prepared else connection.cursor(buffered=False)
+
+    def translate(self, query: str) -> str:
+        return query
+
+    def with_time_limit(self, query: str, seconds: float) -> str:
+        """Have the server stop a SELECT after seconds, with a MAX_EXECUTION_TIME optimizer hint."""
+        if 'MAX_EXECUTION_TIME' in query.upper():
+            return query
+        return _SELECT.sub(lambda match: f"{match.group()} /*+ MAX_EXECUTION_TIME({int(seconds * 1000)}) */", query, 1)
+
+    def cancel_handle(self, connection):
+        """What cancel() needs to stop the statement running on connection."""
+        return connection.connection_id
+
+    def cancel(self, connection_id):
+        """Stop the statement running on another connection, from a short-lived side connection."""
+        side = self.connect()
+        try:
+            cursor = side.cursor()
+            cursor.execute(f"KILL QUERY {int(connection_id)}")
+            cursor.close()
+        finally:
+            side.close()
+
+
+class SQLitePoolError(sqlite3.Error):
+    """No connection was returned to the pool in time."""
+
+
+# MySQL statements the tutor sends that SQLite spells differently
+_DESCRIBE = re.compile(r"^\s*(?:DESCRIBE|DESC)\s+`?(\w+)`?\s*;?\s*$", re.I)
+_SHOW_TABLES = re.compile(r"^\s*SHOW\s+TABLES\s*;?\s*$", re.I)
+# Table options after CREATE TABLE (...) that SQLite doesn't accept
+_TABLE_OPTIONS = re.compile(r"\)\s*(?:(?:ENGINE|AUTO_INCREMENT|DEFAULT\s+CHARSET|CHARSET|COLLATE)\s*=?\s*\w+\s*)+;", re.I)
+_CONDITIONAL_COMMENT = re.compile(r"/\*!\d*.*?\*/\s*;?", re.S)
+_PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|%s")
+
+DESCRIBE_QUERY = """
+SELECT c.name AS Field, lower(c.type) AS Type,
+       CASE WHEN c."notnull" OR c.pk THEN 'NO' ELSE 'YES' END AS "Null",
+       CASE WHEN c.pk THEN 'PRI' WHEN f."from" IS NOT NULL THEN 'MUL' ELSE '' END AS "Key",
+       c.dflt_value AS "Default", '' AS Extra
+FROM pragma_table_info('{table}') AS c
+LEFT JOIN (SELECT DISTINCT "from" FROM pragma_foreign_key_list('{table}')) AS f ON f."from" = c.name
+ORDER BY c.cid
+"""
+
+
+class SQLiteBackend:
+    """
+    An embedded SQLite database loaded from data.sql (or another MySQL-style dump) at
+    startup. Every pooled connection shares one in-memory database, which stays alive as
+    long as the backend does. With cache_path, the loaded database is also saved to disk
+    and later startups copy it back into memory instead of replaying the dump.
+    """
+    name = 'sqlite'
+    prepared_statements = False
+    information_schema = False
+    server_time_limit = False
+    update_times_query = None
+    primary_key_query = "SELECT name FROM pragma_table_info(%s) WHERE pk > 0 ORDER BY pk"
+    Error = sqlite3.Error
+    DatabaseError = sqlite3.DatabaseError
+    OperationalError = sqlite3.OperationalError
+    PoolError = SQLitePoolError
+
+    _instances = 0
+    _lock = threading.Lock()
+
+    def __init__(self, data_path: str = DATA_SQL, cache_path: str = None):
+        self.data_path = data_path
+        self.cache_path = cache_path
+        with SQLiteBackend._lock:
+            SQLiteBackend._instances += 1
+            self.uri = f"file:chatdb{os.getpid()}_{SQLiteBackend._instances}?mode=memory&cache=shared"
+        # Holds the shared in-memory database open while connections come and go
+        self._keeper = self.connect()
+        self._load()
+
+    def _load(self):
+        if self.cache_path and os.path.exists(self.cache_path) and (
+                os.path.getmtime(self.cache_path) >= os.path.getmtime(self.data_path)):
+            disk = sqlite3.connect(self.cache_path)
+            try:
+                disk.backup(self._keeper)
+            finally:
+                disk.close()
+            return
+        with open(self.data_path, encoding='utf-8') as data_file:
+            self._keeper.executescript(self.translate_script(data_file.read()))
+        if self.cache_path:
+            temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            disk = sqlite3.connect(temp_path)
+            try:
+                self._keeper.backup(disk)
+            finally:
+                disk.close()
+            os.replace(temp_path, self.cache_path)
+
+    @staticmethod
+    def translate_script(script: str) -> str:
+        """Drop the MySQL-only parts of a dump (conditional comments, table options)."""
+        script = _CONDITIONAL_COMMENT.sub('', script)
+        return _TABLE_OPTIONS.sub(');', script)
+
+    def connect(self):
+        connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA foreign_keys = ON")
+        # In shared-cache mode this stops readers from waiting on a writer's table lock
+        connection.execute("PRAGMA read_uncommitted = ON")
+        return connection
+
+    def ping(self, connection) -> bool:
+        try:
+            connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self, connection):
+        """Undo what a session left behind, as reset_session does on MySQL: its transaction, temporary objects and settings."""
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        for kind in ('trigger', 'view', 'table'):
+            names = connection.execute("SELECT name FROM temp.sqlite_master WHERE type = ?", (kind,)).fetchall()
+            for (name,) in names:
+                quoted = name.replace('"', '""')
+                connection.execute(f'DROP {kind} IF EXISTS temp."{quoted}"')
+        for _, name, _ in connection.execute("PRAGMA database_list").fetchall():
+            if name not in ('main', 'temp'):
+                quoted = name.replace('"', '""')
+                connection.execute(f'DETACH DATABASE "{quoted}"')
+        connection.execute("PRAGMA query_only = OFF")
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA read_uncommitted = ON")
+
+    def read_only(self, connection):
+        connection.execute("PRAGMA query_only = ON")
+
+    def cursor(self, connection, prepared: bool = False):
+        # sqlite3 keeps its own cache of compiled statements per connection
+        return connection.cursor()
+
+    def with_time_limit(self, query: str, seconds: float) -> str:
+        # No server to enforce it; the watchdog interrupts the statement instead
+        return query
+
+    def cancel_handle(self, connection):
+        return connection
+
+    def cancel(self, connection):
+        # Safe to call from another thread; the running statement fails with "interrupted"
+        connection.interrupt()
+
+    def translate(self, query: str) -> str:
+        """Rewrite DESCRIBE and SHOW TABLES, and MySQL %s placeholders as ?."""
+        describe = _DESCRIBE.match(query)
+        if describe:
+            return DESCRIBE_QUERY.format(table=describe.group(1))
+        if _SHOW_TABLES.match(query):
+            return "SELECT name AS Tables_in_ChatDB FROM sqlite_master WHERE type = 'table' ORDER BY name"
+        if '%s' in query:
+            query = _PLACEHOLDER.sub(lambda match: '?' if match.group() == '%s' else match.group(), query)
+        return query
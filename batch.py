@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import natural
+import schema
+
+
+def _chunked(questions, chunksize: int):
+    """Group non-blank questions into lists of chunksize."""
+    chunk = []
+    for question in questions:
+        question = question.strip()
+        if not question:
+            continue
+        chunk.append(question)
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def translate_chunk(questions: list) -> list:
+    """Translate a list of questions in this process."""
+    records = []
+    for question in questions:
+        try:
+            success, sql = natural.natural_language_to_sql(question)
+        except Exception as e:
+            success, sql = False, f"Error: {str(e)}"
+        records.append((question, success, sql))
+    return records
+
+
+def _init_worker(schema_cache: str):
+    """Load the cached database schema in a worker so it translates like the parent."""
+    if schema_cache:
+        schema.use_cached_schema(schema_cache)
+
+
+def translate_batch(questions, workers: int = None, chunksize: int = 500, schema_cache: str = None):
+    """
+    Translate an iterable of questions over a process pool.
+    Yields (question, success, sql) in input order. Only a few chunks per worker are
+    in flight at a time, so arbitrarily long inputs are streamed rather than loaded.
+    With schema_cache, every process translates against that cached schema model.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunked(questions, chunksize)
+    if workers == 1:
+        _init_worker(schema_cache)
+        for chunk in chunks:
+            yield from translate_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(schema_cache,)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(translate_chunk, chunk))
+            if len(pending) >= workers * 4:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_jsonl(records, out) -> int:
+    """Write (question, success, sql) records as JSON lines, returning how many were written."""
+    count = 0
+    for question, success, sql in records:
+        out.write(json.dumps({'question': question, 'success': success, 'sql': sql}) + '\n')
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Translate a file of natural language questions to SQL (JSONL output).")
+    parser.add_argument('input', help="file with one question per line, or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output file, or '-' for stdout")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('-c', '--chunksize', type=int, default=500, help="questions per task sent to a worker")
+    parser.add_argument('-s', '--schema-cache', nargs='?', const=schema.SCHEMA_CACHE_PATH, default=None,
+                        help="translate against a cached database schema (default path if none given)")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    start = time.perf_counter()
+    try:
+        count = write_jsonl(translate_batch(source, args.workers, args.chunksize, args.schema_cache), out)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0.0
+    print(f"Translated {count} questions in {elapsed:.2f}s ({rate:.0f} questions/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
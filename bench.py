@@ -0,0 +1,285 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import lexicon
+import natural
+
+
+CATEGORIES = ['select', 'where', 'join', 'group', 'having', 'top']
+VERBS = ['show', 'list', 'display', 'find', 'get']
+COMPARISONS = ['greater than', 'more than', 'above', 'over', 'less than', 'below', 'under', 'at least', 'at most',
+               'is', 'is not']
+AGGREGATES = ['average', 'total', 'maximum', 'minimum', 'count']
+
+
+def _column_aliases(schemas: dict, table: str, numeric: bool = False) -> list:
+    columns = schemas[table]['columns']
+    return [info['aliases'][0] for info in columns.values()
+            if info['aliases'] and (not numeric or info['type'] in ('int', 'float'))]
+
+
+def generate_corpus(count: int = 5000, seed: int = 551, schemas: dict = None) -> list:
+    """
+    Generate count (category, question) pairs, cycling through select, where, join, group,
+    having and top-N phrasings built from the schema's table and column aliases.
+    The same seed and schema always give the same corpus.
+    """
+    schemas = schemas or lexicon.get_lexicon().schemas
+    rng = random.Random(seed)
+    tables = list(schemas)
+    numeric_tables = [table for table in tables if _column_aliases(schemas, table, numeric=True)]
+    corpus = []
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        table = rng.choice(numeric_tables if category in ('where', 'having', 'top') else tables)
+        table_alias = rng.choice(schemas[table]['aliases'] or [table.lower()])
+        column = rng.choice(_column_aliases(schemas, table) or [table.lower()])
+        numeric = rng.choice(_column_aliases(schemas, table, numeric=True) or [column])
+        number = rng.choice([rng.randint(1, 300), round(rng.uniform(0.1, 50), 1)])
+        verb = rng.choice(VERBS)
+
+        if category == 'select':
+            question = rng.choice([f"{verb} {column} of {table_alias}", f"{verb} all {table_alias}",
+                                   f"{verb} {column} and {numeric} for {table_alias}"])
+        elif category == 'where':
+            question = f"{verb} {table_alias} where {numeric} {rng.choice(COMPARISONS)} {number}"
+            if rng.random() < 0.3:
+                other = rng.choice(_column_aliases(schemas, table, numeric=True))
+                question += f" and {other} {rng.choice(COMPARISONS)} {rng.randint(1, 100)}"
+        elif category == 'join':
+            other = rng.choice([name for name in tables if name != table] or [table])
+            question = rng.choice([f"join {table_alias} with {other.lower()}",
+                                   f"{verb} {column} of {table_alias} joined with {other.lower()}",
+                                   f"combine {table_alias} and {other.lower()} where {numeric} over {number}"])
+        elif category == 'group':
+            question = rng.choice([f"group {table_alias} by {column}",
+                                   f"{rng.choice(AGGREGATES)} {numeric} of {table_alias} per {column}"])
+        elif category == 'having':
+            question = (f"group {table_alias} by {column} having {rng.choice(AGGREGATES)} {numeric} "
+                        f"{rng.choice(COMPARISONS[:8])} {number}")
+        else:
+            question = rng.choice([f"{verb} top {rng.randint(1, 50)} {table_alias} by {numeric}",
+                                   f"top {rng.randint(1, 50)} {numeric}",
+                                   f"{verb} the {numeric} top {rng.randint(1, 50)}"])
+        corpus.append((category, question))
+    return corpus
+
+
+def write_corpus(corpus: list, out):
+    """Write a corpus as JSON lines with the current translation of each question as its expected SQL."""
+    for category, question in corpus:
+        success, sql = natural.translate(question)
+        out.write(json.dumps({'category': category, 'question': question, 'expected': sql if success else None}) + '\n')
+
+
+def read_corpus(path: str) -> list:
+    """Read a corpus file written by write_corpus as (category, question, expected) triples."""
+    corpus = []
+    with open(path, encoding='utf-8') as corpus_file:
+        for line in corpus_file:
+            if line.strip():
+                record = json.loads(line)
+                corpus.append((record.get('category', ''), record['question'], record.get('expected')))
+    return corpus
+
+
+def _stages():
+    """The functions measured, each taking one lower-cased question."""
+    vocabulary = lexicon.get_lexicon()
+
+    def conditions(question):
+        scan = vocabulary.scan(question)
+        tables = scan.tables()
+        natural.parse_conditions(question, tables[0] if tables else 'Players', [], scan)
+
+    return {
+        'scan': vocabulary.scan,
+        'extract_top_n_phrase': natural.extract_top_n_phrase,
+        'parse_conditions': conditions,
+        'translate': natural.translate,
+        'translate_cached': natural.natural_language_to_sql
+    }
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def measure(func, questions: list, repeat: int = 3) -> dict:
+    """Latency percentiles (microseconds) and throughput of func over questions, best of repeat passes."""
+    best = None
+    for _ in range(repeat):
+        timings = []
+        clock = time.perf_counter_ns
+        start = clock()
+        for question in questions:
+            before = clock()
+            func(question)
+            timings.append(clock() - before)
+        elapsed = (clock() - start) / 1e9
+        if best is None or elapsed < best[0]:
+            best = (elapsed, timings)
+    elapsed, timings = best
+    timings.sort()
+    return {
+        'calls': len(timings),
+        'p50_us': percentile(timings, 0.50) / 1000,
+        'p95_us': percentile(timings, 0.95) / 1000,
+        'p99_us': percentile(timings, 0.99) / 1000,
+        'mean_us': sum(timings) / len(timings) / 1000 if timings else 0.0,
+        'throughput_per_s': len(timings) / elapsed if elapsed else 0.0
+    }
+
+
+def measure_allocations(func, questions: list) -> dict:
+    """
+    Memory allocated per call, traced with tracemalloc in a separate pass so tracing
+    doesn't skew the latency figures. peak is the most memory a call held at once,
+    retained what it left allocated afterwards (e.g. cache entries).
+    """
+    tracemalloc.start()
+    try:
+        peaks, retained = [], 0
+        for question in questions:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func(question)
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+            retained += after - current
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+    return {
+        'alloc_peak_bytes_p50': percentile(peaks, 0.50),
+        'alloc_peak_bytes_max': peaks[-1] if peaks else 0,
+        'alloc_retained_bytes_per_call': retained / len(peaks) if peaks else 0.0
+    }
+
+
+def run(corpus: list, repeat: int = 3, allocations: bool = True) -> dict:
+    """Benchmark every stage over the corpus and record each question's translation."""
+    questions = [question.lower() for _, question, _ in corpus]
+    natural.TRANSLATION_CACHE.clear()
+    stages = _stages()
+    # Warm the translation cache so translate_cached measures hits
+    for question in questions:
+        natural.natural_language_to_sql(question)
+
+    results = {'stages': {}}
+    for name, func in stages.items():
+        results['stages'][name] = measure(func, questions, repeat)
+        if allocations:
+            results['stages'][name].update(measure_allocations(func, questions))
+
+    outputs, mismatches = [], []
+    for category, question, expected in corpus:
+        success, sql = natural.translate(question)
+        sql = sql if success else None
+        outputs.append([question, sql])
+        if expected is not None and sql != expected:
+            mismatches.append({'category': category, 'question': question, 'expected': expected, 'actual': sql})
+    results['outputs'] = outputs
+    results['mismatches'] = mismatches
+    results['environment'] = {'python': platform.python_version(), 'platform': platform.platform(),
+                              'lexicon': lexicon.get_lexicon().fingerprint, 'questions': len(corpus),
+                              'repeat': repeat}
+    return results
+
+
+def compare(base: dict, new: dict, threshold: float = 0.10) -> dict:
+    """
+    Compare two run results. A stage regresses when its p50 or p95 latency grew by more
+    than threshold (a fraction); a question changes when its translation differs.
+    """
+    regressions = []
+    for name, stats in new['stages'].items():
+        old = base['stages'].get(name)
+        if old is None:
+            continue
+        for metric in ('p50_us', 'p95_us'):
+            if old[metric] and (stats[metric] - old[metric]) / old[metric] > threshold:
+                regressions.append({'stage': name, 'metric': metric, 'base': old[metric], 'new': stats[metric]})
+    old_outputs = dict(base.get('outputs', []))
+    changes = [{'question': question, 'base': old_outputs[question], 'new': sql}
+               for question, sql in new.get('outputs', []) if question in old_outputs and old_outputs[question] != sql]
+    return {'regressions': regressions, 'output_changes': changes}
+
+
+def print_summary(results: dict, out=sys.stdout):
+    out.write(f"{'stage':<22}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'per s':>12}{'peak B':>10}\n")
+    for name, stats in results['stages'].items():
+        out.write(f"{name:<22}{stats['p50_us']:>10.1f}{stats['p95_us']:>10.1f}{stats['p99_us']:>10.1f}"
+                  f"{stats['throughput_per_s']:>12.0f}{stats.get('alloc_peak_bytes_p50', 0):>10}\n")
+    if results['mismatches']:
+        out.write(f"{len(results['mismatches'])} questions no longer match their expected SQL\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the natural language to SQL translator.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    corpus_parser = commands.add_parser('corpus', help="write a generated corpus with expected SQL")
+    corpus_parser.add_argument('-n', '--count', type=int, default=5000)
+    corpus_parser.add_argument('--seed', type=int, default=551)
+    corpus_parser.add_argument('-o', '--output', default='-')
+
+    run_parser = commands.add_parser('run', help="benchmark the translator and save the results as JSON")
+    run_parser.add_argument('--corpus', help="corpus file to check against (default: generate one)")
+    run_parser.add_argument('-n', '--count', type=int, default=5000)
+    run_parser.add_argument('--seed', type=int, default=551)
+    run_parser.add_argument('-r', '--repeat', type=int, default=3, help="timed passes per stage, best one kept")
+    run_parser.add_argument('--no-alloc', action='store_true', help="skip the tracemalloc pass")
+    run_parser.add_argument('-o', '--output', help="JSON results file")
+
+    compare_parser = commands.add_parser('compare', help="flag latency regressions and output changes")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=0.10,
+                                help="allowed fractional latency increase (default 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'corpus':
+        corpus = generate_corpus(args.count, args.seed)
+        out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        try:
+            write_corpus(corpus, out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return 0
+
+    if args.command == 'run':
+        if args.corpus:
+            corpus = read_corpus(args.corpus)
+        else:
+            corpus = [(category, question, None) for category, question in generate_corpus(args.count, args.seed)]
+        results = run(corpus, args.repeat, allocations=not args.no_alloc)
+        print_summary(results)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as out:
+                json.dump(results, out, indent=1)
+        return 1 if results['mismatches'] else 0
+
+    with open(args.base, encoding='utf-8') as base_file, open(args.new, encoding='utf-8') as new_file:
+        report = compare(json.load(base_file), json.load(new_file), args.threshold)
+    for item in report['regressions']:
+        print(f"REGRESSION {item['stage']} {item['metric']}: {item['base']:.1f} -> {item['new']:.1f} us")
+    for item in report['output_changes']:
+        print(f"CHANGED {item['question']!r}: {item['base']} -> {item['new']}")
+    if not report['regressions'] and not report['output_changes']:
+        print("No regressions or output changes")
+    return 1 if report['regressions'] or report['output_changes'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
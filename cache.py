@@ -0,0 +1,407 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+NUMBER_PATTERN = re.compile(r'\b\d+(?:\.\d+)?\b')
+SQL_LITERAL_PATTERN = re.compile(r'(?<![\w.])\d+(?:\.\d+)?(?![\w.])')
+PUNCTUATION_PATTERN = re.compile(r'[?!;:"()\[\]{}.]')
+SLOT = '#'
+
+
+def normalize_question(text: str) -> tuple:
+    """
+    Reduce a question to its cache key form.
+    Returns (template, values): the lower-cased question with punctuation dropped,
+    whitespace collapsed and every non-zero number replaced by a slot, plus those numbers in order.
+    """
+    text = text.lower().strip()
+    values = []
+
+    def to_slot(match):
+        # Zero changes the shape of a translation (e.g. 'top 0' sets no LIMIT), so it stays literal
+        if float(match.group()) == 0:
+            return match.group()
+        values.append(match.group())
+        return SLOT
+
+    template = NUMBER_PATTERN.sub(to_slot, text)
+    template = PUNCTUATION_PATTERN.sub(' ', template)
+    template = ' '.join(template.split())
+    return template, tuple(values)
+
+
+def _as_number(value: str):
+    return int(value) if value.isdigit() else float(value)
+
+
+def _bind_slots(result: tuple, values: tuple):
+    """
+    Map each parameter of a (success, sql, params) translation to the slot it came from,
+    so the entry can be re-filled with other numbers.
+    Returns None when the sql has inline literals or a parameter can't be traced to exactly one slot.
+    The digit runs of a decimal count as numbers too (a translator may read the 5 of 20.5 on its
+    own), so a parameter equal to one of them is ambiguous.
+    """
+    success, sql, params = result
+    if len(set(values)) != len(values) or SQL_LITERAL_PATTERN.search(sql):
+        return None
+    numbers = [_as_number(value) for value in values]
+    fragments = {int(part) for value in values if '.' in value for part in value.split('.')}
+    slots = []
+    for param in params:
+        matches = [index for index, number in enumerate(numbers) if type(number) is type(param) and number == param]
+        if len(matches) != 1 or (type(param) is int and param in fragments):
+            return None
+        slots.append(matches[0])
+    return tuple(slots)
+
+
+def _render_slots(success: bool, sql: str, slots: tuple, values: tuple) -> tuple:
+    return success, sql, tuple(_as_number(values[index]) for index in slots)
+
+
+def _cache_key(template: str, values: tuple):
+    # Integers and decimals are parsed differently (e.g. only integers become a LIMIT)
+    return template, tuple('.' in value for value in values)
+
+
+class TranslationCache:
+    """
+    Bounded LRU cache of (success, sql, params) translations keyed on the normalized question.
+    Questions that differ only in their numbers share an entry, with the params re-filled
+    from the new numbers. The whole cache is dropped when the lexicon fingerprint changes.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.fingerprint = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self.fingerprint:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.fingerprint = fingerprint
+
+    def get(self, template: str, values: tuple, fingerprint=None):
+        """Return the cached (success, sql, params) for a normalized question, or None."""
+        key = _cache_key(template, values)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            # Repeated numbers can't be told apart in a cached translation
+            entry = self._entries.get(key) if len(set(values)) == len(values) else None
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[3] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            success, sql, slots, _ = entry
+            return _render_slots(success, sql, slots, values)
+
+    def lookup(self, question: str, translate, fingerprint=None) -> tuple:
+        """
+        Return the (success, sql, params) translation of question, calling translate on it once on a miss.
+        The new entry's slots are bound from that translation (see put).
+        """
+        template, values = normalize_question(question)
+        result = self.get(template, values, fingerprint)
+        if result is not None:
+            return result
+        result = translate(question)
+        self.put(template, values, result, fingerprint)
+        return result
+
+    def put(self, template: str, values: tuple, result: tuple, fingerprint=None):
+        """
+        Store a (success, sql, params) translation of the question normalized to template and values.
+        It is only stored when every param equals exactly one of the (distinct) numbers and the sql
+        has no inline numbers, so the entry can be re-filled; other results are skipped.
+        """
+        success, sql, _ = result
+        slots = _bind_slots(result, values)
+        if slots is None or self.maxsize <= 0:
+            return
+        key = _cache_key(template, values)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._entries[key] = (success, sql, slots, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+
+SQL_TOKEN_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|\s+|[^\s'\"`]+")
+# Kinds of statement (as statement_kind names them) that change nothing
+READ_STATEMENTS = ('select', 'describe', 'desc', 'show', 'explain')
+CACHEABLE_STATEMENTS = ('select', 'describe', 'desc')
+# Results of queries using these can change without any table changing
+VOLATILE_PATTERN = re.compile(r'\b(?:rand|now|sysdate|uuid|uuid_short|curdate|curtime|current_date|current_time|'
+                              r'current_timestamp|unix_timestamp|utc_timestamp|last_insert_id|connection_id|'
+                              r'found_rows|row_count|sleep)\b|\bfor\s+update\b|\block\s+in\s+share\s+mode\b|'
+                              r'\binto\s+(?:out|dump)file\b|@', re.IGNORECASE)
+_TARGET = r'(?:`?\w+`?\s*\.\s*)?`?(\w+)`?'
+TARGET_TABLE_PATTERN = re.compile(r'^\s*(?:insert|replace)\s+(?:low_priority\s+|delayed\s+|high_priority\s+|ignore\s+)*'
+                                  r'(?:into\s+)?' + _TARGET + r'|^\s*update\s+(?:low_priority\s+|ignore\s+)*' + _TARGET +
+                                  r'|^\s*delete\s+(?:low_priority\s+|quick\s+|ignore\s+)*from\s+' + _TARGET +
+                                  r'|^\s*truncate\s+(?:table\s+)?' + _TARGET, re.IGNORECASE)
+MULTI_TABLE_PATTERN = re.compile(r'^\s*update\s+(?:low_priority\s+|ignore\s+)*[`\w.]+(?:\s+(?:as\s+)?\w+)?\s*,',
+                                 re.IGNORECASE)
+
+
+_STATEMENT_TOKEN_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|\w+|[^\s\w]")
+
+
+def _kind_at(tokens: list, position: int) -> str:
+    while position < len(tokens) and tokens[position] == '(':
+        position += 1
+    if position >= len(tokens) or not tokens[position][0].isalpha():
+        return ''
+    kind = tokens[position].lower()
+    if kind == 'with':
+        # The statement follows the common table expressions: name [(columns)] AS (body), ...
+        depth, closed = 0, False
+        for index in range(position + 1, len(tokens)):
+            token = tokens[index]
+            if closed and depth == 0 and (token == '(' or token[0].isalpha()) and token.lower() != 'as':
+                return _kind_at(tokens, index)
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                closed = depth == 0
+            elif depth == 0:
+                closed = False
+        return ''
+    if kind in ('explain', 'describe', 'desc') and position + 1 < len(tokens) and \
+            tokens[position + 1].lower() == 'analyze':
+        # EXPLAIN ANALYZE runs the statement it explains
+        position += 2
+        if position < len(tokens) and tokens[position].lower() == 'format':
+            position += 3
+        explained = _kind_at(tokens, position)
+        return 'explain' if explained in READ_STATEMENTS else explained
+    return kind
+
+
+def statement_kind(sql: str) -> str:
+    """
+    Lower-cased keyword of the statement sql runs, e.g. 'select': the first one, the one after
+    the common table expressions of a WITH, or the explained one for EXPLAIN ANALYZE of a write.
+    Returns '' when it can't be told, which callers treat as a write.
+    """
+    match = re.match(r'\s*(?:\(\s*)*(\w+)', sql)
+    kind = match.group(1).lower() if match else ''
+    if kind not in ('with', 'explain', 'describe', 'desc'):
+        return kind
+    return _kind_at(_STATEMENT_TOKEN_PATTERN.findall(sql), 0)
+
+
+# Clauses that have a read write a file or variables, or lock the rows it reads
+_NOT_PLAIN_READ_PATTERN = re.compile(r'\binto\b|\bfor\s+(?:update|share)\b|\block\s+in\s+share\s+mode\b', re.IGNORECASE)
+
+
+def is_plain_read(sql: str) -> bool:
+    """Whether sql is a read statement that writes no file or variable and locks no rows."""
+    if statement_kind(sql) not in READ_STATEMENTS:
+        return False
+    unquoted = ''.join(token for token in SQL_TOKEN_PATTERN.findall(sql) if token[0] not in '\'"`')
+    return not _NOT_PLAIN_READ_PATTERN.search(unquoted)
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside of quoted strings and drop a trailing semicolon."""
+    tokens = [' ' if token.isspace() else token for token in SQL_TOKEN_PATTERN.findall(sql)]
+    return ''.join(tokens).strip().rstrip(';').strip()
+
+
+def is_cacheable(sql: str) -> bool:
+    """Whether the result of sql depends only on the contents of the tables it reads."""
+    return statement_kind(sql) in CACHEABLE_STATEMENTS and not VOLATILE_PATTERN.search(sql)
+
+
+def referenced_tables(sql: str) -> frozenset:
+    """
+    Lower-cased identifiers a read statement mentions outside string literals.
+    This is a superset of the tables it reads (it includes columns and keywords too),
+    which is what invalidation needs: a change to any table it reads will match.
+    """
+    words = set()
+    for token in SQL_TOKEN_PATTERN.findall(sql):
+        if token[0] not in '\'"':
+            words.update(word.lower() for word in re.findall(r'\w+', token))
+    return frozenset(words)
+
+
+def written_tables(sql: str):
+    """
+    Lower-cased names of the tables a statement may change.
+    Returns an empty set for reads and None when the affected tables can't be determined.
+    """
+    kind = statement_kind(sql)
+    if kind in READ_STATEMENTS:
+        return frozenset()
+    # Multi-table updates and deletes may change tables other than the first one
+    if kind in ('update', 'delete') and (MULTI_TABLE_PATTERN.match(sql) or re.search(r'\b(?:join|using)\b', sql, re.I)):
+        return None
+    match = TARGET_TABLE_PATTERN.match(sql)
+    if not match:
+        return None
+    return frozenset(name.lower() for name in match.groups() if name)
+
+
+class ResultCache:
+    """
+    Read-through cache of formatted query results, bounded by the bytes it holds.
+    Each table has a version number that is bumped when it changes; entries for a table
+    are dropped on invalidation, and results computed while a table changed are not stored.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._versions = {}
+        # Bumped when everything is invalidated at once
+        self._epoch = 0
+        self._update_times = None
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(sql: str, params: tuple = None) -> tuple:
+        return normalize_sql(sql), tuple(params) if params is not None else None
+
+    def versions(self, tables) -> tuple:
+        """Snapshot of the current versions of tables, to pass to put()."""
+        with self._lock:
+            return self._snapshot(tables)
+
+    def _snapshot(self, tables) -> tuple:
+        return self._epoch, tuple(self._versions.get(table, 0) for table in sorted(tables))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, tables, versions: tuple, value: str):
+        """Store value unless one of tables changed since versions was taken."""
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if self._snapshot(tables) != versions:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, tables, size)
+            self.bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, tables, size = self._entries.pop(key)
+        self.bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys:
+                keys.discard(key)
+
+    def invalidate(self, tables=None):
+        """Drop the entries reading any of tables, or every entry when tables is None."""
+        with self._lock:
+            self.invalidations += 1
+            if tables is None:
+                self._epoch += 1
+                self._entries.clear()
+                self._by_table.clear()
+                self.bytes = 0
+                return
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                for key in list(self._by_table.pop(table, ())):
+                    if key in self._entries:
+                        self._remove(key)
+
+    def poll_due(self, interval: float) -> bool:
+        """Whether interval seconds have passed since the last table poll (and start a new one)."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_poll < interval:
+                return False
+            self._last_poll = now
+            return True
+
+    def sync_update_times(self, update_times: dict):
+        """Invalidate the tables whose last update time differs from the previous poll."""
+        with self._lock:
+            previous, self._update_times = self._update_times, dict(update_times)
+        if previous is None:
+            return
+        changed = {table for table in set(previous) | set(update_times)
+                   if previous.get(table) != update_times.get(table)}
+        if changed:
+            self.invalidate(changed)
+
+    def stats(self) -> dict:
+        """Snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
@@ -4,6 +4,10 @@ import sys
 import os
 
 
+# Set CHATDB_FAST=1 to skip animations and pauses (demos, slow terminals, scripted runs)
+FAST_MODE = os.environ.get('CHATDB_FAST', '') not in ('', '0')
+
+
 def print_chatdb_logo():
     logo = """
     \033[1;36m
@@ -56,12 +60,15 @@ def print_help_message():
     print(help_text)
 
 
-def print_welcome():
+def print_welcome(fast: bool = None):
+    if fast is None:
+        fast = FAST_MODE
     # # Clear screen (works on both Windows and Unix-like systems)
     # os.system('cls' if os.name == 'nt' else 'clear')
     # Print logo and welcome message
     print_chatdb_logo()
     # Small delay for dramatic effect
-    time.sleep(1)
+    if not fast:
+        time.sleep(1)
     # Print help message
     print_help_message()
@@ -0,0 +1,160 @@
+import datetime
+import decimal
+import re
+
+import numpy as np
+
+
+# SQLite returns dates as text, so text columns holding only ISO dates or datetimes are read as such
+_ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}$')
+_ISO_DATETIME = re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?$')
+
+DTYPES = {
+    'bool': np.bool_,
+    'int': np.int64,
+    'float': np.float64,
+    'date': 'datetime64[D]',
+    'datetime': 'datetime64[us]',
+    'timedelta': 'timedelta64[us]',
+    'string': object,
+    'object': object,
+    # Collected as strings and parsed once the whole column has matched
+    'isodate': object,
+    'isodatetime': object
+}
+PARSED = {'isodate': 'datetime64[D]', 'isodatetime': 'datetime64[us]'}
+# Placeholder stored under the mask for NULLs
+FILL = {'bool': False, 'int': 0, 'float': 0.0}
+NUMERIC = ('bool', 'int', 'float')
+# Text values checked for a date shape per batch; finish() parses (and so validates) all of them
+DATE_SAMPLE = 64
+_TYPE_KINDS = {
+    bool: 'bool', int: 'int', float: 'float', decimal.Decimal: 'float',
+    datetime.date: 'date', datetime.datetime: 'datetime', datetime.timedelta: 'timedelta', str: 'string'
+}
+
+
+def value_kind(types: set, values: tuple) -> str:
+    """The narrowest kind that holds values, given the set of their (non-None) Python types."""
+    kinds = {_TYPE_KINDS.get(value_type, 'object') for value_type in types}
+    if len(kinds) == 1:
+        kind = kinds.pop()
+        if kind == 'string':
+            sample = [value for value in values[:DATE_SAMPLE] if value is not None]
+            if all(_ISO_DATE.match(value) for value in sample):
+                return 'isodate'
+            if all(_ISO_DATETIME.match(value) for value in sample):
+                return 'isodatetime'
+        return kind
+    if kinds <= set(NUMERIC):
+        return max(kinds, key=NUMERIC.index)
+    return 'object'
+
+
+def widen(kind: str, other: str) -> str:
+    """The kind that holds both kinds of values."""
+    if kind == other:
+        return kind
+    if kind in NUMERIC and other in NUMERIC:
+        return max(kind, other, key=NUMERIC.index)
+    if {kind, other} == {'isodate', 'isodatetime'}:
+        return 'isodatetime'
+    if {kind, other} <= {'isodate', 'isodatetime', 'string'}:
+        return 'string'
+    return 'object'
+
+
+class ColumnBuilder:
+    """
+    One result column collected batch by batch into typed NumPy chunks.
+    The dtype follows the values: it starts at the narrowest kind that fits the first
+    batch and widens (int to float, anything to object) if a later batch needs it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.kind = None
+        self.chunks = []
+        self.masks = []
+        self.nulls = 0
+
+    def add(self, values: tuple):
+        count = len(values)
+        mask = None
+        if None in values:
+            mask = np.fromiter((value is None for value in values), dtype=bool, count=count)
+            self.nulls += int(mask.sum())
+        types = set(map(type, values))
+        types.discard(type(None))
+        if not types:
+            # Only NULLs so far; typed once the column's kind is known
+            self.chunks.append(count)
+            self.masks.append(mask)
+            return
+        kind = value_kind(types, values)
+        if self.kind is not None and kind != self.kind:
+            kind = widen(self.kind, kind)
+            if kind != self.kind:
+                self.chunks = [chunk if isinstance(chunk, int) else chunk.astype(DTYPES[kind])
+                               for chunk in self.chunks]
+        self.kind = kind
+        chunk = self._convert(values, mask)
+        self.chunks.append(chunk)
+        self.masks.append(mask)
+
+    def _convert(self, values: tuple, mask):
+        if mask is not None and self.kind in FILL:
+            fill = FILL[self.kind]
+            values = [fill if value is None else value for value in values]
+        if DTYPES[self.kind] is object:
+            chunk = np.empty(len(values), dtype=object)
+            chunk[:] = values
+            return chunk
+        try:
+            return np.array(values, dtype=DTYPES[self.kind])
+        except OverflowError:
+            # Integers beyond int64 (e.g. BIGINT UNSIGNED) stay Python ints
+            self.chunks = [chunk if isinstance(chunk, int) else chunk.astype(object) for chunk in self.chunks]
+            self.kind = 'object'
+            return self._convert(values, mask)
+
+    def finish(self):
+        """The column as one array, masked where the database returned NULL."""
+        kind = self.kind or 'object'
+        dtype = DTYPES[kind]
+        chunks = [np.full(chunk, FILL.get(kind), dtype=dtype) if isinstance(chunk, int) else chunk
+                  for chunk in self.chunks]
+        data = np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+        if kind in PARSED:
+            try:
+                data = data.astype(PARSED[kind])
+            except ValueError:
+                # Not all dates after all (e.g. month 13, or text past the sampled values); keep the text
+                pass
+        if not self.nulls:
+            return data
+        mask = np.concatenate([chunk_mask if chunk_mask is not None else np.zeros(len(chunk), dtype=bool)
+                               for chunk_mask, chunk in zip(self.masks, chunks)])
+        return np.ma.MaskedArray(data, mask=mask)
+
+
+def from_batches(batches) -> dict:
+    """
+    Build {column name: array} from (column_names, rows) batches such as chatDB.stream_batches
+    yields, converting each batch as it arrives so only one batch of row tuples is alive at once.
+    Integers, floats (and DECIMAL), booleans, dates, datetimes and times get native dtypes,
+    as does text made up of ISO dates or datetimes; other text and anything else are object
+    arrays. Columns with NULLs are numpy.ma masked arrays.
+    A repeated column name gets a _2, _3, ... suffix.
+    """
+    builders = None
+    for column_names, rows in batches:
+        if builders is None:
+            builders, seen = [], {}
+            for name in column_names:
+                seen[name] = seen.get(name, 0) + 1
+                builders.append(ColumnBuilder(name if seen[name] == 1 else f"{name}_{seen[name]}"))
+        if rows:
+            for builder, values in zip(builders, zip(*rows)):
+                builder.add(values)
+    return {builder.name: builder.finish() for builder in builders or []}
@@ -1,41 +1,663 @@
-import mysql.connector
+import heapq
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from contextlib import contextmanager
+
 from tabulate import tabulate
 
+import backends
+import cache
+import guard
+import metrics
+import paging
+
+
+DB_CONFIG = {
+    'host': "localhost",
+    'user': "jasonhu",
+    'password': "hxh117221",
+    'database': "ChatDB",
+    'autocommit': True
+}
+
+# 'mysql' for the server in DB_CONFIG, 'sqlite' for an embedded in-memory copy of data.sql
+BACKEND = os.environ.get('CHATDB_BACKEND', 'mysql')
+# Optional on-disk copy of the SQLite database, reused while data.sql is unchanged
+SQLITE_CACHE = os.environ.get('CHATDB_SQLITE_CACHE') or None
+POOL_SIZE = int(os.environ.get('CHATDB_POOL_SIZE', 5))
+# Connections idle for longer than this are pinged before being handed out again
+IDLE_CHECK_SECONDS = 30.0
+# Rows fetched per round trip when streaming a result
+STREAM_BATCH_SIZE = 1000
+# Server-side prepared statements kept open per pooled connection
+PREPARED_CACHE_SIZE = 64
+# Memory held by the shared cache of formatted read results
+RESULT_CACHE_BYTES = 32 * 1024 * 1024
+# How often table update times are polled to catch writes made outside chatDB (None disables it)
+TABLE_POLL_SECONDS = 5.0
+# Longest a statement may run, until its result is read, before it is stopped (0 disables it)
+QUERY_TIMEOUT_SECONDS = float(os.environ.get('CHATDB_QUERY_TIMEOUT', 30))
+# Extra time the server's own limit gets before the watchdog cancels the statement itself
+WATCHDOG_GRACE_SECONDS = 1.0
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def make_backend(name: str = BACKEND):
+    """Create the 'mysql' or 'sqlite' backend."""
+    if name == 'mysql':
+        return backends.MySQLBackend(DB_CONFIG)
+    if name == 'sqlite':
+        return backends.SQLiteBackend(cache_path=SQLITE_CACHE)
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def get_backend():
+    """Return the process-wide backend, creating it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_backend(BACKEND)
+        return _backend
+
+
+def set_backend(backend):
+    """Switch the process to another backend (a name or a backend object), dropping the current pool."""
+    global _backend, _pool
+    if isinstance(backend, str):
+        backend = make_backend(backend)
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = None
+    with _backend_lock:
+        _backend = backend
+    return backend
+
+
+def open_connection():
+    """Open a new connection to the configured database."""
+    return get_backend().connect()
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of database connections with checkout/return semantics.
+    Connections are created lazily, reused most-recently-returned first, and health
+    checked when they have been idle for longer than idle_check seconds.
+    With read_only, the database itself refuses writes on every connection handed out.
+    """
+
+    def __init__(self, factory=None, size: int = POOL_SIZE, idle_check: float = IDLE_CHECK_SECONDS,
+                 ping=None, reset_on_return: bool = False, prepared_cache_size: int = PREPARED_CACHE_SIZE,
+                 backend=None, read_only: bool = False):
+        # The backend supplies connections, health checks and the error classes to expect
+        self.backend = backend or get_backend()
+        self.factory = factory or self.backend.connect
+        self.size = size
+        self.idle_check = idle_check
+        self.ping = ping or self.backend.ping
+        self.reset_on_return = reset_on_return
+        self.prepared_cache_size = prepared_cache_size
+        self.read_only = read_only
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        # Per connection LRU of template -> (template, prepared cursor)
+        self._statements = {}
+        self.created = 0
+        self.discarded = 0
+        self.prepared_hits = 0
+        self.prepared_misses = 0
+
+    def acquire(self, timeout: float = None):
+        """Check out a connection, waiting up to timeout seconds for one to be returned."""
+        if not self._slots.acquire(timeout=timeout):
+            raise self.backend.PoolError("No connection available in the pool")
+        try:
+            while True:
+                try:
+                    connection, returned_at = self._idle.get_nowait()
+                except queue.Empty:
+                    connection = self.factory()
+                    self.created += 1
+                    if self.read_only:
+                        self._read_only(connection)
+                    return connection
+                if time.monotonic() - returned_at > self.idle_check:
+                    # A reconnect during the ping loses the server-side prepared statements
+                    self._forget_statements(connection)
+                    if not self.ping(connection):
+                        self._close(connection)
+                        continue
+                    if self.read_only:
+                        # and the session settings
+                        self._read_only(connection)
+                return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, discard: bool = False):
+        """Return a checked out connection; discarded connections are closed instead of reused."""
+        try:
+            if not discard and self.reset_on_return:
+                try:
+                    self._forget_statements(connection)
+                    self.backend.reset(connection)
+                    if self.read_only:
+                        self.backend.read_only(connection)
+                except self.backend.Error:
+                    discard = True
+            if discard:
+                self._close(connection)
+            else:
+                self._idle.put((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """Context manager that checks a connection out and returns it afterwards."""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except self.backend.DatabaseError as err:
+            # Statement errors leave the connection usable, a lost connection doesn't
+            self.release(connection, discard=isinstance(err, self.backend.OperationalError))
+            raise
+        except BaseException:
+            # The connection may be mid-result or mid-transaction; don't hand it to anyone else
+            self.release(connection, discard=True)
+            raise
+        else:
+            self.release(connection)
+
+    def prepared_statement(self, connection, template: str) -> tuple:
+        """
+        Return (template, cursor) with a prepared-statement cursor for template on connection.
+        The cursor and template object are reused on later calls, so the server parses and plans
+        each template once per connection. The least recently used statement is closed when more
+        than prepared_cache_size are open.
+        """
+        statements = self._statements.setdefault(id(connection), OrderedDict())
+        entry = statements.get(template)
+        if entry is not None:
+            statements.move_to_end(template)
+            self.prepared_hits += 1
+            return entry
+        self.prepared_misses += 1
+        # The cursor only re-prepares when given a different string object, so the same one is kept
+        entry = statements[template] = (template, self.backend.cursor(connection, prepared=True))
+        while len(statements) > self.prepared_cache_size:
+            _, (_, cursor) = statements.popitem(last=False)
+            try:
+                cursor.close()
+            except self.backend.Error:
+                pass
+        return entry
+
+    def _read_only(self, connection):
+        try:
+            self.backend.read_only(connection)
+        except BaseException:
+            self._close(connection)
+            raise
+
+    def _forget_statements(self, connection):
+        self._statements.pop(id(connection), None)
+
+    def _close(self, connection):
+        self._forget_statements(connection)
+        self.discarded += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(connection)
+
+
+class Watch:
+    """A running statement that can be cancelled once, until it is closed."""
+
+    def __init__(self, cancel):
+        self._cancel = cancel
+        self._lock = threading.Lock()
+        self.closed = False
+        # 'timeout' or 'cancelled' once the statement was told to stop
+        self.fired = None
+
+    def fire(self, reason: str = 'cancelled'):
+        # Holding the lock means close() waits for an in-flight cancel, so a late
+        # KILL QUERY can't hit the next statement on the same connection
+        with self._lock:
+            if self.closed or self.fired:
+                return
+            self.fired = reason
+            try:
+                self._cancel()
+            except Exception:
+                # The statement then runs until it finishes on its own
+                pass
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+
+
+class Watchdog:
+    """One background thread that cancels the statements still running at their deadline."""
 
-class chatDB:
     def __init__(self):
-        self.connection = None
-        self.cursor = None
-        self.connect_to_db()
-
-    def connect_to_db(self):
-        """Connect to local MySQl database"""
-        try:
-            self.connection = mysql.connector.connect(
-                host="localhost",
-                user="jasonhu",
-                password="hxh117221",
-                database="ChatDB")
-            self.cursor = self.connection.cursor()
+        self._deadlines = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def watch(self, cancel, seconds: float) -> Watch:
+        """Start watching a statement; cancel() stops it. Without seconds it can still be fired by hand."""
+        watch = Watch(cancel)
+        if seconds:
+            with self._condition:
+                heapq.heappush(self._deadlines, (time.monotonic() + seconds, next(self._order), watch))
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='chatdb-watchdog', daemon=True)
+                    self._thread.start()
+                self._condition.notify()
+        return watch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._deadlines and self._deadlines[0][2].closed:
+                    heapq.heappop(self._deadlines)
+                if not self._deadlines:
+                    self._condition.wait()
+                    continue
+                delay = self._deadlines[0][0] - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                _, _, watch = heapq.heappop(self._deadlines)
+            watch.fire('timeout')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+WATCHDOG = Watchdog()
+
+RESULT_CACHE = cache.ResultCache(RESULT_CACHE_BYTES)
+QUERY_METRICS = metrics.QueryMetrics()
+COST_GUARD = guard.CostGuard()
+
+
+def get_pool(size: int = None) -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ConnectionPool(size=size or POOL_SIZE)
+            # Open the first connection up front so a bad configuration fails here
+            pool.release(pool.acquire())
+            _pool = pool
             print("Successfully connected to NBA database")
-        except mysql.connector.Error as err:
+        return _pool
+
+
+def configure_pool(size: int = POOL_SIZE, idle_check: float = IDLE_CHECK_SECONDS, reset_on_return: bool = False,
+                   backend=None):
+    """Replace the process-wide pool with one using the given settings."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = ConnectionPool(size=size, idle_check=idle_check, reset_on_return=reset_on_return, backend=backend)
+        return _pool
+
+
+class chatDB:
+    def __init__(self, pool_size: int = None, result_cache=RESULT_CACHE, poll_interval: float = TABLE_POLL_SECONDS,
+                 query_metrics=QUERY_METRICS, query_timeout: float = None, cost_guard=COST_GUARD,
+                 read_only: bool = False, reset_sessions: bool = False):
+        self.pool = None
+        # With read_only, queries run on a pool of its own whose connections the database keeps from writing
+        self.read_only = read_only
+        # With reset_sessions, on a pool of its own that resets each connection's session when it is
+        # returned, so transactions, variables and session settings never pass from one caller to the next
+        self.reset_sessions = reset_sessions
+        self.backend = None
+        # Seconds each statement may take (0 for no limit), QUERY_TIMEOUT_SECONDS by default
+        self.query_timeout = QUERY_TIMEOUT_SECONDS if query_timeout is None else query_timeout
+        # Thread id -> watches of the statements it is running, for cancel_queries
+        self._watches = {}
+        self._watches_lock = threading.Lock()
+        self._runner = None
+        # Pass result_cache=None to always hit the database
+        self.result_cache = result_cache
+        # Pass query_metrics=None to skip timing queries
+        self.query_metrics = query_metrics
+        # Pass cost_guard=None to run every query without estimating it first
+        self.cost_guard = cost_guard
+        self.poll_interval = poll_interval
+        self.connect_to_db(pool_size)
+
+    def connect_to_db(self, pool_size: int = None):
+        """Connect to the configured database through the shared connection pool, or a read-only or resetting one"""
+        try:
+            self.backend = get_backend()
+        except (ImportError, OSError, backends.SQLiteBackend.Error) as err:
+            print(f"Connection Failed: {err}")
+            return
+        try:
+            if self.read_only or self.reset_sessions:
+                pool = ConnectionPool(size=pool_size or POOL_SIZE, reset_on_return=self.reset_sessions,
+                                      read_only=self.read_only)
+                pool.release(pool.acquire())
+                self.pool = pool
+                print(f"Successfully connected to NBA database{' (read-only)' if self.read_only else ''}")
+            else:
+                self.pool = get_pool(pool_size)
+        except self.backend.Error as err:
             print("Connection Failed")
 
-    def execute_query(self, query):
-        """Send Query"""
+    def stream_batches(self, query, params: tuple = None, batch_size: int = STREAM_BATCH_SIZE, timer=None,
+                       timeout: float = None):
+        """
+        Run query on an unbuffered cursor and yield (column_names, rows) batches of up to
+        batch_size rows as they arrive, so the full result set is never held in memory.
+        A query with no rows yields one empty batch so the column names are still known.
+        When params are given, query is a %s template run as a cached prepared statement.
+        A metrics.QueryTimer passed as timer collects the execute and fetch times and row count.
+        The statement is stopped if reading it takes longer than timeout seconds (by default
+        query_timeout): the server enforces the limit where it can, and the watchdog cancels
+        the statement from another connection otherwise.
+        """
+        timeout = self.query_timeout if timeout is None else timeout
+        if timeout:
+            query = self.backend.with_time_limit(query, timeout)
+        watchdog_timeout = timeout
+        connection = self.pool.acquire()
+        # A partly read result can't be handed to the next user, so the connection is
+        # only reused when the result was read to the end
+        discard = True
+        prepared = params is not None and self.backend.prepared_statements
+        if timeout and self.backend.server_time_limit:
+            watchdog_timeout += WATCHDOG_GRACE_SECONDS
+        watch = self._watch(connection, watchdog_timeout)
         try:
-            self.cursor.execute(query)
-            results = self.cursor.fetchall()
+            if prepared:
+                query, cursor = self.pool.prepared_statement(connection, query)
+            else:
+                cursor = self.backend.cursor(connection)
+            started = time.perf_counter()
+            try:
+                if prepared:
+                    cursor.execute(query, params)
+                elif params is None:
+                    cursor.execute(self.backend.translate(query))
+                else:
+                    cursor.execute(self.backend.translate(query), params)
+            except self.backend.DatabaseError as err:
+                discard = isinstance(err, self.backend.OperationalError)
+                raise
+            finally:
+                if timer is not None:
+                    timer.execute += time.perf_counter() - started
+            self._invalidate_written(query)
+            column_names = [desc[0] for desc in cursor.description] if cursor.description else []
+            yielded = False
+            while True:
+                started = time.perf_counter()
+                rows = cursor.fetchmany(batch_size)
+                if timer is not None:
+                    timer.fetch += time.perf_counter() - started
+                    timer.rows += len(rows)
+                if not rows:
+                    break
+                yielded = True
+                yield column_names, rows
+            if not yielded:
+                yield column_names, []
+            if not prepared:
+                cursor.close()
+            discard = False
+        except self.backend.Error as err:
+            if watch.fired == 'timeout':
+                raise self.backend.DatabaseError(f"Query stopped after running for more than {timeout:g}s") from err
+            if watch.fired:
+                raise self.backend.DatabaseError("Query cancelled") from err
+            raise
+        finally:
+            self._unwatch(watch)
+            self.pool.release(connection, discard=discard)
+
+    def _watch(self, connection, seconds: float) -> Watch:
+        handle = self.backend.cancel_handle(connection)
+        backend = self.backend
+        watch = WATCHDOG.watch(lambda: backend.cancel(handle), seconds)
+        # A generator can be finished by another thread than the one that started it (AsyncChatDB.stream)
+        watch.thread = threading.get_ident()
+        with self._watches_lock:
+            self._watches.setdefault(watch.thread, set()).add(watch)
+        return watch
 
-            # Extract column names for tabular format
-            column_names = [desc[0] for desc in self.cursor.description]
+    def _unwatch(self, watch: Watch):
+        watch.close()
+        with self._watches_lock:
+            watches = self._watches.get(watch.thread)
+            if watches is not None:
+                watches.discard(watch)
+                if not watches:
+                    del self._watches[watch.thread]
+
+    def cancel_queries(self, thread_id: int = None):
+        """Cancel the statements running for this chatDB, or only those run by thread_id."""
+        with self._watches_lock:
+            watches = [watch for ident, running in self._watches.items() if thread_id in (None, ident)
+                       for watch in running]
+        for watch in watches:
+            watch.fire()
+
+    def _interruptible(self, func, *args):
+        """
+        Call func, on a helper thread when called from the main thread, so that Ctrl-C cancels
+        the statement it is running and returns None instead of ending the program.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return func(*args)
+        if self._runner is None:
+            self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chatdb-query')
+        worker = []
+
+        def call():
+            worker.append(threading.get_ident())
+            return func(*args)
+
+        future = self._runner.submit(call)
+        try:
+            while True:
+                try:
+                    return future.result(timeout=0.1)
+                except TimeoutError:
+                    pass
+        except KeyboardInterrupt:
+            if worker:
+                self.cancel_queries(worker[0])
+            future.cancel()
+            # The statement fails with 'Query cancelled' and func returns shortly after
+            while not future.done():
+                time.sleep(0.01)
+            return None
+
+    def stream_rows(self, query, params: tuple = None, batch_size: int = STREAM_BATCH_SIZE):
+        """Yield the rows of query one at a time."""
+        for _, rows in self.stream_batches(query, params, batch_size):
+            yield from rows
+
+    def stream_table(self, query, params: tuple = None, batch_size: int = STREAM_BATCH_SIZE):
+        """Yield the result of query as a sequence of formatted tables of up to batch_size rows each."""
+        if self.pool is None:
+            print("Error executing query: not connected to the database")
+            return
+        try:
+            for column_names, rows in self.stream_batches(query, params, batch_size):
+                yield tabulate(rows, headers=column_names, tablefmt="psql")
+        except self.backend.Error as err:
+            print(f"Error executing query: {err}")
+
+    def execute_columnar(self, query, params: tuple = None, batch_size: int = STREAM_BATCH_SIZE):
+        """
+        Run query and return its result as {column name: NumPy array}, see columnar.from_batches.
+        Rows are converted a batch at a time, never held as a list of tuples or formatted.
+        The arrays (and their masks) can be handed to pandas or pyarrow without copying.
+        Returns None on error, like execute_query. Needs numpy.
+        """
+        import columnar
+        if self.pool is None:
+            print("Error executing query: not connected to the database")
+            return None
+        try:
+            return columnar.from_batches(self.stream_batches(query, params, batch_size))
+        except self.backend.Error as err:
+            print(f"Error executing query: {err}")
+            return None
+
+    def paginate(self, query, params: tuple = None, page_size: int = paging.PAGE_SIZE, key=None):
+        """
+        A paging.KeysetPager over the result of a SELECT; call first(), next() and prev()
+        for formatted pages. key names the result's unique column(s) when they can't be inferred.
+        """
+        return paging.KeysetPager(self, query, params, page_size, key)
+
+    def _invalidate_written(self, query):
+        """Drop cached results of the tables a statement may have changed."""
+        if self.result_cache is None:
+            return
+        tables = cache.written_tables(query)
+        if tables is None:
+            self.result_cache.invalidate()
+        elif tables:
+            self.result_cache.invalidate(tables)
+
+    def _poll_table_changes(self):
+        """Invalidate cached results of tables whose UPDATE_TIME moved, e.g. written by another client."""
+        query = self.backend.update_times_query
+        if self.poll_interval is None or query is None or not self.result_cache.poll_due(self.poll_interval):
+            return
+        try:
+            update_times = {name.lower(): updated for name, updated in self.stream_rows(query)}
+        except self.backend.Error:
+            return
+        self.result_cache.sync_update_times(update_times)
+
+    def cache_stats(self) -> dict:
+        """Hits, misses and bytes held by the result cache."""
+        return self.result_cache.stats() if self.result_cache is not None else {}
+
+    def query_stats(self) -> dict:
+        """Query counts and rolling latency histograms, see metrics.QueryMetrics.snapshot."""
+        return self.query_metrics.snapshot() if self.query_metrics is not None else {}
+
+    def execute_query(self, query, params: tuple = None, origin: str = 'other', output_func=print):
+        """
+        Send Query, optionally as a prepared %s template with params.
+        origin says where the query came from ('lesson', 'repl', 'nl') in the query metrics.
+        SELECTs from the origins the cost guard covers are estimated first, and may get a
+        warning, an added LIMIT, or have their result printed in batches as it streams in.
+        Errors, warnings and streamed batches are passed to output_func as they happen.
+        Ctrl-C while it runs cancels the query and returns None.
+        """
+        return self._interruptible(self._execute_query, query, params, origin, output_func)
+
+    def _check_cost(self, query, params: tuple, timer, output_func=print) -> guard.Decision:
+        decision = self.cost_guard.check(self, query, params)
+        if timer is not None:
+            timer.guard = decision.action
+            timer.estimated_rows = decision.returned
+        if decision.warning:
+            output_func(f"Warning: {decision.warning}")
+        return decision
+
+    def _stream_output(self, query, params: tuple, timer, decision: guard.Decision, output_func=print) -> str:
+        """Pass the result to output_func batch by batch as it arrives, returning a summary instead of the table."""
+        rows = 0
+        for column_names, batch in self.stream_batches(query, params, timer=timer):
+            started = time.perf_counter()
+            table = tabulate(batch, headers=column_names, tablefmt="psql")
+            if timer is not None:
+                timer.render += time.perf_counter() - started
+                timer.bytes += len(table)
+            output_func(table)
+            sys.stdout.flush()
+            rows += len(batch)
+        return f"({rows} rows, streamed in batches of {STREAM_BATCH_SIZE}; about {decision.returned:,.0f} were expected)"
+
+    def _execute_query(self, query, params: tuple = None, origin: str = 'other', output_func=print):
+        if self.pool is None:
+            output_func("Error executing query: not connected to the database")
+            return None
+        timer = self.query_metrics.start(query, params, origin) if self.query_metrics is not None else None
+        try:
+            key = None
+            if self.result_cache is not None and cache.is_cacheable(query):
+                self._poll_table_changes()
+                key = self.result_cache.key(query, params)
+                formatted_output = self.result_cache.get(key)
+                if formatted_output is not None:
+                    if timer is not None:
+                        timer.cached = True
+                        timer.bytes = len(formatted_output)
+                    return formatted_output
+                tables = cache.referenced_tables(query)
+                versions = self.result_cache.versions(tables)
+
+            decision = None
+            if self.cost_guard is not None and self.cost_guard.applies(query, origin):
+                decision = self._check_cost(query, params, timer, output_func)
+                if decision.action == 'stream':
+                    return self._stream_output(query, params, timer, decision, output_func)
+                if decision.action == 'limit':
+                    # Not what the query asked for, so not cached as its result
+                    query, key = decision.query, None
+
+            column_names, results = [], []
+            for column_names, rows in self.stream_batches(query, params, timer=timer):
+                results.extend(rows)
 
             # Format the output using tabulate
+            started = time.perf_counter()
             formatted_output = tabulate(results, headers=column_names, tablefmt="psql")
+            if timer is not None:
+                timer.render = time.perf_counter() - started
+                timer.bytes = len(formatted_output)
+            if decision is not None and decision.action == 'limit' and len(results) >= decision.limit:
+                formatted_output += (f"\nShowing the first {decision.limit} of about {decision.returned:,.0f} rows; "
+                                     f"add your own LIMIT to choose how many")
+            if key is not None:
+                self.result_cache.put(key, tables, versions, formatted_output)
             return formatted_output
-        except mysql.connector.Error as err:
-            print(f"Error executing query: {err}")
+        except self.backend.Error as err:
+            if timer is not None:
+                timer.error = str(err)
+            output_func(f"Error executing query: {err}")
             return None
+        finally:
+            if timer is not None:
+                self.query_metrics.record(timer)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,296 @@
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+
+TABLES = ('Teams', 'Players', 'Games')
+COLUMNS = {
+    'Teams': ('TeamID', 'TeamName', 'CEO', 'Owner', 'Location', 'Stadium', 'FoundedYear', 'NetWorth_USD'),
+    'Players': ('PlayerID', 'FirstName', 'LastName', 'Position', 'TeamID', 'Height_cm', 'Weight_kg', 'Birthdate',
+                'Nationality', 'PointsPerGame', 'ReboundsPerGame', 'AssistsPerGame', 'StealsPerGame',
+                'BlocksPerGame', 'FieldGoalPercentage', 'ThreePointPercentage', 'FreeThrowPercentage',
+                'NetWorth_USD'),
+    'Games': ('GameID', 'HomeTeamID', 'GuestTeamID', 'Time', 'Score', 'Round', 'GameNumber')
+}
+# Columns written as quoted literals in SQL output
+STRING_COLUMNS = {'TeamName', 'CEO', 'Owner', 'Location', 'Stadium', 'FirstName', 'LastName', 'Position',
+                  'Birthdate', 'Nationality', 'Time', 'Score', 'Round', 'GameNumber'}
+# Rows per table at scale 1, the size of data.sql
+BASE_ROWS = {'Teams': 30, 'Players': 70, 'Games': 65}
+CHUNK_ROWS = 100000
+ROWS_PER_INSERT = 1000
+DATA_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.sql')
+
+FIRST_NAMES = np.array(['James', 'Michael', 'Chris', 'Anthony', 'Kevin', 'Jayson', 'Luka', 'Nikola', 'Joel', 'Devin',
+                        'Trae', 'Jalen', 'Tyrese', 'Donovan', 'Jaylen', 'Zion', 'Ja', 'Bam', 'Darius', 'Paolo',
+                        'Stephen', 'Klay', 'Damian', 'Kyrie', 'Paul', 'Jimmy', 'Kawhi', 'Victor', 'Shai', 'Evan'])
+LAST_NAMES = np.array(['Johnson', 'Williams', 'Brown', 'Jones', 'Davis', 'Miller', 'Wilson', 'Thompson', 'White',
+                       'Harris', 'Martin', 'Jackson', 'Green', 'Walker', 'Young', 'Allen', 'King', 'Wright', 'Hill',
+                       'Scott', 'Adams', 'Baker', 'Nelson', 'Carter', 'Mitchell', 'Roberts', 'Turner', 'Phillips',
+                       'Campbell', "O'Neal"])
+CITIES = np.array(['Atlanta', 'Boston', 'Brooklyn', 'Charlotte', 'Chicago', 'Cleveland', 'Dallas', 'Denver',
+                   'Detroit', 'Houston', 'Indiana', 'Los Angeles', 'Memphis', 'Miami', 'Milwaukee', 'Minnesota',
+                   'New Orleans', 'New York', 'Oklahoma City', 'Orlando', 'Philadelphia', 'Phoenix', 'Portland',
+                   'Sacramento', 'San Antonio', 'Toronto', 'Utah', 'Washington', 'Seattle', 'Las Vegas'])
+MASCOTS = np.array(['Hawks', 'Celtics', 'Nets', 'Hornets', 'Bulls', 'Cavaliers', 'Mavericks', 'Nuggets', 'Pistons',
+                    'Rockets', 'Pacers', 'Lakers', 'Grizzlies', 'Heat', 'Bucks', 'Timberwolves', 'Pelicans',
+                    'Knicks', 'Thunder', 'Magic', 'Suns', 'Blazers', 'Kings', 'Spurs', 'Raptors', 'Jazz', 'Wizards',
+                    'SuperSonics', 'Aces', 'Comets'])
+SPONSORS = np.array(['State Farm', 'TD', 'Barclays', 'Spectrum', 'United', 'Rocket', 'American Airlines', 'Ball',
+                     'Little Caesars', 'Toyota', 'Gainbridge', 'Crypto.com', 'FedEx', 'Kaseya', 'Fiserv', 'Target',
+                     'Smoothie King', 'Paycom', 'Kia', 'Wells Fargo', 'Footprint', 'Moda', 'Golden 1', 'Frost Bank',
+                     'Scotiabank', 'Delta', 'Capital One', 'Chase'])
+ARENAS = np.array(['Arena', 'Center', 'Garden', 'Fieldhouse', 'Forum'])
+POSITIONS = np.array(['PG', 'SG', 'SF', 'PF', 'C'])
+# Mean height (cm) and per-game rebound, assist and block levels by position
+POSITION_HEIGHT = np.array([188.0, 196.0, 201.0, 206.0, 211.0])
+POSITION_REBOUNDS = np.array([3.5, 4.0, 5.5, 7.0, 9.0])
+POSITION_ASSISTS = np.array([6.0, 3.5, 3.0, 2.5, 2.0])
+POSITION_BLOCKS = np.array([0.2, 0.3, 0.5, 0.8, 1.3])
+NATIONALITIES = np.array(['USA', 'Canada', 'France', 'Serbia', 'Australia', 'Germany', 'Slovenia', 'Greece',
+                          'Cameroon', 'Spain', 'Nigeria', 'Lithuania'])
+NATIONALITY_WEIGHTS = np.array([0.72, 0.06, 0.04, 0.02, 0.03, 0.03, 0.01, 0.01, 0.02, 0.02, 0.02, 0.02])
+ROUNDS = np.array(['First Round', 'Conference Semifinals', 'Conference Finals', 'NBA Finals'])
+ROUND_WEIGHTS = np.array([0.55, 0.25, 0.12, 0.08])
+
+
+def _pick(rng, values: np.ndarray, count: int, weights=None) -> np.ndarray:
+    return values[rng.choice(len(values), size=count, p=weights)]
+
+
+def _join(*parts) -> np.ndarray:
+    """Concatenate string arrays (or scalars) element-wise."""
+    result = np.asarray(parts[0]).astype(str)
+    for part in parts[1:]:
+        result = np.char.add(result, np.asarray(part).astype(str))
+    return result
+
+
+def generate_teams(rng, first_id: int, count: int, teams: int) -> list:
+    ids = np.arange(first_id, first_id + count)
+    # Names come from the ID so they are unique whatever the chunking; a suffix keeps them unique past 900 teams
+    city = CITIES[(ids - 1) % len(CITIES)]
+    name = _join(city, ' ', MASCOTS[((ids - 1) // len(CITIES)) % len(MASCOTS)])
+    overflow = ids > len(CITIES) * len(MASCOTS)
+    name = np.where(overflow, _join(name, ' ', ids), name)
+    return [
+        ids,
+        name,
+        _join(_pick(rng, FIRST_NAMES, count), ' ', _pick(rng, LAST_NAMES, count)),
+        _join(_pick(rng, FIRST_NAMES, count), ' ', _pick(rng, LAST_NAMES, count)),
+        city,
+        _join(_pick(rng, SPONSORS, count), ' ', _pick(rng, ARENAS, count)),
+        rng.integers(1946, 2005, size=count),
+        np.round(rng.lognormal(np.log(3e9), 0.35, size=count), -6)
+    ]
+
+
+def generate_players(rng, first_id: int, count: int, teams: int) -> list:
+    ids = np.arange(first_id, first_id + count)
+    position = rng.choice(len(POSITIONS), size=count, p=[0.2, 0.2, 0.2, 0.2, 0.2])
+    height = np.rint(rng.normal(POSITION_HEIGHT[position], 5.0)).astype(np.int64)
+    weight = np.rint(0.95 * height - 95 + rng.normal(0, 6.0, size=count)).astype(np.int64)
+    # Ages 19 to 40 as of the 2023-24 season
+    birthdate = np.datetime64('1984-01-01') + rng.integers(0, 365 * 21, size=count).astype('timedelta64[D]')
+    points = np.clip(rng.gamma(2.2, 5.0, size=count), 0.0, 40.0)
+    # Better scorers play more minutes, so their other numbers scale with scoring a little
+    minutes = 0.6 + points / 25.0
+    return [
+        ids,
+        _pick(rng, FIRST_NAMES, count),
+        _pick(rng, LAST_NAMES, count),
+        POSITIONS[position],
+        rng.integers(1, teams + 1, size=count),
+        height,
+        weight,
+        np.datetime_as_string(birthdate, unit='D'),
+        _pick(rng, NATIONALITIES, count, NATIONALITY_WEIGHTS),
+        np.round(points, 1),
+        np.round(np.clip(rng.gamma(4.0, POSITION_REBOUNDS[position] * minutes / 4.0), 0.0, 16.0), 1),
+        np.round(np.clip(rng.gamma(3.0, POSITION_ASSISTS[position] * minutes / 3.0), 0.0, 12.0), 1),
+        np.round(np.clip(rng.gamma(5.0, 0.9 * minutes / 5.0), 0.0, 3.0), 1),
+        np.round(np.clip(rng.gamma(2.0, POSITION_BLOCKS[position] * minutes / 2.0), 0.0, 4.0), 1),
+        np.round(np.clip(rng.normal(46.0, 5.0, size=count), 30.0, 65.0), 1),
+        np.round(np.clip(rng.normal(35.5, 4.5, size=count), 15.0, 48.0), 1),
+        np.round(np.clip(rng.normal(78.0, 8.0, size=count), 40.0, 95.0), 1),
+        np.round(rng.lognormal(np.log(1.5e7), 1.0, size=count), -5)
+    ]
+
+
+def generate_games(rng, first_id: int, count: int, teams: int) -> list:
+    ids = np.arange(first_id, first_id + count)
+    home = rng.integers(1, teams + 1, size=count)
+    # Any other team, never the home team itself
+    guest = (home - 1 + rng.integers(1, max(teams, 2), size=count)) % teams + 1
+    day = np.datetime64('2000-10-01T00:00:00') + rng.integers(0, 365 * 24, size=count).astype('timedelta64[D]')
+    tip_off = day + (np.array([19 * 60, 19 * 60 + 30, 20 * 60, 20 * 60 + 30])[rng.integers(0, 4, size=count)]
+                     ).astype('timedelta64[m]')
+    home_points = np.rint(rng.normal(114.0, 12.0, size=count)).astype(np.int64)
+    guest_points = np.rint(rng.normal(111.0, 12.0, size=count)).astype(np.int64)
+    # Basketball games don't end in a tie
+    guest_points += guest_points == home_points
+    return [
+        ids,
+        home,
+        guest,
+        np.char.replace(np.datetime_as_string(tip_off, unit='s'), 'T', ' '),
+        _join(home_points, '-', guest_points),
+        _pick(rng, ROUNDS, count, ROUND_WEIGHTS),
+        _join('Game-', rng.integers(1, 8, size=count))
+    ]
+
+
+GENERATORS = {'Teams': generate_teams, 'Players': generate_players, 'Games': generate_games}
+
+
+def table_sizes(scale: float, overrides: dict = None) -> dict:
+    """Rows per table at a scale factor, with explicit counts taking precedence."""
+    sizes = {table: max(1, int(round(rows * scale))) for table, rows in BASE_ROWS.items()}
+    sizes['Teams'] = max(sizes['Teams'], 2)
+    sizes.update({table: rows for table, rows in (overrides or {}).items() if rows})
+    return sizes
+
+
+def iter_chunks(table: str, rows: int, teams: int, seed: int = 551, chunk_rows: int = CHUNK_ROWS):
+    """
+    Yield the table's rows as lists of column arrays of up to chunk_rows rows.
+    Every chunk has its own generator seeded from (seed, table, chunk), so the output only
+    depends on the seed and the chunk size.
+    """
+    for index, first in enumerate(range(0, rows, chunk_rows)):
+        rng = np.random.default_rng([seed, TABLES.index(table), index])
+        yield GENERATORS[table](rng, first + 1, min(chunk_rows, rows - first), teams)
+
+
+def _values(table: str, columns: list, sql: bool) -> list:
+    """Column arrays as lists of Python values (quoted literals for SQL string columns)."""
+    values = []
+    for name, column in zip(COLUMNS[table], columns):
+        column = column.tolist()
+        if sql and name in STRING_COLUMNS:
+            column = ["'" + value.replace("'", "''") + "'" for value in column]
+        values.append(column)
+    return values
+
+
+class ChunkedOutput:
+    """Text output for one table that moves on to a new numbered file every rows_per_file rows."""
+
+    def __init__(self, directory: str, table: str, extension: str, rows_per_file: int = 0, header: str = ''):
+        self.directory = directory
+        self.table = table
+        self.extension = extension
+        self.rows_per_file = rows_per_file
+        self.header = header
+        self.paths = []
+        self._file = None
+        self._rows = 0
+
+    def rows_left(self) -> int:
+        """Rows that still fit in the current file, opening a new one when it is full."""
+        if self._file is None or (self.rows_per_file and self._rows >= self.rows_per_file):
+            self.close()
+            suffix = f".{len(self.paths) + 1:04d}" if self.rows_per_file else ''
+            path = os.path.join(self.directory, f"{self.table}{suffix}.{self.extension}")
+            self._file = open(path, 'w', encoding='utf-8', newline='')
+            self._file.write(self.header)
+            self.paths.append(path)
+            self._rows = 0
+        return self.rows_per_file - self._rows if self.rows_per_file else sys.maxsize
+
+    def write(self, text: str, rows: int):
+        self._file.write(text)
+        self._rows += rows
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def write_table(table: str, rows: int, teams: int, directory: str, fmt: str = 'csv', seed: int = 551,
+                chunk_rows: int = CHUNK_ROWS, rows_per_file: int = 0, rows_per_insert: int = ROWS_PER_INSERT) -> list:
+    """Generate one table into CSV or SQL files, returning their paths."""
+    names = COLUMNS[table]
+    if fmt == 'csv':
+        output = ChunkedOutput(directory, table, 'csv', rows_per_file, ','.join(names) + '\r\n')
+    else:
+        output = ChunkedOutput(directory, table, 'sql', rows_per_file)
+    insert = f"INSERT INTO {table} ({', '.join(names)}) VALUES\n"
+    row_format = '(' + ', '.join(['%s'] * len(names)) + ')'
+    try:
+        for columns in iter_chunks(table, rows, teams, seed, chunk_rows):
+            values = list(zip(*_values(table, columns, fmt == 'sql')))
+            start = 0
+            while start < len(values):
+                end = start + min(output.rows_left(), len(values) - start)
+                if fmt == 'csv':
+                    text = _csv_text(values[start:end])
+                else:
+                    text = ''.join(insert + ',\n'.join(row_format % row
+                                                       for row in values[part:min(part + rows_per_insert, end)]) + ';\n'
+                                   for part in range(start, end, rows_per_insert))
+                output.write(text, end - start)
+                start = end
+    finally:
+        output.close()
+    return output.paths
+
+
+class _Buffer(list):
+    write = list.append
+
+
+def _csv_text(rows: list) -> str:
+    buffer = _Buffer()
+    csv.writer(buffer).writerows(rows)
+    return ''.join(buffer)
+
+
+def schema_ddl(path: str = DATA_SQL) -> str:
+    """The CREATE TABLE statements of data.sql, which the generated data follows."""
+    with open(path, encoding='utf-8') as data_file:
+        text = data_file.read()
+    return text[:text.index('INSERT INTO')].strip() + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a scaled, synthetic copy of the NBA database.")
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help="multiple of data.sql's row counts")
+    parser.add_argument('--teams', type=int, help="exact number of teams (overrides --scale)")
+    parser.add_argument('--players', type=int, help="exact number of players (overrides --scale)")
+    parser.add_argument('--games', type=int, help="exact number of games (overrides --scale)")
+    parser.add_argument('-f', '--format', choices=['csv', 'sql'], default='csv')
+    parser.add_argument('-o', '--output', default='generated', help="output directory")
+    parser.add_argument('--seed', type=int, default=551)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="rows generated per vectorized step")
+    parser.add_argument('--rows-per-file', type=int, default=0, help="split each table into files of this many rows")
+    parser.add_argument('--no-ddl', action='store_true', help="don't write schema.sql with the CREATE TABLE statements")
+    args = parser.parse_args(argv)
+
+    sizes = table_sizes(args.scale, {'Teams': args.teams, 'Players': args.players, 'Games': args.games})
+    os.makedirs(args.output, exist_ok=True)
+    if not args.no_ddl:
+        with open(os.path.join(args.output, 'schema.sql'), 'w', encoding='utf-8') as ddl_file:
+            ddl_file.write(schema_ddl())
+    for table in TABLES:
+        start = time.perf_counter()
+        paths = write_table(table, sizes[table], sizes['Teams'], args.output, args.format, args.seed,
+                            args.chunk_rows, args.rows_per_file)
+        elapsed = time.perf_counter() - start
+        rate = sizes[table] / elapsed if elapsed else 0.0
+        print(f"{table}: {sizes[table]} rows in {len(paths)} file(s), {elapsed:.1f}s ({rate:.0f} rows/s)",
+              file=sys.stderr)
+    # SQL files are loaded in the order given, so parents are listed first
+    files = ' '.join(os.path.join(args.output, f"{table}*.{args.format}") for table in TABLES)
+    schema_file = '' if args.no_ddl else os.path.join(args.output, 'schema.sql') + ' '
+    print(f"Load with: python loader.py {schema_file}{files}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
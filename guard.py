@@ -0,0 +1,217 @@
+import json
+import os
+import re
+
+import cache
+
+
+# What to do with a query estimated to return more than GUARD_MAX_ROWS rows:
+# 'warn' runs it as is, 'limit' adds LIMIT GUARD_MAX_ROWS, 'stream' prints it in batches
+# instead of building one table, 'off' skips the estimate altogether
+GUARD_ACTION = os.environ.get('CHATDB_GUARD', 'limit')
+GUARD_MAX_ROWS = int(os.environ.get('CHATDB_GUARD_MAX_ROWS', 10000))
+# Queries estimated to read more rows than this get a warning, whatever they return
+GUARD_MAX_SCAN = int(os.environ.get('CHATDB_GUARD_MAX_SCAN', 1000000))
+# Query origins checked: what people type or have translated, not the tutor's own lessons
+GUARDED_ORIGINS = ('repl', 'nl')
+ACTIONS = ('off', 'warn', 'limit', 'stream')
+
+# Without statistics SQLite assumes an index equality finds about 10 rows and a range keeps a quarter
+SQLITE_INDEX_ROWS = 10
+SQLITE_RANGE_FRACTION = 0.25
+
+_TRAILING_LIMIT = re.compile(r"\bLIMIT\s+(\d+)(?:\s*,\s*(\d+))?(?:\s+OFFSET\s+\d+)?\s*$", re.I)
+_ANY_LIMIT = re.compile(r"\bLIMIT\b", re.I)
+# A select list that is only aggregates returns one row, unless grouped or combined
+_AGGREGATE_ONLY = re.compile(r"^\s*SELECT\s+(?:COUNT|SUM|AVG|MIN|MAX)\s*\(", re.I)
+_GROUPED = re.compile(r"\bGROUP\s+BY\b|\bUNION\b", re.I)
+# Table references and their aliases, to map EXPLAIN QUERY PLAN names back to tables
+_TABLE_REFERENCE = re.compile(r"(?:\bFROM|\bJOIN|,)\s+`?(\w+)`?(?:\s+(?:AS\s+)?(?!(?:ON|USING|WHERE|JOIN|INNER|LEFT|"
+                              r"RIGHT|CROSS|NATURAL|GROUP|ORDER|LIMIT|HAVING|UNION)\b)(\w+))?", re.I)
+_SQLITE_STEP = re.compile(r"^(SCAN|SEARCH)\s+(\w+)(.*)$")
+
+
+def _nodes(node):
+    """Every dict in an EXPLAIN FORMAT=JSON document."""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _nodes(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _nodes(value)
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def strip_query(query: str) -> str:
+    return query.strip().rstrip(';').strip()
+
+
+def mysql_estimate(plan: dict) -> tuple:
+    """
+    (rows read, rows returned) from an EXPLAIN FORMAT=JSON plan. Each table of a join is
+    read once per row the tables before it produced; the outermost join's last table
+    gives the rows returned.
+    """
+    scanned, returned = 0.0, None
+    chained = set()
+    for node in _nodes(plan):
+        loop = node.get('nested_loop')
+        if isinstance(loop, list):
+            loops = 1.0
+            for entry in loop:
+                table = entry.get('table', {}) if isinstance(entry, dict) else {}
+                chained.add(id(table))
+                scanned += _number(table.get('rows_examined_per_scan')) * loops
+                loops = _number(table.get('rows_produced_per_join'))
+            if returned is None:
+                returned = loops
+        table = node.get('table')
+        if isinstance(table, dict) and id(table) not in chained:
+            scanned += _number(table.get('rows_examined_per_scan'))
+            if returned is None:
+                returned = _number(table.get('rows_produced_per_join'))
+    return scanned, returned or 0.0
+
+
+def sqlite_estimate(plan: list, query: str, table_rows) -> tuple:
+    """
+    (rows read, rows returned) from EXPLAIN QUERY PLAN rows, which name the tables each loop
+    scans or searches but carry no row counts. A SCAN reads the whole table (table_rows(name)
+    gives its size, or None when unknown), a SEARCH on the primary key one row, on another
+    index SQLITE_INDEX_ROWS, a range a quarter of the table. Returns None when a table's size
+    is unknown, e.g. a materialized subquery.
+    """
+    aliases = {}
+    for table, alias in _TABLE_REFERENCE.findall(query):
+        aliases[table.lower()] = table
+        if alias:
+            aliases[alias.lower()] = table
+    # Loops of each block (the top level and every subquery) nest in plan order
+    chains = {}
+    for _, parent, _, detail in plan:
+        step = _SQLITE_STEP.match(detail)
+        if step:
+            chains.setdefault(parent, []).append(step.groups())
+    scanned, returned = 0.0, 0.0
+    for parent, steps in chains.items():
+        loops = 1.0
+        for kind, name, how in steps:
+            if kind == 'SCAN' and name == 'CONSTANT' and how.strip() == 'ROW':
+                # A SELECT without FROM
+                continue
+            size = table_rows(aliases.get(name.lower(), name))
+            if kind == 'SCAN':
+                if size is None:
+                    return None
+                rows = size
+            elif '>' in how or '<' in how:
+                if size is None:
+                    return None
+                rows = size * SQLITE_RANGE_FRACTION
+            elif 'PRIMARY KEY' in how or 'sqlite_autoindex' in how:
+                rows = 1.0
+            else:
+                rows = SQLITE_INDEX_ROWS
+            scanned += rows * loops
+            loops *= rows
+        if parent == min(chains):
+            returned = loops
+    return scanned, returned
+
+
+class Decision:
+    """What the guard made of a query before it ran."""
+
+    def __init__(self, action: str, query: str, scanned: float = None, returned: float = None, limit: int = None,
+                 warning: str = None):
+        # 'run', 'warn', 'limit', 'stream', or 'unknown' when the plan couldn't be estimated
+        self.action = action
+        # The query to run, with the added LIMIT for 'limit'
+        self.query = query
+        self.scanned = scanned
+        self.returned = returned
+        self.limit = limit
+        self.warning = warning
+
+
+class CostGuard:
+    """
+    Estimates with EXPLAIN how many rows a SELECT will read and return before chatDB runs it.
+    Above max_rows returned it warns, adds a LIMIT or streams the result, as action says;
+    above max_scan read it warns. A LIMIT the query already has is respected and counted in.
+    """
+
+    def __init__(self, action: str = GUARD_ACTION, max_rows: int = GUARD_MAX_ROWS, max_scan: int = GUARD_MAX_SCAN,
+                 origins: tuple = GUARDED_ORIGINS):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown guard action: {action}")
+        self.action = action
+        self.max_rows = max_rows
+        self.max_scan = max_scan
+        self.origins = origins
+
+    def applies(self, query: str, origin: str) -> bool:
+        return self.action != 'off' and origin in self.origins and cache.statement_kind(query) == 'select'
+
+    def estimate(self, db, query: str, params: tuple = None) -> tuple:
+        """(rows read, rows returned) of query as planned now, or None if the plan says too little."""
+        query = strip_query(query)
+        if db.backend.name == 'mysql':
+            plans = list(db.stream_rows(f"EXPLAIN FORMAT=JSON {query}", params))
+            if not plans:
+                return None
+            scanned, returned = mysql_estimate(json.loads(plans[0][0]))
+        elif db.backend.name == 'sqlite':
+            sizes = {}
+
+            def table_rows(table):
+                if table not in sizes:
+                    # MAX(rowid) is one B-tree descent, where COUNT(*) would read the table
+                    try:
+                        (size,), = db.stream_rows(f'SELECT MAX(rowid) FROM "{table}"')
+                        sizes[table] = size or 0
+                    except db.backend.Error:
+                        sizes[table] = None
+                return sizes[table]
+
+            estimate = sqlite_estimate(list(db.stream_rows(f"EXPLAIN QUERY PLAN {query}", params)), query, table_rows)
+            if estimate is None:
+                return None
+            scanned, returned = estimate
+        else:
+            return None
+        if _AGGREGATE_ONLY.match(query) and not _GROUPED.search(query):
+            returned = 1.0
+        limit = _TRAILING_LIMIT.search(query)
+        if limit:
+            returned = min(returned, int(limit.group(2) or limit.group(1)))
+        return scanned, returned
+
+    def check(self, db, query: str, params: tuple = None) -> Decision:
+        """
+        Decide how to run query. Raises the backend's errors from EXPLAIN, which are
+        usually the query's own (a typo, a missing table).
+        """
+        estimate = self.estimate(db, query, params)
+        if estimate is None:
+            return Decision('unknown', query)
+        scanned, returned = estimate
+        warning = f"This query is estimated to read about {scanned:,.0f} rows" if scanned > self.max_scan else None
+        if returned > self.max_rows:
+            if self.action == 'limit' and not _ANY_LIMIT.search(query):
+                return Decision('limit', f"{strip_query(query)} LIMIT {self.max_rows}", scanned, returned,
+                                limit=self.max_rows, warning=warning)
+            if self.action == 'stream':
+                return Decision('stream', query, scanned, returned, warning=warning)
+            returns = f"return about {returned:,.0f} rows"
+            warning = f"{warning} and {returns}" if warning else f"This query is estimated to {returns}"
+        if warning:
+            return Decision('warn', query, scanned, returned, warning=warning)
+        return Decision('run', query, scanned, returned)
@@ -0,0 +1,407 @@
+import hashlib
+import re
+from collections import deque, namedtuple
+
+
+COMMAND_PATTERNS = {
+    'select': ['select', 'get', 'show', 'display', 'find', 'choose', 'pick', 'what', 'list'],
+    'join': ['join', 'combine', 'relate', 'with'],
+    'group': ['group', 'cluster', 'categorize', 'group by', 'per'],
+    'order': ['order', 'sort', 'arrange', 'rank', 'by'],
+    'count': ['count', 'how many', 'number of', 'total'],
+    'sum': ['sum', 'total'],
+    'average': ['average', 'mean', 'avg'],
+    'maximum': ['maximum', 'highest', 'most', 'max', 'greatest', 'biggest'],
+    'minimum': ['minimum', 'lowest', 'least', 'min', 'smallest'],
+    'limit': ['only', 'just', 'limit', 'top', 'first', 'under', 'at most'],
+    'desc': ['desc', 'descending', 'decreasing', 'high to low', 'largest to smallest', 'biggest to smallest'],
+    'asc': ['asc', 'ascending', 'increasing', 'low to high', 'smallest to largest'],
+    'having': ['having', 'with', 'that have', 'whose'],
+    'where': ['where', 'filter'],
+    'and': ['and', 'as well as'],
+    'or': ['or'],
+    'not': ['not', 'no', 'without']
+}
+
+COMPARISON_PATTERNS = {
+    'greater_than': ['greater than', 'more than', 'above', 'exceeding', 'over', 'taller than', 'heavier than',
+                     'older than', 'after'],
+    'less_than': ['less than', 'fewer than', 'below', 'under', 'smaller than', 'lighter than', 'younger than',
+                  'before'],
+    'equal_to': ['equal to', 'equals', 'equal', 'is', 'are', 'was', 'were'],
+    'not_equal_to': ['not equal to', 'not equals', 'not equal', 'is not', 'are not', 'was not', 'were not',
+                     'does not equal', "isn't", "aren't"],
+    'greater_or_equal': ['at least', 'no less than', 'greater than or equal to', 'minimum', 'not less than'],
+    'less_or_equal': ['at most', 'no more than', 'less than or equal to', 'maximum', 'not greater than']
+}
+
+COMPARISON_OPERATORS = {
+    'greater_than': '>',
+    'less_than': '<',
+    'equal_to': '=',
+    'not_equal_to': '!=',
+    'greater_or_equal': '>=',
+    'less_or_equal': '<='
+}
+
+# (table, column, referenced table, referenced column)
+FOREIGN_KEYS = [
+    ('Players', 'TeamID', 'Teams', 'TeamID'),
+    ('Games', 'HomeTeamID', 'Teams', 'TeamID'),
+    ('Games', 'GuestTeamID', 'Teams', 'TeamID')
+]
+
+SCHEMAS = {
+    'Players': {
+        'columns': {
+            'PlayerID': {'aliases': ['playerid', 'player id', 'id'], 'type': 'int'},
+            'FirstName': {'aliases': ['firstname', 'first name', 'name'], 'type': 'string'},
+            'LastName': {'aliases': ['lastname', 'last name', 'surname'], 'type': 'string'},
+            'Position': {'aliases': ['position', 'pos', 'role'], 'type': 'string'},
+            'TeamID': {'aliases': ['teamid', 'team id'], 'type': 'int'},
+            'Height_cm': {'aliases': ['height', 'height_cm', 'tall'], 'type': 'int'},
+            'Weight_kg': {'aliases': ['weight', 'weight_kg'], 'type': 'int'},
+            'Birthdate': {'aliases': ['birthdate', 'birth', 'dob', 'born'], 'type': 'date'},
+            'Nationality': {'aliases': ['nationality', 'nation', 'country'], 'type': 'string'},
+            'PointsPerGame': {'aliases': ['points', 'ppg', 'scoring', 'pointspergame'], 'type': 'float'},
+            'ReboundsPerGame': {'aliases': ['rebounds', 'rpg', 'reboundspergame'], 'type': 'float'},
+            'AssistsPerGame': {'aliases': ['assists', 'apg', 'assistspergame'], 'type': 'float'},
+            'StealsPerGame': {'aliases': ['steals', 'spg', 'stealspergame'], 'type': 'float'},
+            'BlocksPerGame': {'aliases': ['blocks', 'bpg', 'blockspergame'], 'type': 'float'},
+            'NetWorth_USD': {'aliases': ['networth', 'worth', 'value'], 'type': 'float'}
+        },
+        'aliases': ['player', 'players', 'roster']
+    },
+    'Teams': {
+        'columns': {
+            'TeamID': {'aliases': ['teamid', 'team id'], 'type': 'int'},
+            'TeamName': {'aliases': ['teamname', 'team name', 'name'], 'type': 'string'},
+            'CEO': {'aliases': ['ceo', 'chief executive'], 'type': 'string'},
+            'Owner': {'aliases': ['owner', 'owned by'], 'type': 'string'},
+            'Location': {'aliases': ['location', 'city', 'place'], 'type': 'string'},
+            'Stadium': {'aliases': ['stadium', 'arena', 'court'], 'type': 'string'},
+            'FoundedYear': {'aliases': ['founded', 'established', 'foundedyear'], 'type': 'int'},
+            'NetWorth_USD': {'aliases': ['networth', 'worth', 'value'], 'type': 'float'}
+        },
+        'aliases': ['team', 'teams', 'franchise', 'franchises']
+    },
+    'Games': {
+        'columns': {
+            'GameID': {'aliases': ['gameid', 'game id', 'match id'], 'type': 'int'},
+            'HomeTeamID': {'aliases': ['hometeamid', 'home team id', 'home', 'hometeam'], 'type': 'int'},
+            'GuestTeamID': {'aliases': ['guestteamid', 'guest team id', 'away team id', 'visitor'], 'type': 'int'},
+            'Time': {'aliases': ['time', 'date', 'when'], 'type': 'date'},
+            'Score': {'aliases': ['score', 'result', 'points'], 'type': 'string'},
+            'Round': {'aliases': ['round', 'stage'], 'type': 'string'},
+            'GameNumber': {'aliases': ['game number', 'match number'], 'type': 'string'}
+        },
+        'aliases': ['game', 'games', 'match', 'matches']
+    }
+}
+
+
+# A single vocabulary hit: [start, end) span in the input, the matched phrase,
+# what kind of entry it is ('table', 'column', 'command', 'comparison') and its key.
+Hit = namedtuple('Hit', ['start', 'end', 'phrase', 'kind', 'key'])
+
+# A column the translator can resolve an alias to.
+ColumnRef = namedtuple('ColumnRef', ['table', 'column', 'type'])
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list:
+    """Split text into (start, word) pairs."""
+    return [(match.start(), match.group()) for match in _WORD.finditer(text)]
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class Automaton:
+    """Aho-Corasick automaton that finds every phrase occurrence in one pass over the text."""
+
+    def __init__(self, phrases):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for phrase in phrases:
+            self._add(phrase)
+        self._build_failure_links()
+
+    def _add(self, phrase: str):
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        if phrase not in self._output[state]:
+            self._output[state] = self._output[state] + (phrase,)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, phrase) for every phrase occurring in text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for phrase in output[state]:
+                yield index - len(phrase) + 1, index + 1, phrase
+
+
+class ColumnIndex:
+    """
+    Inverted index from (table, alias token n-gram) to the columns that alias names,
+    so resolving the columns of a clause costs O(tokens) no matter how wide the schema is.
+    """
+
+    def __init__(self, schemas: dict):
+        self._index = {}
+        self._order = {}
+        self.max_ngram = 1
+        for table, info in schemas.items():
+            for position, (col, col_info) in enumerate(info['columns'].items()):
+                self._order[(table, col)] = position
+                ref = ColumnRef(table, col, col_info['type'])
+                for alias in [col.lower()] + col_info['aliases']:
+                    words = tuple(_WORD.findall(alias))
+                    if not words:
+                        continue
+                    refs = self._index.setdefault((table, words), [])
+                    if ref not in refs:
+                        refs.append(ref)
+                    self.max_ngram = max(self.max_ngram, len(words))
+
+    def candidates(self, tokens: list, table: str):
+        """Yield (start, ColumnRef) for every n-gram of tokens that names a column of table."""
+        words = [word for _, word in tokens]
+        for i, (start, _) in enumerate(tokens):
+            for n in range(1, min(self.max_ngram, len(words) - i) + 1):
+                for ref in self._index.get((table, tuple(words[i:i + n])), ()):
+                    yield start, ref
+
+    def nearest(self, tokens: list, table: str, position: int, types=None):
+        """
+        Return the column of table mentioned in tokens closest to position.
+        Columns whose type is in types win over closer columns of other types.
+        """
+        best = None
+        for start, ref in self.candidates(tokens, table):
+            rank = (bool(types) and ref.type not in types, abs(start - position), self._order[(table, ref.column)])
+            if best is None or rank < best[0]:
+                best = (rank, ref)
+        return best[1] if best else None
+
+
+class Scan:
+    """All vocabulary hits found in one input, with helpers the translator queries."""
+
+    def __init__(self, lexicon, hits: list):
+        self.lexicon = lexicon
+        self.hits = hits
+        self.commands = {hit.key for hit in hits if hit.kind == 'command'}
+        self._tables = {hit.key for hit in hits if hit.kind == 'table'}
+        self._columns = {hit.key for hit in hits if hit.kind == 'column'}
+        self._longest_columns = None
+        self._comparisons = [hit for hit in hits if hit.kind == 'comparison']
+
+    def has(self, command: str) -> bool:
+        return command in self.commands
+
+    def tables(self) -> list:
+        """Tables mentioned in the input, in schema order."""
+        return [table for table in self.lexicon.schemas if table in self._tables]
+
+    def columns(self, table: str, longest: bool = False) -> list:
+        """
+        Columns of table mentioned in the input, in schema order. With longest, a column
+        only named inside a longer column name ("team id" in "guest team id") is left out.
+        """
+        mentioned = self._columns
+        if longest:
+            if self._longest_columns is None:
+                hits = [hit for hit in self.hits if hit.kind == 'column']
+                self._longest_columns = {hit.key for hit in hits
+                                         if not any(other.start <= hit.start and hit.end <= other.end
+                                                    and other.end - other.start > hit.end - hit.start
+                                                    for other in hits)}
+            mentioned = self._longest_columns
+        return [col for col in self.lexicon.schemas[table]['columns'] if (table, col) in mentioned]
+
+    def comparison(self, start: int, end: int):
+        """
+        Return the comparison hit inside [start, end) with the highest priority,
+        i.e. the first one in comparison pattern order, at its first occurrence.
+        """
+        rank = self.lexicon.comparison_rank
+        best = None
+        for hit in self._comparisons:
+            if hit.start >= start and hit.end <= end:
+                if best is None or rank[(hit.key, hit.phrase)] < rank[(best.key, best.phrase)]:
+                    best = hit
+        return best
+
+
+class JoinGraph:
+    """
+    Foreign keys as an undirected graph of tables. The shortest join path between every
+    pair of tables is computed once by a BFS from each table, so a lookup is a dict access.
+    Tables linked by several foreign keys (a game's home and guest team) share one edge
+    that carries one role, i.e. one column pair, per key.
+    """
+
+    def __init__(self, foreign_keys):
+        self._roles = {}
+        adjacency = {}
+        for table, column, ref_table, ref_column in foreign_keys:
+            adjacency.setdefault(table, [])
+            adjacency.setdefault(ref_table, [])
+            if table == ref_table:
+                # A self reference never makes a path shorter
+                continue
+            if (table, ref_table) not in self._roles:
+                adjacency[table].append(ref_table)
+                adjacency[ref_table].append(table)
+                self._roles[(table, ref_table)] = ()
+                self._roles[(ref_table, table)] = ()
+            self._roles[(table, ref_table)] += ((column, ref_column),)
+            self._roles[(ref_table, table)] += ((ref_column, column),)
+
+        self._paths = {}
+        for source in adjacency:
+            paths = self._paths[source] = {source: (source,)}
+            pending = deque([source])
+            while pending:
+                table = pending.popleft()
+                for neighbor in adjacency[table]:
+                    if neighbor not in paths:
+                        paths[neighbor] = paths[table] + (neighbor,)
+                        pending.append(neighbor)
+
+    def path(self, start: str, end: str):
+        """Tables on the shortest join path from start to end, both included, or None if they aren't linked."""
+        return self._paths.get(start, {}).get(end)
+
+    def roles(self, left: str, right: str) -> tuple:
+        """(left column, right column) pairs of every foreign key between two adjacent tables."""
+        return self._roles.get((left, right), ())
+
+    def join_steps(self, tables: list):
+        """
+        Return the (joined table, new table) hops that join tables[1:] onto tables[0],
+        each one reaching its table from the closest table joined so far.
+        Returns None if some table can't be reached.
+        """
+        joined = [tables[0]]
+        steps = []
+        for target in tables[1:]:
+            if target in joined:
+                continue
+            best = None
+            for table in joined:
+                path = self.path(table, target)
+                if path is not None and (best is None or len(path) < len(best)):
+                    best = path
+            if best is None:
+                return None
+            # Being shortest, the path only touches the joined tables at its start
+            for left, right in zip(best, best[1:]):
+                joined.append(right)
+                steps.append((left, right))
+        return steps
+
+
+class Lexicon:
+    """
+    The translator's vocabulary (tables, columns, commands and comparison phrases),
+    compiled into one automaton so an input is scanned once instead of once per alias.
+    """
+
+    def __init__(self, schemas: dict, command_patterns: dict = None, comparison_patterns: dict = None,
+                 comparison_operators: dict = None, foreign_keys: list = None):
+        self.schemas = schemas
+        self.command_patterns = command_patterns or COMMAND_PATTERNS
+        self.comparison_patterns = comparison_patterns or COMPARISON_PATTERNS
+        self.comparison_operators = comparison_operators or COMPARISON_OPERATORS
+        self.foreign_keys = [tuple(key) for key in (foreign_keys if foreign_keys is not None else FOREIGN_KEYS)]
+        # Identifies this vocabulary; caches built on translations are dropped when it changes
+        self.fingerprint = hashlib.sha1(repr((self.schemas, self.command_patterns, self.comparison_patterns,
+                                              self.comparison_operators, self.foreign_keys)).encode()).hexdigest()
+
+        self._entries = {}
+        self._column_phrases = {}
+        for table, info in schemas.items():
+            for alias in [table.lower()] + info['aliases']:
+                self._add_entry(alias, 'table', table)
+            phrases = self._column_phrases[table] = {}
+            for col, col_info in info['columns'].items():
+                for alias in [col.lower()] + col_info['aliases']:
+                    self._add_entry(alias, 'column', (table, col))
+                    phrases.setdefault(alias, col)
+        for command, patterns in self.command_patterns.items():
+            for pattern in patterns:
+                self._add_entry(pattern, 'command', command)
+        self.comparison_rank = {}
+        for comp, patterns in self.comparison_patterns.items():
+            for pattern in patterns:
+                self._add_entry(pattern, 'comparison', comp)
+                self.comparison_rank.setdefault((comp, pattern), len(self.comparison_rank))
+
+        self._automaton = Automaton(self._entries)
+        self.column_index = ColumnIndex(schemas)
+        self.join_graph = JoinGraph(self.foreign_keys)
+
+    def _add_entry(self, phrase: str, kind: str, key):
+        entries = self._entries.setdefault(phrase, [])
+        if (kind, key) not in entries:
+            entries.append((kind, key))
+
+    def scan(self, text: str) -> Scan:
+        """Find all whole-word vocabulary hits in text (already lower-cased) in a single pass."""
+        hits = []
+        length = len(text)
+        for start, end, phrase in self._automaton.iter_matches(text):
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < length and _is_word_char(text[end]):
+                continue
+            for kind, key in self._entries[phrase]:
+                hits.append(Hit(start, end, phrase, kind, key))
+        hits.sort(key=lambda hit: (hit.start, -hit.end))
+        return Scan(self, hits)
+
+    def column_for_phrase(self, table: str, phrase: str):
+        """Return the first column of table that has phrase as its name or alias."""
+        return self._column_phrases.get(table, {}).get(phrase)
+
+
+LEXICON = Lexicon(SCHEMAS)
+
+
+def get_lexicon() -> Lexicon:
+    return LEXICON
+
+
+def set_lexicon(lexicon: Lexicon):
+    """Replace the vocabulary used by the translator."""
+    global LEXICON
+    LEXICON = lexicon
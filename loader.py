@@ -0,0 +1,501 @@
+import argparse
+import csv
+import gzip
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+import connect
+import schema
+
+
+WORKERS = 4
+# A batch is sent once it reaches either limit; keep BATCH_BYTES well under max_allowed_packet
+BATCH_ROWS = 1000
+BATCH_BYTES = 1024 * 1024
+READ_CHUNK = 1024 * 1024
+# Longest non-INSERT statement or single row the reader will buffer
+MAX_STATEMENT_BYTES = 256 * 1024 * 1024
+CSV_NULL = '\\N'
+
+_NAME = r"(?:`[^`]+`|\w+)(?:\.(?:`[^`]+`|\w+))?"
+# Unrolled loops: every repetition starts on a quote, backslash or parenthesis, and a closing quote can't be
+# followed by another, so there is only one way to match and a failed match can't backtrack exponentially
+_STRING = r"'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'(?!')|\"[^\"\\]*(?:(?:\\.|\"\")[^\"\\]*)*\"(?!\")"
+# Whitespace, comments and empty statements between statements
+_SKIP = re.compile(r"(?:\s+|;|--[^\n]*(?:\n|\Z)|#[^\n]*(?:\n|\Z)|/\*.*?\*/)*", re.S)
+_STATEMENT = re.compile(rf"(?:[^'\"`;]|{_STRING}|`[^`]*`)*;", re.S)
+_INSERT = re.compile(rf"INSERT\s+(?:IGNORE\s+)?INTO\s+({_NAME})\s*(\([^()]*\))?\s*VALUES\s*", re.I)
+# One parenthesized row, allowing one level of nested parentheses for function calls, and the , or ; after it
+_NESTED = rf"\([^'\"()]*(?:(?:{_STRING})[^'\"()]*)*\)"
+_ROW = re.compile(rf"\s*(\([^'\"()]*(?:(?:{_STRING}|{_NESTED})[^'\"()]*)*\))\s*([,;])", re.S)
+_REFERENCES = re.compile(rf"REFERENCES\s+({_NAME})", re.I)
+_DDL_TABLE = re.compile(rf"(?:CREATE|DROP|ALTER|TRUNCATE)\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?({_NAME})",
+                        re.I)
+# Statements that only make sense on a single connection
+_SESSION_ONLY = re.compile(r"(?:LOCK|UNLOCK)\s+TABLES?\b", re.I)
+
+
+def table_name(name: str) -> str:
+    """Bare table name from a possibly quoted, schema-qualified name."""
+    return name.split('.')[-1].strip('`')
+
+
+class DumpReader:
+    """
+    Incremental parser of a SQL dump. Statements are read from the stream a chunk at a
+    time, and INSERT statements are taken apart row by row, so a multi-gigabyte INSERT
+    never has to fit in memory.
+    """
+
+    def __init__(self, stream, chunk_size: int = READ_CHUNK):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if len(self._buffer) - self._pos > MAX_STATEMENT_BYTES:
+            raise ValueError("Statement too large or malformed dump")
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+
+    def _match(self, pattern):
+        """Match pattern at the current position, reading on until the match can't grow any further."""
+        while True:
+            match = pattern.match(self._buffer, self._pos)
+            if self._eof or (match is not None and match.end() < len(self._buffer)):
+                return match
+            self._fill()
+
+    def _peek(self, pattern, lookahead: int = 65536):
+        """Match a short pattern once enough of the stream is buffered."""
+        while not self._eof and len(self._buffer) - self._pos < lookahead:
+            self._fill()
+        return pattern.match(self._buffer, self._pos)
+
+    def events(self):
+        """
+        Yield ('sql', None, statement) for ordinary statements and
+        ('row', (table, header), row) for each row of an INSERT, in dump order.
+        header is the statement's 'INSERT INTO ... VALUES ' prefix.
+        """
+        while True:
+            self._pos = self._match(_SKIP).end()
+            if self._eof and self._pos >= len(self._buffer):
+                return
+            insert = self._peek(_INSERT)
+            if insert is None:
+                statement = self._match(_STATEMENT)
+                if statement is None:
+                    raise ValueError("Unterminated statement at the end of the dump")
+                self._pos = statement.end()
+                yield 'sql', None, statement.group()[:-1].strip()
+                continue
+
+            self._pos = insert.end()
+            table = table_name(insert.group(1))
+            key = (table, f"INSERT INTO {insert.group(1)} {insert.group(2) or ''} VALUES ")
+            while True:
+                row = self._match(_ROW)
+                if row is None:
+                    raise ValueError(f"Malformed row in INSERT INTO {table}")
+                self._pos = row.end()
+                yield 'row', key, row.group(1)
+                if row.group(2) == ';':
+                    break
+
+
+class BulkLoader:
+    """
+    Loads rows in batches over several connections at once.
+    Batches of different tables run in parallel, but a table's batches only start once
+    every table it references has been fully loaded, unless foreign key checks are off.
+    Tables are expected in dependency order, as in data.sql (Teams, then Players and Games).
+    """
+
+    def __init__(self, workers: int = WORKERS, batch_rows: int = BATCH_ROWS, batch_bytes: int = BATCH_BYTES,
+                 disable_checks: bool = False, disable_keys: bool = False, factory=connect.open_connection,
+                 progress=sys.stderr, progress_interval: float = 1.0):
+        # Dumps, session settings and the foreign key lookup are all MySQL's
+        self.backend = connect.get_backend()
+        if self.backend.name != 'mysql':
+            raise ValueError(f"The bulk loader needs the MySQL backend, not {self.backend.name}")
+        self.workers = workers
+        self.batch_rows = batch_rows
+        self.batch_bytes = batch_bytes
+        self.disable_checks = disable_checks
+        self.disable_keys = disable_keys
+        self.progress = progress
+        self.progress_interval = progress_interval
+        # One connection per worker plus one for DDL
+        self.pool = connect.ConnectionPool(factory=factory, size=workers + 1)
+        # table -> tables it references
+        self.dependencies = {}
+        self.rows = {}
+        self.error = None
+
+        self._queue = queue.Queue(maxsize=workers * 4)
+        self._done = threading.Condition()
+        self._pending = {}
+        self._seen = set()
+        self._closed = set()
+        self._keys_disabled = []
+        self._batches = {}
+        self._threads = []
+        self._stop = threading.Event()
+        self._started = None
+
+    # Connections
+
+    def _session(self, connection):
+        if self.disable_checks:
+            cursor = connection.cursor()
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            cursor.execute("SET UNIQUE_CHECKS = 0")
+            cursor.close()
+        return connection
+
+    def _execute(self, sql: str, params: tuple = None):
+        """Run one statement synchronously on the DDL connection."""
+        with self.pool.connection() as connection:
+            cursor = self._session(connection).cursor()
+            cursor.execute(sql, params)
+            cursor.close()
+
+    def _worker(self):
+        try:
+            connection = self._session(self.pool.acquire())
+        except self.backend.Error as err:
+            self._fail(err)
+            connection = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                table, sql, params, count = item
+                try:
+                    # After a failure the queue is only drained so the reader never blocks
+                    if self.error is None:
+                        cursor = connection.cursor()
+                        cursor.execute(sql, params)
+                        cursor.close()
+                        with self._done:
+                            self.rows[table] = self.rows.get(table, 0) + count
+                except self.backend.Error as err:
+                    self._fail(err, table)
+                finally:
+                    with self._done:
+                        self._pending[table] -= 1
+                        self._done.notify_all()
+        finally:
+            if connection is not None:
+                self.pool.release(connection, discard=self.error is not None)
+
+    def _fail(self, err, table: str = None):
+        with self._done:
+            if self.error is None:
+                self.error = f"{table}: {err}" if table else str(err)
+            self._done.notify_all()
+
+    def _wait(self, condition):
+        with self._done:
+            self._done.wait_for(lambda: condition() or self.error is not None)
+        if self.error is not None:
+            raise RuntimeError(self.error)
+
+    # Scheduling
+
+    def start(self):
+        self._started = time.perf_counter()
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.progress is not None:
+            thread = threading.Thread(target=self._report, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _dispatch(self, table: str, sql: str, params, count: int):
+        if table not in self._seen:
+            self._seen.add(table)
+            if not self.disable_checks:
+                # Parents that already went past are waited for; ones not in the input must exist already
+                parents = [parent for parent in self.dependencies.get(table, ())
+                           if parent != table and parent in self._seen]
+                for parent in parents:
+                    self.close_table(parent)
+                self._wait(lambda: all(self._pending.get(parent, 0) == 0 for parent in parents))
+            if self.disable_keys:
+                self._execute(f"ALTER TABLE {table} DISABLE KEYS")
+                self._keys_disabled.append(table)
+        with self._done:
+            self._pending[table] = self._pending.get(table, 0) + 1
+        self._queue.put((table, sql, params, count))
+        if self.error is not None:
+            raise RuntimeError(self.error)
+
+    def add_row(self, table: str, header: str, row: str):
+        """Queue one literal row, e.g. "(1, 'Atlanta Hawks')", for an INSERT with the given header."""
+        self._closed.discard(table)
+        batch = self._batches.setdefault((table, header), [[], 0])
+        batch[0].append(row)
+        batch[1] += len(row)
+        if len(batch[0]) >= self.batch_rows or batch[1] >= self.batch_bytes:
+            self._flush(table, header)
+
+    def add_values(self, table: str, columns: tuple, values: list):
+        """Queue one row of values, sent as parameters, for the given columns."""
+        self._closed.discard(table)
+        batch = self._batches.setdefault((table, columns), [[], 0])
+        batch[0].append(values)
+        batch[1] += sum(len(value) for value in values if value is not None)
+        if len(batch[0]) >= self.batch_rows or batch[1] >= self.batch_bytes:
+            self._flush(table, columns)
+
+    def _flush(self, table: str, key):
+        rows, _ = self._batches.pop((table, key), ([], 0))
+        if not rows:
+            return
+        if isinstance(key, str):
+            self._dispatch(table, key + ','.join(rows), None, len(rows))
+        else:
+            placeholders = '(' + ', '.join(['%s'] * len(key)) + ')'
+            sql = f"INSERT INTO {table} ({', '.join(key)}) VALUES " + ', '.join([placeholders] * len(rows))
+            self._dispatch(table, sql, tuple(value for row in rows for value in row), len(rows))
+
+    def close_table(self, table: str):
+        """Mark the input of a table as finished, sending its partly filled batches."""
+        if table in self._closed:
+            return
+        for batch_table, key in list(self._batches):
+            if batch_table == table:
+                self._flush(table, key)
+        self._closed.add(table)
+
+    def execute_statement(self, statement: str):
+        """Run a non-INSERT statement from a dump once the batches it could affect are done."""
+        if _SESSION_ONLY.match(statement):
+            return
+        target = _DDL_TABLE.match(statement)
+        if target:
+            table = table_name(target.group(1))
+            self.close_table(table)
+            self._wait(lambda: self._pending.get(table, 0) == 0)
+            references = {table_name(name) for name in _REFERENCES.findall(statement)}
+            if references:
+                self.dependencies.setdefault(table, set()).update(references)
+        else:
+            for table in list(self._seen):
+                self.close_table(table)
+            self._wait(lambda: not any(self._pending.values()))
+        self._execute(statement)
+
+    def finish(self) -> dict:
+        """Send the remaining batches, wait for every worker and return rows loaded per table."""
+        try:
+            for table, _ in list(self._batches):
+                self.close_table(table)
+            for _ in range(self.workers):
+                self._queue.put(None)
+            for thread in self._threads[:self.workers]:
+                thread.join()
+            if self.error is None:
+                for table in self._keys_disabled:
+                    self._execute(f"ALTER TABLE {table} ENABLE KEYS")
+        finally:
+            self._stop.set()
+            self.pool.close_all()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        self._report_line(final=True)
+        return dict(self.rows)
+
+    # Progress
+
+    def _report_line(self, final: bool = False, previous: tuple = None):
+        if self.progress is None:
+            return None
+        now = time.perf_counter()
+        total = sum(self.rows.values())
+        elapsed = now - self._started
+        if final:
+            tables = ', '.join(f"{table} {count}" for table, count in self.rows.items())
+            rate = total / elapsed if elapsed else 0.0
+            self.progress.write(f"\rLoaded {total} rows in {elapsed:.1f}s ({rate:.0f} rows/s): {tables}\n")
+        else:
+            last_time, last_total = previous or (self._started, 0)
+            rate = (total - last_total) / (now - last_time) if now > last_time else 0.0
+            self.progress.write(f"\r{total} rows loaded, {rate:.0f} rows/s")
+        self.progress.flush()
+        return now, total
+
+    def _report(self):
+        previous = None
+        while not self._stop.wait(self.progress_interval):
+            previous = self._report_line(previous=previous)
+
+    # Sources
+
+    def read_foreign_keys(self):
+        """Add the database's foreign keys to the tables each table must be loaded after."""
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(schema.FOREIGN_KEYS_QUERY)
+            for table, _, ref_table, _ in cursor.fetchall():
+                self.dependencies.setdefault(table, set()).add(ref_table)
+            cursor.close()
+
+    def load_sql(self, streams) -> dict:
+        """
+        Load a SQL dump (CREATE TABLE and INSERT statements) from one text stream or a list of them.
+        Tables are loaded after their parents, going by the database's foreign keys and by the
+        REFERENCES of the dump's own CREATE TABLE statements, so data-only dumps keep the order too.
+        """
+        if not isinstance(streams, (list, tuple)):
+            streams = [streams]
+        self.read_foreign_keys()
+        self.start()
+        current = None
+        try:
+            for stream in streams:
+                for kind, key, text in DumpReader(stream).events():
+                    if kind == 'row':
+                        table, header = key
+                        if table != current:
+                            # Dumps keep a table's rows together, so its input ends where another's begins
+                            if current is not None:
+                                self.close_table(current)
+                            current = table
+                        self.add_row(table, header, text)
+                    else:
+                        current = None
+                        self.execute_statement(text)
+        except BaseException:
+            self._stop.set()
+            raise
+        return self.finish()
+
+    def load_csv(self, paths: list) -> dict:
+        """
+        Load CSV files named after their tables (Teams.csv, or numbered parts such as
+        Players.0001.csv) whose first row holds the column names. Tables are loaded parents
+        first, using the database's foreign keys, and tables at the same depth are read in
+        turn so they load in parallel.
+        """
+        tables = {}
+        for path in sorted(paths):
+            tables.setdefault(os.path.basename(path).split('.')[0], []).append(path)
+        self.read_foreign_keys()
+
+        self.start()
+        try:
+            for level in dependency_levels(tables, self.dependencies):
+                active = [(table, _csv_rows(tables[table])) for table in level]
+                while active:
+                    still_active = []
+                    for table, rows in active:
+                        for _ in range(self.batch_rows):
+                            row = next(rows, None)
+                            if row is None:
+                                self.close_table(table)
+                                break
+                            columns, values = row
+                            self.add_values(table, columns, [None if value == CSV_NULL else value
+                                                             for value in values])
+                        else:
+                            still_active.append((table, rows))
+                    active = still_active
+        except BaseException:
+            self._stop.set()
+            raise
+        return self.finish()
+
+
+def _csv_rows(paths: list):
+    """Yield (columns, values) for every row of a table's CSV files, each starting with a header row."""
+    for path in paths:
+        with _open(path) as file:
+            reader = csv.reader(file)
+            columns = tuple(next(reader, ()))
+            for values in reader:
+                yield columns, values
+
+
+def dependency_levels(tables, dependencies: dict) -> list:
+    """
+    Group tables into levels where every table only references tables of earlier levels.
+    References to tables outside the set are ignored; tables in a cycle end up in the last level.
+    """
+    remaining = list(tables)
+    loaded = set()
+    levels = []
+    while remaining:
+        level = [table for table in remaining
+                 if all(parent in loaded or parent == table or parent not in tables
+                        for parent in dependencies.get(table, ()))]
+        if not level:
+            level = remaining
+        levels.append(level)
+        loaded.update(level)
+        remaining = [table for table in remaining if table not in loaded]
+    return levels
+
+
+def _open(path: str):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a SQL dump or CSV files into the ChatDB database.")
+    parser.add_argument('inputs', nargs='+',
+                        help="SQL dumps ('-' for stdin) and/or Table.csv files; .gz files are decompressed")
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS, help="parallel connections")
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS, help="rows per INSERT sent")
+    parser.add_argument('--batch-bytes', type=int, default=BATCH_BYTES, help="approximate bytes per INSERT sent")
+    parser.add_argument('--disable-checks', action='store_true',
+                        help="turn off foreign key and unique checks, so tables load in any order")
+    parser.add_argument('--disable-keys', action='store_true',
+                        help="disable non-unique indexes while loading and rebuild them afterwards")
+    parser.add_argument('-q', '--quiet', action='store_true', help="no progress output")
+    args = parser.parse_args(argv)
+
+    def make_loader():
+        return BulkLoader(args.workers, args.batch_rows, args.batch_bytes, args.disable_checks, args.disable_keys,
+                          progress=None if args.quiet else sys.stderr)
+
+    csv_inputs = [path for path in args.inputs if path.endswith(('.csv', '.csv.gz'))]
+    sql_inputs = [path for path in args.inputs if path not in csv_inputs]
+    try:
+        # SQL files go first so a schema.sql can create the tables the CSV files fill
+        if sql_inputs:
+            streams = [_open(path) for path in sql_inputs]
+            try:
+                make_loader().load_sql(streams)
+            finally:
+                for stream in streams:
+                    if stream is not sys.stdin:
+                        stream.close()
+        if csv_inputs:
+            make_loader().load_csv(csv_inputs)
+    except (connect.get_backend().Error, RuntimeError, ValueError, OSError) as err:
+        print(f"\nLoad failed: {err}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
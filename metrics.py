@@ -0,0 +1,216 @@
+import bisect
+import datetime
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from tabulate import tabulate
+
+import cache
+
+
+# Queries taking at least this many seconds end to end are counted (and logged) as slow
+SLOW_QUERY_SECONDS = float(os.environ.get('CHATDB_SLOW_QUERY_SECONDS', 1.0))
+# JSON lines file slow queries are appended to (None only counts them)
+SLOW_QUERY_LOG = os.environ.get('CHATDB_SLOW_QUERY_LOG') or None
+# Latency histograms cover the most recent this many queries
+WINDOW = 1000
+# Upper bounds (seconds) of the histogram buckets, 0.1ms doubling up to about 13s; slower goes in an overflow bucket
+BUCKETS = tuple(0.0001 * 2 ** i for i in range(18))
+PHASES = ('execute', 'fetch', 'render', 'total')
+
+
+class QueryTimer:
+    """Measurements of one query, filled in by chatDB while it runs."""
+
+    def __init__(self, query: str, params: tuple = None, origin: str = 'other'):
+        self.query = query
+        self.params = params
+        self.origin = origin
+        # Seconds spent in cursor.execute, fetching rows and formatting the table
+        self.execute = 0.0
+        self.fetch = 0.0
+        self.render = 0.0
+        self.total = 0.0
+        self.rows = 0
+        # Size of the formatted result in characters (bytes for the ASCII tables tabulate draws)
+        self.bytes = 0
+        self.cached = False
+        self.error = None
+        # The cost guard's decision ('run', 'warn', 'limit', 'stream', 'unknown') and row estimate, if it checked
+        self.guard = None
+        self.estimated_rows = None
+        self.started = time.perf_counter()
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+
+class RollingHistogram:
+    """Bucketed latencies of the last window samples, updated in constant time."""
+
+    def __init__(self, window: int = WINDOW, buckets: tuple = BUCKETS):
+        self.window = window
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self._recent = deque()
+        self._sum = 0.0
+
+    def add(self, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        self.counts[index] += 1
+        self._recent.append((index, seconds))
+        self._sum += seconds
+        if len(self._recent) > self.window:
+            old_index, old_seconds = self._recent.popleft()
+            self.counts[old_index] -= 1
+            self._sum -= old_seconds
+
+    def quantile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of samples (the last bound if it overflowed)."""
+        rank = max(1, int(fraction * len(self._recent) + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return 0.0
+
+    def snapshot(self) -> dict:
+        samples = len(self._recent)
+        buckets = {}
+        for index, count in enumerate(self.counts):
+            if count:
+                label = f"<={self.buckets[index] * 1000:g}ms" if index < len(self.buckets) else \
+                    f">{self.buckets[-1] * 1000:g}ms"
+                buckets[label] = count
+        return {
+            'samples': samples,
+            'mean_ms': self._sum / samples * 1000 if samples else 0.0,
+            'p50_ms': self.quantile(0.50) * 1000 if samples else 0.0,
+            'p95_ms': self.quantile(0.95) * 1000 if samples else 0.0,
+            'p99_ms': self.quantile(0.99) * 1000 if samples else 0.0,
+            'buckets': buckets
+        }
+
+
+class QueryMetrics:
+    """
+    Counters and rolling per-phase latency histograms of the queries run through chatDB,
+    kept per origin (e.g. 'lesson', 'repl', 'nl') and overall. Queries slower than
+    slow_seconds are appended to slow_log as JSON lines.
+    """
+
+    def __init__(self, window: int = WINDOW, slow_seconds: float = SLOW_QUERY_SECONDS, slow_log: str = SLOW_QUERY_LOG):
+        self.window = window
+        self.slow_seconds = slow_seconds
+        self.slow_log = slow_log
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # origin -> {'queries': ..., phase -> RollingHistogram}; '*' holds every origin
+            self._origins = {}
+            self.queries = 0
+            self.errors = 0
+            self.cache_hits = 0
+            self.rows = 0
+            self.bytes = 0
+            self.slow_queries = 0
+            # Cost guard decision -> queries it was made for
+            self.guard_decisions = {}
+
+    def start(self, query: str, params: tuple = None, origin: str = 'other') -> QueryTimer:
+        return QueryTimer(query, params, origin)
+
+    def _origin(self, origin: str) -> dict:
+        entry = self._origins.get(origin)
+        if entry is None:
+            entry = self._origins[origin] = {'queries': 0, 'errors': 0}
+            for phase in PHASES:
+                entry[phase] = RollingHistogram(self.window)
+        return entry
+
+    def record(self, timer: QueryTimer):
+        """Add a finished query to the counters and histograms."""
+        timer.finish()
+        slow = timer.total >= self.slow_seconds
+        with self._lock:
+            self.queries += 1
+            self.errors += timer.error is not None
+            self.cache_hits += timer.cached
+            self.rows += timer.rows
+            self.bytes += timer.bytes
+            self.slow_queries += slow
+            if timer.guard is not None:
+                self.guard_decisions[timer.guard] = self.guard_decisions.get(timer.guard, 0) + 1
+            for entry in (self._origin('*'), self._origin(timer.origin)):
+                entry['queries'] += 1
+                entry['errors'] += timer.error is not None
+                for phase in PHASES:
+                    entry[phase].add(getattr(timer, phase))
+        if slow and self.slow_log:
+            self._log_slow(timer)
+
+    def _log_slow(self, timer: QueryTimer):
+        record = {
+            'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+            'origin': timer.origin,
+            'total_ms': round(timer.total * 1000, 3),
+            'execute_ms': round(timer.execute * 1000, 3),
+            'fetch_ms': round(timer.fetch * 1000, 3),
+            'render_ms': round(timer.render * 1000, 3),
+            'rows': timer.rows,
+            'bytes': timer.bytes,
+            'cached': timer.cached,
+            'error': timer.error,
+            'guard': timer.guard,
+            'estimated_rows': timer.estimated_rows,
+            'query': cache.normalize_sql(timer.query),
+            'params': list(timer.params) if timer.params is not None else None
+        }
+        line = json.dumps(record, default=str) + '\n'
+        try:
+            with self._log_lock, open(self.slow_log, 'a', encoding='utf-8') as log_file:
+                log_file.write(line)
+        except OSError as err:
+            print(f"Could not write the slow query log: {err}")
+
+    def snapshot(self) -> dict:
+        """Counters plus execute/fetch/render/total latency summaries per origin ('*' is all of them)."""
+        with self._lock:
+            return {
+                'queries': self.queries,
+                'errors': self.errors,
+                'cache_hits': self.cache_hits,
+                'rows': self.rows,
+                'bytes': self.bytes,
+                'slow_queries': self.slow_queries,
+                'slow_query_seconds': self.slow_seconds,
+                'slow_query_log': self.slow_log,
+                'guard_decisions': dict(self.guard_decisions),
+                'window': self.window,
+                'origins': {origin: {key: value.snapshot() if isinstance(value, RollingHistogram) else value
+                                     for key, value in entry.items()}
+                            for origin, entry in self._origins.items()}
+            }
+
+
+def format_snapshot(snapshot: dict) -> str:
+    """A snapshot as a table of p50/p95/p99 milliseconds per origin and phase."""
+    rows = []
+    for origin, entry in sorted(snapshot['origins'].items()):
+        for phase in PHASES:
+            stats = entry[phase]
+            rows.append([origin if phase == PHASES[0] else '', phase, entry['queries'] if phase == PHASES[0] else '',
+                         stats['p50_ms'], stats['p95_ms'], stats['p99_ms'], round(stats['mean_ms'], 3)])
+    table = tabulate(rows, headers=['origin', 'phase', 'queries', 'p50 ms', 'p95 ms', 'p99 ms', 'mean ms'],
+                     tablefmt="psql")
+    guard_decisions = ', '.join(f"{count} {action}" for action, count in sorted(snapshot['guard_decisions'].items()))
+    return (f"{table}\n{snapshot['queries']} queries, {snapshot['errors']} errors, {snapshot['cache_hits']} cache hits, "
+            f"{snapshot['rows']} rows, {snapshot['bytes']} bytes, {snapshot['slow_queries']} slower than "
+            f"{snapshot['slow_query_seconds']:g}s" + (f"\nCost guard: {guard_decisions}" if guard_decisions else ""))
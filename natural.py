@@ -1,23 +1,30 @@
 import re
+import cache
 import connect
+import lexicon
+import queryir
+from queryir import Aggregate, Column, Join, JoinCondition, Order, Predicate
 
 
-def detect_aggregates(input_lower: str, col: str, command_patterns: dict) -> list:
-    """Helper function to detect and format aggregate functions."""
+# Translations of recently seen questions, keyed on their normalized form
+TRANSLATION_CACHE = cache.TranslationCache(maxsize=4096)
+
+
+def detect_aggregates(aggregate_commands: set, col: str) -> list:
+    """Helper function to detect aggregate functions, as queryir.Aggregate."""
     aggregates = []
-    input_tokens = set(input_lower.split())
     for command in ['count', 'average', 'sum', 'maximum', 'minimum']:
-        if input_tokens.intersection(command_patterns[command]):
+        if command in aggregate_commands:
             if command == 'count':
-                aggregates.append(f"COUNT(*) as count")
+                aggregates.append(Aggregate('COUNT', None, 'count'))
             elif command == 'average':
-                aggregates.append(f"AVG({col}) as {col}_avg")
+                aggregates.append(Aggregate('AVG', Column(col), f"{col}_avg"))
             elif command == 'sum':
-                aggregates.append(f"SUM({col}) as {col}_sum")
+                aggregates.append(Aggregate('SUM', Column(col), f"{col}_sum"))
             elif command == 'maximum':
-                aggregates.append(f"MAX({col}) as {col}_max")
+                aggregates.append(Aggregate('MAX', Column(col), f"{col}_max"))
             elif command == 'minimum':
-                aggregates.append(f"MIN({col}) as {col}_min")
+                aggregates.append(Aggregate('MIN', Column(col), f"{col}_min"))
     return aggregates
 
 
@@ -37,32 +44,66 @@ def extract_top_n_phrase(input_lower):
     return None, None
 
 
-def parse_conditions(input_lower: str, table_schema: dict, comparison_patterns: dict, comparison_patterns_map: dict,
-                     aggregate_columns: list, used_numbers: set) -> dict:
+def to_number(value: str):
+    """Convert a numeric literal from the input to an int or float."""
+    return int(value) if value.isdigit() else float(value)
+
+
+def inline_params(template: str, params: tuple) -> str:
+    """Substitute the %s placeholders of a generated template with their values."""
+    pieces = template.split('%s')
+    sql = [pieces[0]]
+    for value, piece in zip(params, pieces[1:]):
+        sql.append(str(value))
+        sql.append(piece)
+    return ''.join(sql)
+
+
+def join_condition(left: str, right: str, roles: tuple, scan) -> tuple:
+    """
+    ON conditions for one join hop, any of which may match. When several foreign keys
+    link the two tables (home and guest team), the roles whose own column the input
+    mentions are used, otherwise a row matches through any of them.
+    """
+    chosen = []
+    if len(roles) > 1:
+        # Only the columns that differ between roles tell them apart; the referenced key is shared
+        mentioned = (set(scan.columns(left, longest=True)), set(scan.columns(right, longest=True)))
+        differing = [len({role[side] for role in roles}) > 1 for side in (0, 1)]
+        chosen = [role for role in roles if any(differing[side] and role[side] in mentioned[side] for side in (0, 1))]
+    return tuple(JoinCondition(Column(left_col, left), Column(right_col, right)) for left_col, right_col in chosen or roles)
+
+
+def parse_conditions(input_lower: str, table: str, aggregate_columns: list, scan=None) -> dict:
     """
     Parse the input to find conditions for the WHERE and HAVING clauses.
-    Returns a dict with 'where' and 'having' keys.
-    This improved version attempts to correctly identify columns and operators.
+    Returns a dict with 'where' and 'having' keys, each a list of queryir.Predicate.
+    Operators come from the lexicon scan of the whole input and columns are resolved
+    through the lexicon's alias index, so the cost does not grow with the schema size.
     """
     conditions = {'where': [], 'having': []}
+    vocabulary = lexicon.get_lexicon()
+    if scan is None:
+        scan = vocabulary.scan(input_lower)
 
     # We will split the input into clauses based on known logical connectors
-    clauses = re.split(r',| and | or ', input_lower)
-    clauses = [c.strip() for c in clauses if c.strip()]
-
-    for clause in clauses:
-        # Attempt to find a comparison operator pattern in the clause
-        found_operator = None
-        for comp, patterns in comparison_patterns.items():
-            for pattern in patterns:
-                if pattern in clause:
-                    found_operator = (comp, comparison_patterns_map[comp], pattern)
-                    break
-            if found_operator:
-                break
+    clause_spans = []
+    clause_start = 0
+    for separator in re.finditer(r',| and | or ', input_lower):
+        clause_spans.append((clause_start, separator.start()))
+        clause_start = separator.end()
+    clause_spans.append((clause_start, len(input_lower)))
+
+    for clause_start, clause_end in clause_spans:
+        clause = input_lower[clause_start:clause_end]
+        if not clause.strip():
+            continue
+
+        # Find the highest priority comparison operator phrase in the clause
+        operator_hit = scan.comparison(clause_start, clause_end)
 
         # If we don't find an operator, move on
-        if not found_operator:
+        if not operator_hit:
             continue
 
         # Extract numeric value if present
@@ -75,74 +116,28 @@ def parse_conditions(input_lower: str, table_schema: dict, comparison_patterns:
             # No numeric value found. We can attempt a fallback or skip.
             continue
 
-        # Identify all possible columns in the clause
-        possible_columns = []
-        for col, col_info in table_schema['columns'].items():
-            col_aliases = [col.lower()] + col_info['aliases']
-            for alias in col_aliases:
-                pos = clause.find(alias)
-                if pos != -1:
-                    possible_columns.append((col, pos, col_info['type']))
-
-        if not possible_columns:
+        # Choose the best column:
+        # Heuristic: pick the column closest to the operator phrase, preferring numeric
+        # columns since the value being compared is numeric (e.g. "height under 200")
+        column = vocabulary.column_index.nearest(lexicon.tokenize(clause), table,
+                                                 operator_hit.start - clause_start, types=('int', 'float'))
+        if not column:
             # No columns found in this clause; skip
             continue
-
-        # Choose the best column:
-        # Heuristic: pick the column that appears before the operator phrase and is suitable type-wise
-        # We'll find where the operator pattern is located in the clause.
-        operator_text = found_operator[2]
-        op_pos = clause.find(operator_text)
-
-        # Filter columns that appear before the operator (this often makes sense, e.g. "height under 200")
-        # If none appear before, we just pick the first column encountered.
-        numeric_compare_ops = ['>', '<', '>=', '<=', '!=', '=']
-        best_col = None
-        if found_operator[1] in numeric_compare_ops and found_value:
-            # Prefer numeric columns if numeric operation
-            numeric_columns = [c for c in possible_columns if c[2] in ['int', 'float']]
-            if numeric_columns:
-                # Among numeric columns, pick one closest to operator
-                numeric_columns.sort(key=lambda x: abs(x[1] - op_pos))
-                best_col = numeric_columns[0][0]
-            else:
-                # No numeric columns, pick closest column to operator anyway
-                possible_columns.sort(key=lambda x: abs(x[1] - op_pos))
-                best_col = possible_columns[0][0]
-        else:
-            # Not a numeric compare or no numeric value
-            # Just pick closest column to operator
-            possible_columns.sort(key=lambda x: abs(x[1] - op_pos))
-            best_col = possible_columns[0][0]
+        best_col = column.column
 
         # Now we have a column, operator and value
-        sql_operator = found_operator[1]
-        # Check if the column is involved in aggregation
-        # NOTE: In this simple approach, we do not map conditions to aggregates directly.
-        # If needed, detect if column is part of aggregate_columns and adjust condition for HAVING.
-        if best_col in [agg_col.split('(')[-1].split(')')[0] for agg_col in aggregate_columns]:
-            # Condition on an aggregated column:
-            # Identify which aggregator applies to this column
-            # We assume only one aggregator per column for simplicity
-            agg_to_use = None
-            for agg_col_expr in aggregate_columns:
-                col_in_agg = agg_col_expr.split('(')[-1].split(')')[0]
-                if col_in_agg == best_col:
-                    # Extract aggregator name from agg_col_expr, e.g. AVG(col)
-                    agg_to_use = agg_col_expr.split('(')[0].strip()
-                    agg_to_use = agg_to_use.split()[-1]  # e.g. from "AVG(col) as col_avg" get "AVG"
-                    break
-
-            if agg_to_use:
-                condition = f"{agg_to_use}({best_col}) {sql_operator} {found_value}"
-                conditions['having'].append(condition)
-            else:
-                condition = f"{best_col} {sql_operator} {found_value}"
-                conditions['where'].append(condition)
+        sql_operator = vocabulary.comparison_operators[operator_hit.key]
+        # A condition on an aggregated column filters groups (HAVING) by that aggregate;
+        # we assume only one aggregator per column for simplicity
+        aggregate = next((agg for agg in aggregate_columns if agg.column is not None and agg.column.name == best_col),
+                         None)
+        if aggregate:
+            conditions['having'].append(Predicate(Aggregate(aggregate.function, Column(best_col)), sql_operator,
+                                                  to_number(found_value)))
         else:
             # Normal column condition
-            condition = f"{best_col} {sql_operator} {found_value}"
-            conditions['where'].append(condition)
+            conditions['where'].append(Predicate(Column(best_col), sql_operator, to_number(found_value)))
 
     return conditions
 
@@ -150,128 +145,74 @@ def parse_conditions(input_lower: str, table_schema: dict, comparison_patterns:
 def natural_language_to_sql(user_input: str) -> tuple:
     """
     Convert natural language input to SQL query using pattern matching.
+    Repeated questions (ignoring case, spacing, punctuation and the numbers used)
+    are answered from TRANSLATION_CACHE.
     """
-    command_patterns = {
-        'select': ['select', 'get', 'show', 'display', 'find', 'choose', 'pick', 'what', 'list'],
-        'join': ['join', 'combine', 'relate', 'with'],
-        'group': ['group', 'cluster', 'categorize', 'group by', 'per'],
-        'order': ['order', 'sort', 'arrange', 'rank', 'by'],
-        'count': ['count', 'how many', 'number of', 'total'],
-        'sum': ['sum', 'total'],
-        'average': ['average', 'mean', 'avg'],
-        'maximum': ['maximum', 'highest', 'most', 'max', 'greatest', 'biggest'],
-        'minimum': ['minimum', 'lowest', 'least', 'min', 'smallest'],
-        'limit': ['only', 'just', 'limit', 'top', 'first', 'under', 'at most'],
-        'desc': ['desc', 'descending', 'decreasing', 'high to low', 'largest to smallest', 'biggest to smallest'],
-        'asc': ['asc', 'ascending', 'increasing', 'low to high', 'smallest to largest'],
-        'having': ['having', 'with', 'that have', 'whose'],
-        'where': ['where', 'filter'],
-        'and': ['and', 'as well as'],
-        'or': ['or'],
-        'not': ['not', 'no', 'without']
-    }
+    success, sql, params = natural_language_to_sql_params(user_input)
+    return success, inline_params(sql, params) if success else sql
 
-    comparison_patterns = {
-        'greater_than': ['greater than', 'more than', 'above', 'exceeding', 'over', 'taller than', 'heavier than',
-                         'older than', 'after'],
-        'less_than': ['less than', 'fewer than', 'below', 'under', 'smaller than', 'lighter than', 'younger than',
-                      'before'],
-        'equal_to': ['equal to', 'equals', 'equal', 'is', 'are', 'was', 'were'],
-        'not_equal_to': ['not equal to', 'not equals', 'not equal', 'is not', 'are not', 'was not', 'were not',
-                         'does not equal', "isn't", "aren't"],
-        'greater_or_equal': ['at least', 'no less than', 'greater than or equal to', 'minimum', 'not less than'],
-        'less_or_equal': ['at most', 'no more than', 'less than or equal to', 'maximum', 'not greater than']
-    }
 
-    comparison_patterns_map = {
-        'greater_than': '>',
-        'less_than': '<',
-        'equal_to': '=',
-        'not_equal_to': '!=',
-        'greater_or_equal': '>=',
-        'less_or_equal': '<='
-    }
+def natural_language_to_sql_params(user_input: str) -> tuple:
+    """
+    Like natural_language_to_sql, but returns (success, template, params) where the
+    template has a %s placeholder for every literal, so questions that differ only in
+    their numbers share one statement.
+    """
+    return TRANSLATION_CACHE.lookup(user_input, translate_params, lexicon.get_lexicon().fingerprint)
 
-    table_relationships = {
-        ('Players', 'Teams'): ('TeamID', 'TeamID'),
-        ('Teams', 'Players'): ('TeamID', 'TeamID'),
-        ('Games', 'Teams'): ('HomeTeamID', 'TeamID'),
-        ('Teams', 'Games'): ('TeamID', 'HomeTeamID'),
-        ('Games', 'Players'): ('PlayerID', 'PlayerID'),
-        ('Players', 'Games'): ('PlayerID', 'PlayerID')
-    }
 
-    schemas = {
-        'Players': {
-            'columns': {
-                'PlayerID': {'aliases': ['playerid', 'player id', 'id'], 'type': 'int'},
-                'FirstName': {'aliases': ['firstname', 'first name', 'name'], 'type': 'string'},
-                'LastName': {'aliases': ['lastname', 'last name', 'surname'], 'type': 'string'},
-                'Position': {'aliases': ['position', 'pos', 'role'], 'type': 'string'},
-                'TeamID': {'aliases': ['teamid', 'team id'], 'type': 'int'},
-                'Height_cm': {'aliases': ['height', 'height_cm', 'tall'], 'type': 'float'},
-                'Weight_kg': {'aliases': ['weight', 'weight_kg'], 'type': 'float'},
-                'Birthdate': {'aliases': ['birthdate', 'birth', 'dob', 'born'], 'type': 'date'},
-                'Nationality': {'aliases': ['nationality', 'nation', 'country'], 'type': 'string'},
-                'PointsPerGame': {'aliases': ['points', 'ppg', 'scoring', 'pointspergame'], 'type': 'float'},
-                'ReboundsPerGame': {'aliases': ['rebounds', 'rpg', 'reboundspergame'], 'type': 'float'},
-                'AssistsPerGame': {'aliases': ['assists', 'apg', 'assistspergame'], 'type': 'float'},
-                'StealsPerGame': {'aliases': ['steals', 'spg', 'stealspergame'], 'type': 'float'},
-                'BlocksPerGame': {'aliases': ['blocks', 'bpg', 'blockspergame'], 'type': 'float'},
-                'NetWorth_USD': {'aliases': ['networth', 'worth', 'value'], 'type': 'float'}
-            },
-            'aliases': ['player', 'players', 'roster']
-        },
-        'Teams': {
-            'columns': {
-                'TeamID': {'aliases': ['teamid', 'team id'], 'type': 'int'},
-                'TeamName': {'aliases': ['teamname', 'team name', 'name'], 'type': 'string'},
-                'CEO': {'aliases': ['ceo', 'chief executive'], 'type': 'string'},
-                'Owner': {'aliases': ['owner', 'owned by'], 'type': 'string'},
-                'Location': {'aliases': ['location', 'city', 'place'], 'type': 'string'},
-                'Stadium': {'aliases': ['stadium', 'arena', 'court'], 'type': 'string'},
-                'FoundedYear': {'aliases': ['founded', 'established', 'foundedyear'], 'type': 'int'},
-                'NetWorth_USD': {'aliases': ['networth', 'worth', 'value'], 'type': 'float'}
-            },
-            'aliases': ['team', 'teams', 'franchise', 'franchises']
-        },
-        'Games': {
-            'columns': {
-                'GameID': {'aliases': ['gameid', 'game id', 'match id'], 'type': 'int'},
-                'HomeTeamID': {'aliases': ['hometeamid', 'home team id', 'home', 'hometeam'], 'type': 'int'},
-                'GuestTeamID': {'aliases': ['guestteamid', 'guest team id', 'away team id', 'visitor'], 'type': 'int'},
-                'Time': {'aliases': ['time', 'date', 'when'], 'type': 'date'},
-                'Score': {'aliases': ['score', 'result', 'points'], 'type': 'int'},
-                'Round': {'aliases': ['round', 'stage'], 'type': 'int'},
-                'GameNumber': {'aliases': ['game number', 'match number'], 'type': 'int'}
-            },
-            'aliases': ['game', 'games', 'match', 'matches']
-        }
-    }
+def translate(user_input: str) -> tuple:
+    """
+    Convert natural language input to SQL query using pattern matching, bypassing the cache.
+    """
+    success, sql, params = translate_params(user_input)
+    return success, inline_params(sql, params) if success else sql
+
+
+def translate_params(user_input: str) -> tuple:
+    """
+    Convert natural language input to a (success, template, params) SQL query, bypassing the cache.
+    The query is canonicalized before it is rendered, so phrasings of the same request
+    produce the same template.
+    """
+    success, result = translate_ir(user_input)
+    if not success:
+        return False, result, ()
+    template, params = queryir.render(queryir.canonicalize(result))
+    return True, template, params
+
+
+def translate_ir(user_input: str) -> tuple:
+    """
+    Convert natural language input to (success, queryir.Query), or (False, message) when
+    it can't be translated, bypassing the cache.
+    """
+    vocabulary = lexicon.get_lexicon()
+    schemas = vocabulary.schemas
 
     input_lower = user_input.lower().strip()
-    input_tokens = set(input_lower.split())
+    # One pass over the input finds every table, column, command and operator phrase
+    scan = vocabulary.scan(input_lower)
 
     # Extract numeric values from input
     numbers = re.findall(r'\d+', input_lower)
     numbers = [int(num) for num in numbers] if numbers else []
     used_numbers = set()
 
-    has_limit = any(token in input_tokens for token in command_patterns['limit'])
-    is_desc = any(token in input_tokens for token in command_patterns['desc'])
-    is_asc = any(token in input_tokens for token in command_patterns['asc'])
-    is_group = any(token in input_tokens for token in command_patterns['group'])
-    has_aggregate = any(input_tokens.intersection(patterns)
-                        for command, patterns in command_patterns.items()
-                        if command in ['count', 'average', 'maximum', 'minimum', 'sum'])
+    has_limit = scan.has('limit')
+    is_desc = scan.has('desc')
+    is_asc = scan.has('asc')
+    is_group = scan.has('group')
+    aggregate_commands = scan.commands.intersection(['count', 'average', 'maximum', 'minimum', 'sum'])
+    has_aggregate = bool(aggregate_commands)
 
     order_direction = "DESC" if is_desc else "ASC" if is_asc else None
 
+    # Parts of the queryir.Query being built
     query = {
         'select': [],
         'table': '',
-        'join_table': '',
-        'join_condition': '',
+        'joins': [],
         'where': [],
         'group_by': [],
         'having': [],
@@ -281,20 +222,9 @@ def natural_language_to_sql(user_input: str) -> tuple:
     }
 
     # Detect tables mentioned
-    tables_mentioned = []
-    for table, info in schemas.items():
-        table_aliases = [table.lower()] + info['aliases']
-        if input_tokens.intersection(table_aliases):
-            tables_mentioned.append(table)
-
-    columns_found = {}
-    for table, schema in schemas.items():
-        columns_found[table] = []
-        for col, col_info in schema['columns'].items():
-            aliases = col_info['aliases']
-            col_aliases = [col.lower()] + aliases
-            if input_tokens.intersection(col_aliases):
-                columns_found[table].append(col)
+    tables_mentioned = scan.tables()
+
+    columns_found = {table: scan.columns(table) for table in schemas}
 
     if not tables_mentioned:
         # No tables detected, use columns to guess
@@ -308,38 +238,28 @@ def natural_language_to_sql(user_input: str) -> tuple:
     else:
         query['table'] = tables_mentioned[0]
 
-    table_schema = schemas[query['table']]
-
-    # Handle JOIN
-    if len(tables_mentioned) >= 2 and any(token in input_tokens for token in command_patterns['join']):
-        primary_table = tables_mentioned[0]
-        for secondary_table in tables_mentioned[1:]:
-            if (primary_table, secondary_table) in table_relationships:
-                join_cols = table_relationships[(primary_table, secondary_table)]
-                query['join_table'] = secondary_table
-                query['join_condition'] = f"{primary_table}.{join_cols[0]} = {secondary_table}.{join_cols[1]}"
-                break
-            elif (secondary_table, primary_table) in table_relationships:
-                join_cols = table_relationships[(secondary_table, primary_table)]
-                query['join_table'] = secondary_table
-                query['join_condition'] = f"{secondary_table}.{join_cols[0]} = {primary_table}.{join_cols[1]}"
-                break
-        else:
-            return False, "These tables cannot be joined directly."
+    # Handle JOIN along the shortest foreign key paths between the mentioned tables
+    if len(tables_mentioned) >= 2 and scan.has('join'):
+        join_graph = vocabulary.join_graph
+        steps = join_graph.join_steps(tables_mentioned)
+        if steps is None:
+            return False, "These tables cannot be joined through their foreign keys."
+        for left, right in steps:
+            query['joins'].append(Join(right, join_condition(left, right, join_graph.roles(left, right), scan)))
 
     selected_columns = columns_found.get(query['table'], [])
     aggregate_columns = []
     group_columns = []
     order_columns = []
 
+    # Every selected column was found through one of its aliases, so it is mentioned in the input
     for col in selected_columns:
-        aggregates = detect_aggregates(input_lower, col, command_patterns)
+        aggregates = detect_aggregates(aggregate_commands, col)
         if aggregates:
             aggregate_columns.extend(aggregates)
-        if is_group and any(alias in input_lower for alias in table_schema['columns'][col]['aliases'] + [col.lower()]):
+        if is_group:
             group_columns.append(col)
-        if any(token in input_tokens for token in command_patterns['order']) and \
-                any(alias in input_lower for alias in table_schema['columns'][col]['aliases'] + [col.lower()]):
+        if scan.has('order'):
             order_columns.append(col)
 
     top_n_value, order_column_phrase = extract_top_n_phrase(input_lower)
@@ -351,11 +271,10 @@ def natural_language_to_sql(user_input: str) -> tuple:
         found_column = False
         if order_column_phrase:
             column_phrase_cleaned = ' '.join([w for w in order_column_phrase.split() if w not in ['and', 'with']])
-            for col, col_info in table_schema['columns'].items():
-                if column_phrase_cleaned in ([col.lower()] + col_info['aliases']):
-                    query['order_by'].append(col)
-                    found_column = True
-                    break
+            col = vocabulary.column_for_phrase(query['table'], column_phrase_cleaned)
+            if col:
+                query['order_by'].append(col)
+                found_column = True
         else:
             # No specific column, just pick the first selected column or a default
             if selected_columns:
@@ -371,8 +290,7 @@ def natural_language_to_sql(user_input: str) -> tuple:
     # Remove numbers used in top N
     numbers = [num for num in numbers if num not in used_numbers]
 
-    conditions = parse_conditions(input_lower, table_schema, comparison_patterns, comparison_patterns_map,
-                                  aggregate_columns, used_numbers)
+    conditions = parse_conditions(input_lower, query['table'], aggregate_columns, scan)
     if conditions['where']:
         query['where'].extend(conditions['where'])
     if conditions['having']:
@@ -381,8 +299,8 @@ def natural_language_to_sql(user_input: str) -> tuple:
     # Build SELECT clause
     if is_group:
         if group_columns:
-            query['group_by'].extend(group_columns)
-            query['select'].extend(group_columns)
+            query['group_by'].extend(Column(col) for col in group_columns)
+            query['select'].extend(Column(col) for col in group_columns)
             if aggregate_columns:
                 query['select'].extend(aggregate_columns)
         else:
@@ -392,61 +310,49 @@ def natural_language_to_sql(user_input: str) -> tuple:
             query['select'].extend(aggregate_columns)
         elif selected_columns:
             # If user said "choose name" and we found multiple columns,
-            # pick them. If none, default to '*'
-            query['select'].extend(selected_columns)
-        else:
-            query['select'].append('*')
+            # pick them. If none, every column is selected
+            query['select'].extend(Column(col) for col in selected_columns)
 
     # Handle ordering
-    if query['order_by']:
-        if not query['order_direction']:
-            query['order_direction'] = 'ASC'
-        query['order_by'] = [f"{col} {query['order_direction']}" for col in query['order_by']]
+    descending = query['order_direction'] == 'DESC'
+    query['order_by'] = [Order(Column(col), descending) for col in query['order_by']]
 
     # Apply LIMIT from remaining numbers if needed
     if has_limit and numbers and not query['limit']:
         query['limit'] = numbers[-1]
 
-    # Construct final query
-    select_clause = ', '.join(query['select']) if query['select'] else '*'
-    sql_parts = [f"SELECT {select_clause}", f"FROM {query['table']}"]
-
-    if query['join_table']:
-        sql_parts.append(f"JOIN {query['join_table']} ON {query['join_condition']}")
-
-    if query['where']:
-        sql_parts.append(f"WHERE {' AND '.join(query['where'])}")
-    if query['group_by']:
-        sql_parts.append(f"GROUP BY {', '.join(query['group_by'])}")
-    if query['having']:
-        sql_parts.append(f"HAVING {' AND '.join(query['having'])}")
-    if query['order_by']:
-        sql_parts.append(f"ORDER BY {', '.join(query['order_by'])}")
-    if query['limit']:
-        sql_parts.append(f"LIMIT {query['limit']}")
-
-    final_query = ' '.join(sql_parts)
-    return True, final_query
+    return True, queryir.Query(
+        projection=tuple(query['select']),
+        source=query['table'],
+        joins=tuple(query['joins']),
+        predicates=tuple(query['where']),
+        group_by=tuple(query['group_by']),
+        having=tuple(query['having']),
+        order_by=tuple(query['order_by']),
+        limit=query['limit'] or None
+    )
 
 
-def prompt_natural():
+def prompt_natural(db=None, input_func=input):
     """Interactive prompt for natural language queries."""
+    if db is None:
+        db = connect.chatDB()
     while True:
         print("\nEnter natural language query (or 'exit' to quit):")
-        user_input = input()
+        user_input = input_func()
 
         if user_input.lower() == 'exit':
             break
 
         try:
-            success, result = natural_language_to_sql(user_input)
+            success, result, params = natural_language_to_sql_params(user_input)
             if success:
                 while True:
                     print("\nSuggested SQL Query:")
-                    print(result)
-                    execute_input = input('Execute this query to the database? Y/N\n')
+                    print(inline_params(result, params))
+                    execute_input = input_func('Execute this query to the database? Y/N\n')
                     if execute_input.lower() == 'y':
-                        print(connect.chatDB().execute_query(result))
+                        print(db.execute_query(result, params, origin='nl'))
                         break
                     elif execute_input.lower() == 'n':
                         break
@@ -456,7 +362,7 @@ def prompt_natural():
                         # Treat any other input as a new query
                         user_input = execute_input.strip()
                         if user_input:
-                            success, result = natural_language_to_sql(user_input)
+                            success, result, params = natural_language_to_sql_params(user_input)
                             if success:
                                 continue
                             else:
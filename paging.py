@@ -0,0 +1,175 @@
+import re
+
+from tabulate import tabulate
+
+
+PAGE_SIZE = 10
+
+_FROM_TABLE = re.compile(r"\bFROM\s+`?(\w+)`?", re.I)
+_JOIN = re.compile(r"\bJOIN\b|\bFROM\s+`?\w+`?(?:\s+(?:AS\s+)?\w+)?\s*,", re.I)
+_SUBQUERY = re.compile(r"\(\s*SELECT\b", re.I)
+_GROUP_BY = re.compile(r"\bGROUP\s+BY\s+(.*?)(?=\bHAVING\b|\bORDER\s+BY\b|\bLIMIT\b|$)", re.I | re.S)
+_ORDER_BY = re.compile(r"\bORDER\s+BY\s+(.*?)(?=\bLIMIT\b|$)", re.I | re.S)
+_LIMIT = re.compile(r"\bLIMIT\b", re.I)
+_ITEM = re.compile(r"^`?(?:\w+`?\.`?)?(\w+)`?(?:\s+(ASC|DESC))?$", re.I)
+
+
+def _columns(clause: str) -> list:
+    """(column, direction) pairs of a GROUP BY or ORDER BY list, or None if it holds an expression."""
+    items = []
+    for item in clause.split(','):
+        match = _ITEM.match(item.strip())
+        if not match:
+            return None
+        items.append((match.group(1), (match.group(2) or 'ASC').upper()))
+    return items
+
+
+class KeysetPager:
+    """
+    Pages through the result of a SELECT by seeking past the last row shown instead of
+    skipping rows with OFFSET, so every page costs about the same as the first.
+    The query is wrapped as a derived table and ordered by a unique key of its result:
+    key if given, else its GROUP BY columns, else the primary key of the table it reads
+    (when it reads just one). The query's own ORDER BY is kept when it sorts plain columns
+    in one direction, with the key appended to break ties. Rows whose sort columns are
+    NULL can't be seeked past; primary keys never are. Neither can approximate (float) values,
+    which may not compare equal to what is stored once read back (a MySQL FLOAT against a
+    DOUBLE parameter); from the first such page boundary on, pages keep the keyset order but
+    are reached with OFFSET.
+    When no key can be found it falls back to LIMIT/OFFSET, shown by an empty keyset.
+    The start of every page visited is remembered, so going back costs one seek too.
+    """
+
+    def __init__(self, db, query: str, params: tuple = None, page_size: int = PAGE_SIZE, key=None):
+        self.db = db
+        self.query = query.strip().rstrip(';').strip()
+        self.params = tuple(params) if params is not None else ()
+        self.page_size = page_size
+        self.requested_key = (key,) if isinstance(key, str) else tuple(key) if key else None
+        # Columns ordered and seeked on, and their direction; None until the first page, () for OFFSET paging
+        self.keyset = None
+        self.descending = False
+        # False once pages are reached with OFFSET in keyset order
+        self.seek = True
+        # Start boundary of each page visited: the previous page's last key, or its OFFSET
+        self._starts = [None]
+        self.page = -1
+        self.column_names = []
+        self.rows = []
+        self.has_next = False
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 0
+
+    def _probe_columns(self) -> list:
+        probe = f"SELECT * FROM ({self.query}) AS keyset_page WHERE 1 = 0"
+        for column_names, _ in self.db.stream_batches(probe, self.params or None):
+            return column_names
+        return []
+
+    def _unique_key(self) -> tuple:
+        if self.requested_key:
+            return self.requested_key
+        if _SUBQUERY.search(self.query):
+            return None
+        group_by = _GROUP_BY.search(self.query)
+        if group_by:
+            grouped = _columns(group_by.group(1))
+            return tuple(column for column, _ in grouped) if grouped else None
+        table = _FROM_TABLE.search(self.query)
+        if table is None or _JOIN.search(self.query) or self.db.backend.primary_key_query is None:
+            return None
+        return tuple(name for (name,) in self.db.stream_rows(self.db.backend.primary_key_query, (table.group(1),)))
+
+    def _choose_keyset(self):
+        """Work out the columns to order and seek by, or () for OFFSET paging."""
+        columns = {name.lower(): name for name in self._probe_columns()}
+        key = self._unique_key()
+        if not key or any(column.lower() not in columns for column in key):
+            return ()
+        order_by = _ORDER_BY.search(self.query)
+        order = _columns(order_by.group(1)) if order_by else []
+        if order is None or len({direction for _, direction in order}) > 1 or \
+                any(column.lower() not in columns for column, _ in order):
+            return ()
+        self.descending = bool(order) and order[0][1] == 'DESC'
+        keyset = [columns[column.lower()] for column, _ in order]
+        keyset += [columns[column.lower()] for column in key if columns[column.lower()] not in keyset]
+        return tuple(keyset)
+
+    def _page_query(self, start) -> tuple:
+        """SQL and params fetching one row more than a page from start, to tell if another page follows."""
+        limit = self.page_size + 1
+        if not self.keyset:
+            if _LIMIT.search(self.query):
+                return f"SELECT * FROM ({self.query}) AS keyset_page LIMIT %s OFFSET %s", self.params + (limit, start or 0)
+            return f"{self.query} LIMIT %s OFFSET %s", self.params + (limit, start or 0)
+        direction = ' DESC' if self.descending else ''
+        order = ', '.join(f"`{column}`{direction}" for column in self.keyset)
+        sql = f"SELECT * FROM ({self.query}) AS keyset_page"
+        params = self.params
+        if not self.seek:
+            return f"{sql} ORDER BY {order} LIMIT %s OFFSET %s", params + (limit, start or 0)
+        if start is not None:
+            columns = ', '.join(f"`{column}`" for column in self.keyset)
+            placeholders = ', '.join(['%s'] * len(self.keyset))
+            if len(self.keyset) > 1:
+                columns, placeholders = f"({columns})", f"({placeholders})"
+            sql += f" WHERE {columns} {'<' if self.descending else '>'} {placeholders}"
+            params += tuple(start)
+        return f"{sql} ORDER BY {order} LIMIT %s", params + (limit,)
+
+    def _load(self, page: int):
+        """Fetch page (0-based) and return it formatted, or None on error."""
+        try:
+            if self.keyset is None:
+                self.keyset = self._choose_keyset()
+            sql, params = self._page_query(self._starts[page])
+            column_names, rows = [], []
+            for column_names, batch in self.db.stream_batches(sql, params):
+                rows.extend(batch)
+        except self.db.backend.Error as err:
+            print(f"Error executing query: {err}")
+            return None
+        self.page = page
+        self.column_names = column_names
+        self.has_next = len(rows) > self.page_size
+        self.rows = rows[:self.page_size]
+        if self.has_next and len(self._starts) == page + 1:
+            start = None
+            if self.keyset and self.seek:
+                positions = [column_names.index(column) for column in self.keyset]
+                start = tuple(self.rows[-1][position] for position in positions)
+                if any(isinstance(value, float) for value in start):
+                    # The pages so far were in keyset order, so their offsets reach the same rows
+                    self.seek = False
+                    self._starts = [None] + [index * self.page_size for index in range(1, len(self._starts))]
+                    start = None
+            self._starts.append(start if start is not None else (page + 1) * self.page_size)
+        return self.format()
+
+    def first(self):
+        return self._load(0)
+
+    def next(self):
+        """The following page, or None at the last one."""
+        return self._load(self.page + 1) if self.has_next else None
+
+    def prev(self):
+        """The preceding page, or None at the first one."""
+        return self._load(self.page - 1) if self.has_prev else None
+
+    def format(self) -> str:
+        table = tabulate(self.rows, headers=self.column_names, tablefmt="psql")
+        first_row = self.page * self.page_size + 1
+        footer = f"Page {self.page + 1}, rows {first_row}-{first_row + len(self.rows) - 1}" if self.rows else \
+            f"Page {self.page + 1}, no rows"
+        if not self.has_next:
+            footer += " (last page)"
+        if not self.keyset:
+            footer += "; no unique key found, using OFFSET"
+        else:
+            footer += f"; ordered by {', '.join(self.keyset)}" + ("" if self.seek else ", using OFFSET")
+        return f"{table}\n{footer}"
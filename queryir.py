@@ -0,0 +1,238 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple, Union
+
+
+class Column(NamedTuple):
+    """A column, with its table when the query reads more than one."""
+    name: str
+    table: Optional[str] = None
+
+
+class Aggregate(NamedTuple):
+    """An aggregate of a column (COUNT of no column counts rows), with its output name when selected."""
+    function: str
+    column: Optional[Column] = None
+    alias: Optional[str] = None
+
+
+Expression = Union[Column, Aggregate]
+
+
+class Predicate(NamedTuple):
+    """expression operator value; value is PARAM in a query's shape."""
+    expression: Expression
+    operator: str
+    value: object
+
+
+class JoinCondition(NamedTuple):
+    left: Column
+    right: Column
+
+
+class Join(NamedTuple):
+    """JOIN table, matching rows through any of the conditions."""
+    table: str
+    conditions: Tuple[JoinCondition, ...]
+
+
+class Order(NamedTuple):
+    expression: Expression
+    descending: bool = False
+
+
+class Query(NamedTuple):
+    """
+    A translated SELECT, independent of how it is spelled in SQL. An empty projection
+    selects every column; predicates are ANDed, as are having.
+    """
+    projection: Tuple[Expression, ...]
+    source: str
+    joins: Tuple[Join, ...] = ()
+    predicates: Tuple[Predicate, ...] = ()
+    group_by: Tuple[Column, ...] = ()
+    having: Tuple[Predicate, ...] = ()
+    order_by: Tuple[Order, ...] = ()
+    limit: Optional[int] = None
+
+    def params(self) -> tuple:
+        """The literal values, in the order render() binds them."""
+        values = [predicate.value for predicate in self.predicates + self.having]
+        if self.limit is not None:
+            values.append(self.limit)
+        return tuple(values)
+
+    def shape(self) -> 'Query':
+        """The query with every literal replaced by PARAM: all queries differing only in values share it."""
+        return Query(self.projection, self.source, self.joins,
+                     tuple(Predicate(predicate.expression, predicate.operator, PARAM) for predicate in self.predicates),
+                     self.group_by,
+                     tuple(Predicate(predicate.expression, predicate.operator, PARAM) for predicate in self.having),
+                     self.order_by, PARAM if self.limit is not None else None)
+
+
+class _Param:
+    def __repr__(self):
+        return 'PARAM'
+
+
+# Stands for a bound value in a query's shape
+PARAM = _Param()
+
+
+class Dialect(NamedTuple):
+    name: str
+    placeholder: str
+    quote: str
+
+
+DIALECTS = {
+    'mysql': Dialect('mysql', '%s', '`'),
+    'sqlite': Dialect('sqlite', '?', '"')
+}
+# chatDB takes %s templates on every backend, translating them itself where needed
+DEFAULT_DIALECT = DIALECTS['mysql']
+
+# Spellings of each comparison, mapped to the one canonical queries use
+OPERATORS = {'=': '=', '==': '=', '!=': '<>', '<>': '<>', '>': '>', '<': '<', '>=': '>=', '<=': '<='}
+AGGREGATES = ('COUNT', 'AVG', 'SUM', 'MAX', 'MIN')
+_PLAIN_IDENTIFIER = re.compile(r'[A-Za-z_]\w*$')
+# Words that can't name a column or table unquoted in either dialect
+RESERVED = {
+    'ALL', 'AND', 'AS', 'ASC', 'BETWEEN', 'BY', 'CASE', 'CROSS', 'DESC', 'DISTINCT', 'ELSE', 'EXISTS', 'FROM',
+    'GROUP', 'HAVING', 'IN', 'INDEX', 'INNER', 'IS', 'JOIN', 'KEY', 'LEFT', 'LIKE', 'LIMIT', 'NOT', 'NULL', 'ON',
+    'OR', 'ORDER', 'OUTER', 'RIGHT', 'SELECT', 'TABLE', 'THEN', 'UNION', 'USING', 'WHEN', 'WHERE', 'WITH'
+}
+
+
+def _key(expression: Expression) -> tuple:
+    """Sort key of an expression; an aggregate's output name doesn't change what it computes."""
+    if isinstance(expression, Aggregate):
+        return 1, expression.function, _key(expression.column) if expression.column else ()
+    return 0, (expression.table or '').lower(), expression.name.lower()
+
+
+def _unique(items, key=None) -> tuple:
+    seen, kept = set(), []
+    for item in items:
+        marker = item if key is None else key(item)
+        if marker not in seen:
+            seen.add(marker)
+            kept.append(item)
+    return tuple(kept)
+
+
+def _canonical_expression(expression: Expression) -> Expression:
+    if isinstance(expression, Aggregate) and expression.function not in AGGREGATES:
+        function = expression.function.upper()
+        if function not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate: {expression.function}")
+        return Aggregate(function, expression.column, expression.alias)
+    return expression
+
+
+def _canonical_predicates(predicates) -> tuple:
+    normalized = []
+    for predicate in predicates:
+        operator = OPERATORS.get(predicate.operator.strip().upper())
+        if operator is None:
+            raise ValueError(f"Unknown operator: {predicate.operator}")
+        # An aggregate is compared by what it computes, not by the name it was selected as
+        expression = _canonical_expression(predicate.expression)
+        if isinstance(expression, Aggregate) and expression.alias is not None:
+            expression = Aggregate(expression.function, expression.column)
+        normalized.append(Predicate(expression, operator, predicate.value))
+    if len(normalized) < 2:
+        return tuple(normalized)
+    # Ordered by column and operator only: ordering by value too would make the SQL depend
+    # on the numbers, and a template shared by every question differing only in them
+    return tuple(sorted(_unique(normalized), key=lambda predicate: (_key(predicate.expression), predicate.operator)))
+
+
+def canonicalize(query: Query) -> Query:
+    """
+    The canonical form of query: operators and aggregate names in one spelling, predicates
+    sorted (by column, then operator) and deduplicated, GROUP BY columns sorted, join
+    conditions sorted, and repeats dropped from the projection and ORDER BY. Queries meaning
+    the same thing however they were phrased become equal, and so render the same SQL.
+    The projection and ORDER BY keep their order, which the result shows.
+    """
+    # Most questions leave most sections empty or with one entry, which are canonical already
+    return Query(
+        projection=_unique(_canonical_expression(expression) for expression in query.projection),
+        source=query.source,
+        joins=tuple(Join(join.table, tuple(sorted(_unique(join.conditions),
+                                                  key=lambda condition: (_key(condition.left), _key(condition.right)))))
+                    for join in query.joins),
+        predicates=_canonical_predicates(query.predicates) if query.predicates else (),
+        group_by=tuple(sorted(_unique(query.group_by, _key), key=_key)) if len(query.group_by) > 1 else query.group_by,
+        having=_canonical_predicates(query.having) if query.having else (),
+        order_by=_unique((Order(_canonical_expression(order.expression), order.descending)
+                          for order in query.order_by), key=lambda order: _key(order.expression))
+        if query.order_by else (),
+        limit=query.limit
+    )
+
+
+def identifier(name: str, dialect: Dialect = DEFAULT_DIALECT) -> str:
+    """name as the dialect needs it written, quoted only when it must be."""
+    if _PLAIN_IDENTIFIER.match(name) and name.upper() not in RESERVED:
+        return name
+    return f"{dialect.quote}{name.replace(dialect.quote, dialect.quote * 2)}{dialect.quote}"
+
+
+def _expression(expression: Expression, dialect: Dialect, selected: bool = False) -> str:
+    if isinstance(expression, Aggregate):
+        sql = f"{expression.function}({_expression(expression.column, dialect) if expression.column else '*'})"
+        if selected and expression.alias:
+            sql += f" as {identifier(expression.alias, dialect)}"
+        return sql
+    if expression.table:
+        return f"{identifier(expression.table, dialect)}.{identifier(expression.name, dialect)}"
+    return identifier(expression.name, dialect)
+
+
+def _conditions(predicates: tuple, dialect: Dialect) -> str:
+    return ' AND '.join(f"{_expression(predicate.expression, dialect)} {predicate.operator} {dialect.placeholder}"
+                        for predicate in predicates)
+
+
+@lru_cache(maxsize=1024)
+def _render_shape(shape: Query, dialect: Dialect) -> str:
+    # Cached on the shape, so every query of one shape gets the very same template string
+    select = ', '.join(_expression(expression, dialect, selected=True) for expression in shape.projection) or '*'
+    parts = [f"SELECT {select}", f"FROM {identifier(shape.source, dialect)}"]
+    for join in shape.joins:
+        on = ' OR '.join(f"{_expression(condition.left, dialect)} = {_expression(condition.right, dialect)}"
+                         for condition in join.conditions)
+        parts.append(f"JOIN {identifier(join.table, dialect)} ON {on}")
+    if shape.predicates:
+        parts.append(f"WHERE {_conditions(shape.predicates, dialect)}")
+    if shape.group_by:
+        parts.append(f"GROUP BY {', '.join(_expression(column, dialect) for column in shape.group_by)}")
+    if shape.having:
+        parts.append(f"HAVING {_conditions(shape.having, dialect)}")
+    if shape.order_by:
+        parts.append("ORDER BY " + ', '.join(f"{_expression(order.expression, dialect)} "
+                                             f"{'DESC' if order.descending else 'ASC'}" for order in shape.order_by))
+    if shape.limit is not None:
+        parts.append(f"LIMIT {dialect.placeholder}")
+    return ' '.join(parts)
+
+
+def render(query: Query, dialect=DEFAULT_DIALECT) -> tuple:
+    """
+    (template, params) of query in dialect (a Dialect or a backend name), with a placeholder
+    for every literal. Render canonicalized queries so equal intents share one template,
+    and with it result cache entries and prepared statements.
+    """
+    if isinstance(dialect, str):
+        dialect = DIALECTS[dialect]
+    return _render_shape(query.shape(), dialect), query.params()
+
+
+def render_stats() -> dict:
+    """Hits and misses of the template cache, i.e. how often a query's shape was seen before."""
+    info = _render_shape.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
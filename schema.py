@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import re
+
+import connect
+import lexicon
+
+
+# Bump when the cached model layout changes so old cache files are rebuilt
+FORMAT_VERSION = 1
+SCHEMA_CACHE_PATH = os.environ.get(
+    'CHATDB_SCHEMA_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'chatdb', f"schema-{connect.DB_CONFIG['database']}.json"))
+# Extra alias files, separated by os.pathsep
+ALIAS_PATHS = [path for path in os.environ.get('CHATDB_ALIASES', '').split(os.pathsep) if path]
+
+# One cheap aggregate over the catalog that changes whenever a column or foreign key does
+FINGERPRINT_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_KEY, ORDINAL_POSITION))), 0)
+     FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))), 0)
+     FROM information_schema.KEY_COLUMN_USAGE
+     WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL)
+"""
+
+COLUMNS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_KEY
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+FOREIGN_KEYS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+FROM information_schema.KEY_COLUMN_USAGE
+WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+"""
+
+TYPE_MAP = {
+    'int': 'int', 'integer': 'int', 'tinyint': 'int', 'smallint': 'int', 'mediumint': 'int', 'bigint': 'int',
+    'year': 'int', 'bit': 'int',
+    'float': 'float', 'double': 'float', 'decimal': 'float', 'numeric': 'float', 'real': 'float',
+    'date': 'date', 'datetime': 'date', 'timestamp': 'date', 'time': 'date'
+}
+
+
+def column_type(data_type: str) -> str:
+    """Map a MySQL DATA_TYPE to the translator's int/float/date/string types."""
+    return TYPE_MAP.get(data_type.lower(), 'string')
+
+
+def default_aliases(name: str) -> list:
+    """Aliases derived from an identifier, e.g. 'PointsPerGame' -> ['pointspergame', 'points per game']."""
+    aliases = [name.lower()]
+    words = ' '.join(re.sub(r'(?<=[a-z0-9])(?=[A-Z])', ' ', name).replace('_', ' ').lower().split())
+    if words not in aliases:
+        aliases.append(words)
+    return aliases
+
+
+def build_model(columns, foreign_keys, alias_sources=()) -> dict:
+    """
+    Build the translator's schema model from information_schema rows.
+    alias_sources are dicts shaped like lexicon.SCHEMAS (or alias files) whose table and
+    column aliases are merged in, and whose table order is kept ahead of other tables.
+    """
+    tables = {}
+    for table, column, data_type, _ in columns:
+        info = tables.setdefault(table, {'columns': {}, 'aliases': []})
+        info['columns'][column] = {'aliases': [], 'type': column_type(data_type)}
+
+    order = []
+    for source in alias_sources:
+        order.extend(table for table in source if table in tables and table not in order)
+    order.extend(sorted(table for table in tables if table not in order))
+
+    schemas = {}
+    for table in order:
+        info = tables[table]
+        table_aliases = default_aliases(table)
+        if table.lower().endswith('s'):
+            table_aliases.append(table.lower()[:-1])
+        for source in alias_sources:
+            table_aliases.extend(source.get(table, {}).get('aliases', []))
+        columns_model = {}
+        for column, col_info in info['columns'].items():
+            aliases = default_aliases(column)
+            for source in alias_sources:
+                extra = source.get(table, {}).get('columns', {}).get(column, [])
+                # Alias files list aliases directly, lexicon.SCHEMAS nests them with the type
+                aliases.extend(extra['aliases'] if isinstance(extra, dict) else extra)
+            columns_model[column] = {'aliases': _unique(aliases), 'type': col_info['type']}
+        schemas[table] = {'columns': columns_model, 'aliases': _unique(table_aliases)}
+
+    return {
+        'version': FORMAT_VERSION,
+        'schemas': schemas,
+        'foreign_keys': [list(row) for row in foreign_keys if row[0] in schemas and row[2] in schemas]
+    }
+
+
+def _unique(items: list) -> list:
+    return list(dict.fromkeys(item.lower() for item in items if item))
+
+
+def load_alias_files(paths) -> list:
+    """Read user alias files: {"Table": {"aliases": [...], "columns": {"Column": [...]}}}."""
+    sources = []
+    for path in paths:
+        with open(path, encoding='utf-8') as alias_file:
+            sources.append(json.load(alias_file))
+    return sources
+
+
+def fingerprint(db, alias_sources=()) -> str:
+    """Fingerprint of the database catalog plus the alias files, computed with one small query."""
+    catalog = list(db.stream_rows(FINGERPRINT_QUERY))
+    digest = hashlib.sha1(f"{FORMAT_VERSION}:{catalog!r}".encode())
+    digest.update(json.dumps(alias_sources, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def introspect(db, alias_sources=()) -> dict:
+    """Read columns and foreign keys from information_schema through chatDB."""
+    columns = list(db.stream_rows(COLUMNS_QUERY))
+    foreign_keys = list(db.stream_rows(FOREIGN_KEYS_QUERY))
+    return build_model(columns, foreign_keys, alias_sources)
+
+
+def read_cache(path: str = SCHEMA_CACHE_PATH):
+    """Return the cached schema model, or None if there is no usable cache file."""
+    try:
+        with open(path, encoding='utf-8') as cache_file:
+            model = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    return model if model.get('version') == FORMAT_VERSION else None
+
+
+def write_cache(model: dict, path: str = SCHEMA_CACHE_PATH):
+    """Write the schema model compactly, replacing any previous cache file atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(model, cache_file, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+
+def load_schema(db, cache_path: str = SCHEMA_CACHE_PATH, alias_paths=None) -> dict:
+    """
+    Return the schema model for the connected database.
+    The on-disk cache is used when its fingerprint still matches; otherwise the catalog
+    is introspected and the cache rewritten.
+    """
+    alias_sources = [lexicon.SCHEMAS] + load_alias_files(ALIAS_PATHS if alias_paths is None else alias_paths)
+    current = fingerprint(db, alias_sources)
+    model = read_cache(cache_path)
+    if model is not None and model.get('fingerprint') == current:
+        return model
+    model = introspect(db, alias_sources)
+    model['fingerprint'] = current
+    write_cache(model, cache_path)
+    return model
+
+
+def install(model: dict):
+    """Make the translator use the given schema model."""
+    lexicon.set_lexicon(lexicon.Lexicon(model['schemas'], foreign_keys=model['foreign_keys']))
+
+
+def use_database_schema(db, cache_path: str = SCHEMA_CACHE_PATH, alias_paths=None) -> bool:
+    """Point the translator at the connected database's schema; keep the built-in one on failure."""
+    if db.pool is None or not db.backend.information_schema:
+        return False
+    try:
+        model = load_schema(db, cache_path, alias_paths)
+    except (db.backend.Error, OSError, ValueError) as err:
+        print(f"Could not load database schema, using the built-in one: {err}")
+        return False
+    if not model['schemas']:
+        return False
+    install(model)
+    return True
+
+
+def use_cached_schema(cache_path: str = SCHEMA_CACHE_PATH) -> bool:
+    """Install the schema model from the cache file without touching the database."""
+    model = read_cache(cache_path)
+    if model is None or not model['schemas']:
+        return False
+    install(model)
+    return True
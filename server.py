@@ -0,0 +1,700 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import multiprocessing
+import os
+import secrets
+import struct
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from tabulate import tabulate
+
+import asyncdb
+import cache
+import connect
+import natural
+import schema
+
+
+HOST = os.environ.get('CHATDB_SERVER_HOST', '127.0.0.1')
+PORT = int(os.environ.get('CHATDB_SERVER_PORT', 8765))
+# Requests (or WebSocket messages) per second each session may make, with bursts of up to RATE_BURST
+RATE_PER_SECOND = float(os.environ.get('CHATDB_SERVER_RATE', 5))
+RATE_BURST = int(os.environ.get('CHATDB_SERVER_BURST', 20))
+# Sessions unused for this long are dropped; past MAX_SESSIONS the least recently used one is
+SESSION_IDLE_SECONDS = 30 * 60
+MAX_SESSIONS = 1000
+# Statements remembered per session
+HISTORY_SIZE = 20
+# Processes translating questions; 0 translates on a thread of the server process
+TRANSLATE_WORKERS = min(4, os.cpu_count() or 1)
+# Rows of a result read ahead of the client; results up to this size give their connection back
+# (and are safe from the query timeout) however slowly the client reads them
+STREAM_BUFFER_ROWS = int(os.environ.get('CHATDB_SERVER_BUFFER_ROWS', 20000))
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_SECONDS = 60
+# Seconds a client has to send the body of a request once its headers arrived
+BODY_TIMEOUT_SECONDS = 30
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+REASONS = {
+    101: 'Switching Protocols', 200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+    405: 'Method Not Allowed', 408: 'Request Timeout', 413: 'Payload Too Large', 429: 'Too Many Requests',
+    431: 'Request Header Fields Too Large', 500: 'Internal Server Error'
+}
+
+
+def translate_question(question: str) -> tuple:
+    """(success, template or message, params) for a question; runs in a translation worker."""
+    try:
+        return natural.natural_language_to_sql_params(question)
+    except Exception as e:
+        return False, f"Error: {str(e)}", ()
+
+
+def _init_worker(schema_cache: str):
+    """Translate against the server's database schema, read from its cache file."""
+    if schema_cache:
+        schema.use_cached_schema(schema_cache)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class RateLimiter:
+    """Token bucket per key: rate tokens a second, holding at most burst."""
+
+    def __init__(self, rate: float = RATE_PER_SECOND, burst: int = RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self.limited = 0
+
+    def acquire(self, key) -> float:
+        """Take a token for key; returns 0 when allowed, else the seconds until one is available."""
+        now = time.monotonic()
+        if len(self._buckets) > MAX_SESSIONS * 10:
+            self._prune(now)
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.limited += 1
+            return (1 - tokens) / self.rate
+        self._buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def forget(self, key):
+        self._buckets.pop(key, None)
+
+    def _prune(self, now: float):
+        # A full bucket is the same as no bucket
+        self._buckets = {key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+                         if tokens + (now - updated) * self.rate < self.burst}
+
+
+class Session:
+    """What the server remembers about one client between requests."""
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.created = time.time()
+        self.last_used = time.monotonic()
+        self.queries = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+        # (template, params) of the last successful translation, run by 'execute'
+        self.translation = None
+        # One statement at a time per session, so no client holds more than one pooled connection
+        self.lock = asyncio.Lock()
+
+    def describe(self) -> dict:
+        return {
+            'session': self.id,
+            'created': self.created,
+            'queries': self.queries,
+            'translation': natural.inline_params(*self.translation) if self.translation else None,
+            'history': list(self.history)
+        }
+
+
+class SessionStore:
+    """Sessions by id, dropped after idle_seconds unused or when more than max_sessions exist."""
+
+    def __init__(self, idle_seconds: float = SESSION_IDLE_SECONDS, max_sessions: int = MAX_SESSIONS):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self) -> Session:
+        self.prune()
+        while len(self._sessions) >= self.max_sessions:
+            self._sessions.popitem(last=False)
+        session = Session(secrets.token_urlsafe(16))
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str):
+        """The session with session_id, or None if there is none (or it expired)."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_used > self.idle_seconds:
+            del self._sessions[session_id]
+            return None
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def remove(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def prune(self):
+        """Drop the sessions idle for too long; they are kept in least recently used order."""
+        deadline = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used > deadline:
+                break
+            self._sessions.popitem(last=False)
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: dict, body: bytes, peer: str):
+        self.method = method
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+        self.peer = peer
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get('connection', '').lower() != 'close'
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            body = json.loads(self.body)
+        except ValueError as err:
+            raise HTTPError(400, f"Invalid JSON: {err}")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Expected a JSON object")
+        return body
+
+
+async def read_request(reader, peer: str):
+    """The next request on a connection, or None once the client closed it."""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_SECONDS)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "Request headers too large")
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, _ = lines[0].split(' ', 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise HTTPError(400, "Chunked request bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"Request bodies are limited to {MAX_BODY_BYTES} bytes")
+    try:
+        body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT_SECONDS) if length else b''
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    except asyncio.TimeoutError:
+        raise HTTPError(408, f"The request body took longer than {BODY_TIMEOUT_SECONDS}s to arrive")
+    return Request(method.upper(), target, headers, body, peer)
+
+
+def _head(status: int, headers: dict) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+def _dumps(value) -> str:
+    # Dates, Decimals and the like as their text
+    return json.dumps(value, default=str)
+
+
+async def encode(message: dict) -> bytes:
+    """message as JSON; batches of rows are encoded off the event loop, which they would hold up."""
+    if message.get('type') == 'rows':
+        return (await asyncio.get_running_loop().run_in_executor(None, _dumps, message)).encode()
+    return _dumps(message).encode()
+
+
+def _format_table(rows: list, column_names: list) -> str:
+    return tabulate(rows, headers=column_names, tablefmt="psql")
+
+
+async def send_json(writer, status: int, body: dict, headers: dict = None, keep_alive: bool = True):
+    data = _dumps(body).encode()
+    head = {'Content-Type': 'application/json', 'Content-Length': len(data),
+            'Connection': 'keep-alive' if keep_alive else 'close'}
+    head.update(headers or {})
+    writer.write(_head(status, head) + data)
+    await writer.drain()
+
+
+class WebSocket:
+    """The server side of an RFC 6455 connection carrying JSON text messages."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    @staticmethod
+    def accept_key(key: str) -> str:
+        return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+    async def _frame(self, opcode: int, payload: bytes = b''):
+        length = len(payload)
+        if length < 126:
+            head = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 1 << 16:
+            head = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            head = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        self.writer.write(head + payload)
+        await self.writer.drain()
+
+    async def send(self, message: dict):
+        await self._frame(0x1, await encode(message))
+
+    async def close(self, code: int = 1000, reason: str = ''):
+        if not self.closed:
+            self.closed = True
+            try:
+                await self._frame(0x8, struct.pack('!H', code) + reason.encode()[:120])
+            except ConnectionError:
+                pass
+
+    async def receive(self):
+        """The next text message, or None once the connection is closing."""
+        message = b''
+        while not self.closed:
+            try:
+                first, second = await self.reader.readexactly(2)
+                length = second & 0x7f
+                if length == 126:
+                    length, = struct.unpack('!H', await self.reader.readexactly(2))
+                elif length == 127:
+                    length, = struct.unpack('!Q', await self.reader.readexactly(8))
+                if not second & 0x80:
+                    await self.close(1002, "Client frames must be masked")
+                    return None
+                if length + len(message) > MAX_BODY_BYTES:
+                    await self.close(1009, "Message too big")
+                    return None
+                mask = await self.reader.readexactly(4)
+                payload = await self.reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                return None
+            if length:
+                # XOR the whole payload with the repeated mask at once rather than byte by byte
+                key = (mask * (length // 4 + 1))[:length]
+                payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+            opcode = first & 0x0f
+            if opcode == 0x8:
+                await self.close()
+                return None
+            if opcode == 0x9:
+                await self._frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if first & 0x80:
+                return message.decode('utf-8', errors='replace')
+        return None
+
+
+class ChatDBServer:
+    """
+    Serves translation and query execution to many clients from one process.
+    Queries share one connection pool through AsyncChatDB, and their results are streamed
+    back a batch at a time: as chunked NDJSON over HTTP, or as messages over a WebSocket.
+    Statements aren't pinned to a connection across requests, so the pool resets each
+    session when its connection is returned, and no transaction or setting reaches another client.
+    Translation runs on a pool of worker processes, each with the server's schema.
+    Every client has a session (its history and last translation, one statement at a time)
+    and is rate limited per session. Unless allow_writes, only plain reads are run, on a
+    read-only chatDB whose connections the database itself keeps from writing.
+
+    HTTP endpoints (JSON bodies; the session id goes in an X-Session header or ?session=):
+        POST /session                      start a session
+        GET /session, DELETE /session      show or end it
+        POST /translate {"question"}       translate, remembering the result for /query
+        POST /query {"sql", "params"}      run SQL, or {"question"} to translate and run it,
+                                           or {} to run the last translation; "format": "table"
+                                           streams formatted tables instead of rows
+        GET /stats, GET /health
+    GET /ws opens a WebSocket taking {"id", "type": "translate" | "query" | "execute" | "session"}
+    messages with the same fields; every reply carries the message's id.
+    """
+
+    def __init__(self, db=None, translate_workers: int = TRANSLATE_WORKERS, rate: float = RATE_PER_SECOND,
+                 burst: int = RATE_BURST, allow_writes: bool = False, batch_size: int = connect.STREAM_BATCH_SIZE,
+                 buffer_rows: int = STREAM_BUFFER_ROWS):
+        if db is None:
+            db = connect.chatDB(read_only=not allow_writes, reset_sessions=True)
+        elif not allow_writes and not db.read_only:
+            raise ValueError("A server that doesn't allow writes needs a chatDB(read_only=True)")
+        elif not db.reset_sessions:
+            raise ValueError("A server needs a chatDB(reset_sessions=True), since clients share its connections")
+        self.db = db
+        self.adb = asyncdb.AsyncChatDB(self.db)
+        self.allow_writes = allow_writes
+        self.batch_size = batch_size
+        self.buffer_rows = buffer_rows
+        self.sessions = SessionStore()
+        self.limiter = RateLimiter(rate, burst)
+        # New sessions are limited per client address, since creating them is free
+        self.session_limiter = RateLimiter(rate, burst)
+        self.requests = 0
+        self.streams = 0
+        schema_cache = None
+        if schema.use_database_schema(self.db):
+            schema_cache = schema.SCHEMA_CACHE_PATH
+        self._translators = None
+        if translate_workers:
+            # Workers are started fresh rather than forked from a process already running threads
+            self._translators = ProcessPoolExecutor(max_workers=translate_workers,
+                                                    mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=_init_worker, initargs=(schema_cache,))
+        self._server = None
+
+    async def start(self, host: str = HOST, port: int = PORT):
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        return self._server
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._translators is not None:
+            self._translators.shutdown(wait=True, cancel_futures=True)
+        await asyncio.get_running_loop().run_in_executor(None, self.adb.close)
+
+    def stats(self) -> dict:
+        return {
+            'sessions': len(self.sessions),
+            'requests': self.requests,
+            'streams': self.streams,
+            'rate_limited': self.limiter.limited + self.session_limiter.limited,
+            'queries': self.db.query_stats(),
+            'cache': self.db.cache_stats()
+        }
+
+    async def translate(self, session: Session, question: str) -> dict:
+        loop = asyncio.get_running_loop()
+        success, result, params = await loop.run_in_executor(self._translators, translate_question, question)
+        if not success:
+            return {'type': 'translation', 'success': False, 'error': result}
+        session.translation = (result, tuple(params))
+        return {'type': 'translation', 'success': True, 'sql': natural.inline_params(result, params),
+                'template': result, 'params': list(params)}
+
+    async def run(self, session: Session, sql: str, params: tuple = None, origin: str = 'repl',
+                  table: bool = False):
+        """
+        Run sql for session, yielding a 'columns' message, 'rows' (or 'table') messages as
+        batches arrive, then 'done'; or an 'error' message. The cost guard may add a
+        'warning' or a LIMIT first.
+        """
+        if not self.allow_writes and not cache.is_plain_read(sql):
+            yield {'type': 'error', 'error': "This server only runs read statements (SELECT, SHOW, DESCRIBE, ...), "
+                                            "without INTO or locking clauses"}
+            return
+        async with session.lock:
+            session.queries += 1
+            entry = {'time': time.time(), 'origin': origin, 'sql': sql, 'params': list(params or ()), 'rows': 0}
+            session.history.append(entry)
+            metrics = self.db.query_metrics
+            timer = metrics.start(sql, params, origin) if metrics is not None else None
+            self.streams += 1
+            try:
+                guard = self.db.cost_guard
+                if guard is not None and guard.applies(sql, origin):
+                    decision = await self.adb.check_cost(sql, params)
+                    if timer is not None:
+                        timer.guard = decision.action
+                        timer.estimated_rows = decision.returned
+                    if decision.warning:
+                        yield {'type': 'warning', 'warning': decision.warning}
+                    if decision.action == 'limit':
+                        sql = decision.query
+                        yield {'type': 'warning', 'warning': f"Only the first {decision.limit} rows are sent, "
+                                                            f"of about {decision.returned:,.0f}"}
+                loop = asyncio.get_running_loop()
+                started = time.perf_counter()
+                sent_columns = False
+                batches = asyncdb.read_ahead(self.adb.stream(sql, params, self.batch_size, timer=timer),
+                                             max(1, self.buffer_rows // self.batch_size))
+                try:
+                    async for column_names, rows in batches:
+                        if not sent_columns:
+                            sent_columns = True
+                            yield {'type': 'columns', 'columns': column_names}
+                        if rows:
+                            entry['rows'] += len(rows)
+                            if table:
+                                # Formatting a batch takes long enough to stall every other client if done on the loop
+                                text = await loop.run_in_executor(None, _format_table, rows, column_names)
+                                yield {'type': 'table', 'text': text}
+                            else:
+                                yield {'type': 'rows', 'rows': rows}
+                finally:
+                    # When the client went away, stops reading ahead and returns the connection
+                    await batches.aclose()
+                yield {'type': 'done', 'rows': entry['rows'],
+                       'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)}
+            except self.db.backend.Error as err:
+                entry['error'] = str(err)
+                if timer is not None:
+                    timer.error = str(err)
+                yield {'type': 'error', 'error': str(err)}
+            finally:
+                self.streams -= 1
+                if timer is not None:
+                    metrics.record(timer)
+
+    async def _resolve(self, session: Session, body: dict):
+        """(sql, params, origin) a query request asks to run, or an error message dict."""
+        if body.get('sql'):
+            params = body.get('params')
+            if params is not None and (not isinstance(params, list) or
+                                       any(isinstance(value, (list, dict)) for value in params)):
+                return {'type': 'error', 'error': "params must be an array of values"}
+            return str(body['sql']), tuple(params) if params is not None else None, 'repl'
+        if body.get('question'):
+            translation = await self.translate(session, str(body['question']))
+            if not translation['success']:
+                return translation
+        if session.translation is None:
+            return {'type': 'error', 'error': "Nothing to run: send sql, a question, or translate one first"}
+        template, params = session.translation
+        return template, params, 'nl'
+
+    def _session(self, request: Request, create: bool = True) -> Session:
+        session_id = request.headers.get('x-session') or request.query.get('session')
+        if session_id:
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise HTTPError(404, "Unknown or expired session")
+            return session
+        if not create:
+            raise HTTPError(400, "No session given")
+        retry_after = self.session_limiter.acquire(request.peer)
+        if retry_after:
+            raise HTTPError(429, "Too many new sessions", {'Retry-After': max(1, round(retry_after))})
+        return self.sessions.create()
+
+    def _limit(self, session: Session):
+        retry_after = self.limiter.acquire(session.id)
+        if retry_after:
+            raise HTTPError(429, "Too many requests", {'Retry-After': max(1, round(retry_after))})
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        peer = peer[0] if isinstance(peer, tuple) else str(peer)
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader, peer)
+                    if request is None:
+                        break
+                    self.requests += 1
+                    keep_alive = request.keep_alive
+                    if request.path == '/ws':
+                        await self._websocket(request, reader, writer)
+                        break
+                    await self._route(request, writer)
+                except HTTPError as err:
+                    await send_json(writer, err.status, {'error': err.message}, err.headers, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        except Exception as err:
+            print(f"Error handling a request from {peer}: {err!r}", file=sys.stderr)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(self, request: Request, writer):
+        method, path = request.method, request.path
+        if path == '/health' and method == 'GET':
+            await send_json(writer, 200, {'status': 'ok', 'backend': self.db.backend.name if self.db.backend else None})
+        elif path == '/stats' and method == 'GET':
+            await send_json(writer, 200, self.stats())
+        elif path == '/session' and method == 'POST':
+            session = self._session(request)
+            await send_json(writer, 200, {'session': session.id}, {'X-Session': session.id})
+        elif path == '/session' and method == 'GET':
+            await send_json(writer, 200, self._session(request, create=False).describe())
+        elif path == '/session' and method == 'DELETE':
+            session = self._session(request, create=False)
+            self.sessions.remove(session.id)
+            self.limiter.forget(session.id)
+            await send_json(writer, 200, {'session': session.id, 'closed': True})
+        elif path == '/translate' and method == 'POST':
+            session = self._session(request)
+            self._limit(session)
+            body = request.json()
+            if not body.get('question'):
+                raise HTTPError(400, "Missing question")
+            result = await self.translate(session, str(body['question']))
+            await send_json(writer, 200, dict(result, session=session.id), {'X-Session': session.id})
+        elif path == '/query' and method == 'POST':
+            session = self._session(request)
+            self._limit(session)
+            body = request.json()
+            resolved = await self._resolve(session, body)
+            if isinstance(resolved, dict):
+                await send_json(writer, 400, dict(resolved, session=session.id), {'X-Session': session.id})
+                return
+            await self._stream_response(writer, session, self.run(session, *resolved, table=body.get('format') == 'table'))
+        elif path in ('/health', '/stats', '/session', '/translate', '/query'):
+            raise HTTPError(405, f"{method} is not supported on {path}")
+        else:
+            raise HTTPError(404, f"No such endpoint: {path}")
+
+    async def _stream_response(self, writer, session: Session, messages):
+        """Send messages as newline-delimited JSON in chunks, each written as soon as it is ready."""
+        writer.write(_head(200, {'Content-Type': 'application/x-ndjson', 'Transfer-Encoding': 'chunked',
+                                 'X-Session': session.id, 'Connection': 'keep-alive'}))
+        try:
+            async for message in messages:
+                data = await encode(message) + b'\n'
+                writer.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+                # Waiting for the client bounds what is buffered for it to buffer_rows
+                await writer.drain()
+        finally:
+            # Closing the generator early (the client went away) returns its connection to the pool
+            await messages.aclose()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _websocket(self, request: Request, reader, writer):
+        key = request.headers.get('sec-websocket-key')
+        if 'websocket' not in request.headers.get('upgrade', '').lower() or not key:
+            raise HTTPError(400, "Expected a WebSocket upgrade")
+        session = self._session(request)
+        writer.write(_head(101, {'Upgrade': 'websocket', 'Connection': 'Upgrade',
+                                 'Sec-WebSocket-Accept': WebSocket.accept_key(key)}))
+        await writer.drain()
+        socket = WebSocket(reader, writer)
+        await socket.send({'type': 'session', 'session': session.id})
+        while True:
+            text = await socket.receive()
+            if text is None:
+                break
+            try:
+                message = json.loads(text)
+                if not isinstance(message, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as err:
+                await socket.send({'type': 'error', 'error': f"Invalid JSON: {err}"})
+                continue
+            reply = {'id': message.get('id')}
+            retry_after = self.limiter.acquire(session.id)
+            if retry_after:
+                await socket.send(dict(reply, type='error', error="Too many requests", retry_after=retry_after))
+                continue
+            kind = message.get('type')
+            if kind == 'translate':
+                result = await self.translate(session, str(message.get('question', '')))
+                await socket.send(dict(reply, **result))
+            elif kind in ('query', 'execute'):
+                resolved = await self._resolve(session, message if kind == 'query' else {})
+                if isinstance(resolved, dict):
+                    await socket.send(dict(reply, **resolved))
+                    continue
+                messages = self.run(session, *resolved, table=message.get('format') == 'table')
+                try:
+                    async for result in messages:
+                        await socket.send(dict(reply, **result))
+                finally:
+                    await messages.aclose()
+            elif kind == 'session':
+                await socket.send(dict(reply, type='session', **session.describe()))
+            else:
+                await socket.send(dict(reply, type='error', error=f"Unknown message type: {kind}"))
+        await socket.close()
+
+
+async def serve(host: str = HOST, port: int = PORT, **options):
+    server = ChatDBServer(**options)
+    listener = await server.start(host, port)
+    addresses = ', '.join(f"http://{socket.getsockname()[0]}:{socket.getsockname()[1]}" for socket in listener.sockets)
+    print(f"Serving ChatDB on {addresses}", file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ChatDB translation and queries over HTTP and WebSocket.")
+    parser.add_argument('--host', default=HOST, help=f"address to listen on (default {HOST})")
+    parser.add_argument('--port', type=int, default=PORT, help=f"port to listen on (default {PORT})")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'],
+                        help="database to use (default: CHATDB_BACKEND, else mysql); sqlite needs no server")
+    parser.add_argument('-w', '--workers', type=int, default=TRANSLATE_WORKERS,
+                        help="translation worker processes (0 translates in the server process)")
+    parser.add_argument('--rate', type=float, default=RATE_PER_SECOND, help="requests per second per session")
+    parser.add_argument('--burst', type=int, default=RATE_BURST, help="requests a session may make at once")
+    parser.add_argument('--allow-writes', action='store_true', help="run INSERT, UPDATE, DDL, ... too, not only reads")
+    args = parser.parse_args(argv)
+    if args.backend:
+        connect.set_backend(args.backend)
+    db = connect.chatDB(read_only=not args.allow_writes, reset_sessions=True)
+    if db.pool is None:
+        return 1
+    try:
+        asyncio.run(serve(args.host, args.port, db=db, translate_workers=args.workers, rate=args.rate,
+                          burst=args.burst, allow_writes=args.allow_writes))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
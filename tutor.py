@@ -1,17 +1,168 @@
+import cache
 import chatDB
 import connect
+import metrics
 import natural
+import schema
+import sys
 import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+# Tables offered for browsing page by page after the sample data
+BROWSE_TABLES = {'1': 'Players', '2': 'Teams', '3': 'Games'}
+
+# The fixed queries behind each exploration option and lesson, prefetched in the background so
+# their results are ready by the time the text before them has finished animating
+EXPLORATION_QUERIES = {
+    '1': ['DESCRIBE Players', 'DESCRIBE Teams', 'DESCRIBE Games'],
+    '2': ['SELECT * FROM Players LIMIT 5', 'SELECT * FROM Teams LIMIT 5', 'SELECT * FROM Games LIMIT 5']
+}
+
+LESSON_QUERIES = {
+    '1': ['SELECT FirstName, LastName, Height_cm FROM Players LIMIT 5',
+          """
+SELECT 
+    FirstName as 'First Name',
+    LastName as 'Last Name',
+    PointsPerGame as 'PPG'
+FROM Players 
+LIMIT 3"""],
+    '2': ["""
+SELECT FirstName, LastName, PointsPerGame 
+FROM Players 
+WHERE PointsPerGame > 25"""],
+    '3': ["""
+SELECT p.FirstName, p.LastName, t.TeamName 
+FROM Players p
+JOIN Teams t ON p.TeamID = t.TeamID
+LIMIT 5"""],
+    '4': ["""
+SELECT 
+    TeamID,
+    COUNT(*) as PlayerCount,
+    AVG(PointsPerGame) as AvgPoints
+FROM Players
+GROUP BY TeamID
+LIMIT 5"""],
+    '5': ["""
+SELECT 
+    TeamID,
+    COUNT(*) as PlayerCount,
+    AVG(PointsPerGame) as AvgPoints
+FROM Players
+GROUP BY TeamID
+HAVING AVG(PointsPerGame) > 20"""]
+}
 
 
 class SQLLearningSystem:
-    def __init__(self):
+    def __init__(self, fast: bool = None, input_func=input, db=None, prefetch: bool = True):
         self.current_menu = "main"
         self.previous_menus = []
-        self.db = connect.chatDB()
+        self.db = db if db is not None else connect.chatDB()
+        # Translate against the live schema when it can be read, the built-in one otherwise
+        schema.use_database_schema(self.db)
+        # Fast mode renders each screen as one block with no animation or pauses
+        self.fast = chatDB.FAST_MODE if fast is None else fast
+        self.input_func = input_func
+        self._screen = []
+        # query -> (Future of its formatted result, messages it printed), run on one background connection
+        self._prefetched = {}
+        self._prefetcher = None
+        if prefetch and self.db.pool is not None:
+            self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tutor-prefetch')
+            self.prefetch(EXPLORATION_QUERIES)
+            self.prefetch(LESSON_QUERIES)
+
+    def prefetch(self, queries: dict):
+        """Start running a menu's fixed queries in the background, unless already under way"""
+        if self._prefetcher is None:
+            return
+        for option_queries in queries.values():
+            for query in option_queries:
+                if query not in self._prefetched:
+                    # Errors are kept for when the result is shown, not printed over the prompt
+                    messages = []
+                    future = self._prefetcher.submit(self.db.execute_query, query, origin='lesson',
+                                                     output_func=messages.append)
+                    self._prefetched[query] = (future, messages)
+
+    def browse(self, query: str):
+        """Show the result of query a page at a time, moving with next and prev"""
+        pager = self.db.paginate(query)
+        page = pager.first()
+        while page is not None:
+            self.show(page)
+            while True:
+                choice = self.ask("\n\033[1;32m[N]ext [P]rev [B]ack: \033[0m").lower().strip()
+                if choice in ('b', 'back', 'exit', ''):
+                    return
+                if choice in ('n', 'next'):
+                    if pager.has_next:
+                        page = pager.next()
+                        break
+                    self.show("\033[1;33mThis is the last page.\033[0m")
+                elif choice in ('p', 'prev'):
+                    if pager.has_prev:
+                        page = pager.prev()
+                        break
+                    self.show("\033[1;33mThis is the first page.\033[0m")
+
+    def discard_prefetched(self):
+        for future, _ in self._prefetched.values():
+            future.cancel()
+        self._prefetched = {}
+
+    def run_query(self, query: str):
+        """
+        Result of one of the tutor's fixed queries, waiting for its prefetch if one is running.
+        Each prefetch is used once; it leaves the result in the shared result cache, which
+        keeps it up to date, for later visits.
+        """
+        prefetched = self._prefetched.pop(query, None)
+        if prefetched is not None:
+            future, messages = prefetched
+            try:
+                result = future.result()
+            except CancelledError:
+                pass
+            else:
+                for message in messages:
+                    self.show(message)
+                return result
+        return self.db.execute_query(query, origin='lesson', output_func=self.show)
+
+    def show(self, *values, end: str = '\n'):
+        """Print values, or buffer them until the next prompt in fast mode"""
+        text = ' '.join(str(value) for value in values) + end
+        if self.fast:
+            self._screen.append(text)
+        else:
+            print(text, end='', flush=True)
+
+    def flush_screen(self):
+        """Write out the buffered screen in a single block"""
+        if self._screen:
+            sys.stdout.write(''.join(self._screen))
+            sys.stdout.flush()
+            self._screen = []
+
+    def ask(self, prompt: str = '') -> str:
+        """Show the current screen and read the user's answer"""
+        self.flush_screen()
+        return self.input_func(prompt)
+
+    def pause(self, seconds: float):
+        """Sleep for dramatic effect, skipped in fast mode"""
+        if not self.fast:
+            time.sleep(seconds)
 
     def display_with_delay(self, text: str, delay: float = 0.03, color: str = '\033[1;37m'):
         """Display text progressively with delay and color"""
+        if self.fast:
+            self.show(f"{color}{text}\033[0m")
+            return
         print(color, end='')
         for char in text:
             print(char, end='', flush=True)
@@ -20,29 +171,30 @@ class SQLLearningSystem:
 
     def display_menu_item(self, text: str, color: str = '\033[1;33m'):
         """Display a menu item with color"""
-        print(f"{color}{text}\033[0m")
-        time.sleep(0.1)
+        self.show(f"{color}{text}\033[0m")
+        self.pause(0.1)
 
     def display_menu_header(self, text: str):
         """Display a menu header with formatting"""
         # Display the top bar quickly
-        print("\n", end='')
+        self.show("\n", end='')
         self.display_with_delay("=" * 30, delay=0.005)  # Faster delay for the bar
         # Display the header text
         self.display_with_delay(text, delay=0.01, color='\033[1;36m')  # Slightly faster for the header
         # Display the bottom bar quickly
         self.display_with_delay("=" * 30, delay=0.005)  # Faster delay for the bar
-        time.sleep(0.2)  # Adjusted sleep time for smoother experience
+        self.pause(0.2)  # Adjusted sleep time for smoother experience
 
     def database_exploration_menu(self):
         while True:
+            self.prefetch(EXPLORATION_QUERIES)
             self.display_menu_header("Database Exploration Options")
 
             self.display_menu_item("1. View Tables Schema")
             self.display_menu_item("2. View Sample Data")
             self.display_menu_item("\n[B] Back [M] Main Menu [Q] Quit", '\033[1;35m')
 
-            choice = input("\n\033[1;32mEnter your choice: \033[0m").lower()
+            choice = self.ask("\n\033[1;32mEnter your choice: \033[0m").lower()
 
             if choice == 'b':
                 return 'back'
@@ -54,35 +206,38 @@ class SQLLearningSystem:
                 self.display_menu_header("Tables in the Database")
 
                 self.display_with_delay("1. Players Table Schema:", color='\033[1;33m', delay=0.005)
-                print(self.db.execute_query('DESCRIBE Players'))
-                time.sleep(0.5)
+                self.show(self.run_query(EXPLORATION_QUERIES['1'][0]))
+                self.pause(0.5)
 
                 self.display_with_delay("2. Teams Table Schema:", color='\033[1;33m', delay=0.005)
-                print(self.db.execute_query('DESCRIBE Teams'))
-                time.sleep(0.5)
+                self.show(self.run_query(EXPLORATION_QUERIES['1'][1]))
+                self.pause(0.5)
 
                 self.display_with_delay("3. Games Table Schema:", color='\033[1;33m', delay=0.005)
-                print(self.db.execute_query('DESCRIBE Games'))
-                time.sleep(0.5)
+                self.show(self.run_query(EXPLORATION_QUERIES['1'][2]))
+                self.pause(0.5)
 
-                input("\n\033[1;32mPress Enter to continue...\033[0m")
+                self.ask("\n\033[1;32mPress Enter to continue...\033[0m")
 
             elif choice == '2':
                 self.display_menu_header("Sample Data from Tables")
 
                 self.display_with_delay("1. Players Sample Data:", color='\033[1;33m', delay=0.005)
-                print(self.db.execute_query('SELECT * FROM Players LIMIT 5'))
-                time.sleep(0.5)
+                self.show(self.run_query(EXPLORATION_QUERIES['2'][0]))
+                self.pause(0.5)
 
                 self.display_with_delay("2. Teams Sample Data:", color='\033[1;33m', delay=0.005)
-                print(self.db.execute_query('SELECT * FROM Teams LIMIT 5'))
-                time.sleep(0.5)
+                self.show(self.run_query(EXPLORATION_QUERIES['2'][1]))
+                self.pause(0.5)
 
                 self.display_with_delay("3. Games Sample Data:", color='\033[1;33m', delay=0.005)
-                print(self.db.execute_query('SELECT * FROM Games LIMIT 5'))
-                time.sleep(0.5)
+                self.show(self.run_query(EXPLORATION_QUERIES['2'][2]))
+                self.pause(0.5)
 
-                input("\n\033[1;32mPress Enter to continue...\033[0m")
+                table = self.ask("\n\033[1;32mBrowse a whole table page by page? [1] Players [2] Teams [3] Games, "
+                                 "or Enter to continue: \033[0m").strip()
+                if table in BROWSE_TABLES:
+                    self.browse(f"SELECT * FROM {BROWSE_TABLES[table]}")
 
     def inter_learning(self, command_type: str):
         while True:
@@ -92,7 +247,7 @@ class SQLLearningSystem:
             self.display_menu_item("2. Natural Language Coding")
             self.display_menu_item("\n[B] Back [M] Main Menu [Q] Quit", '\033[1;35m')
 
-            choice = input("\n\033[1;32mEnter your choice: \033[0m").lower()
+            choice = self.ask("\n\033[1;32mEnter your choice: \033[0m").lower()
 
             if choice == 'b':
                 return 'back'
@@ -105,10 +260,21 @@ class SQLLearningSystem:
                 self.display_with_delay("\nYour SQL code will be processed by the MySQL compiler directly",
                                         color='\033[1;36m', delay=0.005)
                 while True:
-                    user_input = input("\n\033[1;32mPlease enter your SQL query (or 'exit' to quit):\n\033[0m")
+                    user_input = self.ask("\n\033[1;32mPlease enter your SQL query ('page <query>' to browse the "
+                                          "result, 'stats' for query timings, 'exit' to quit):\n\033[0m")
                     if user_input.lower() == 'exit':
                         break
-                    print(self.db.execute_query(user_input))
+                    if user_input.lower().startswith('page '):
+                        self.browse(user_input[5:])
+                        continue
+                    if user_input.lower() == 'stats':
+                        stats = self.db.query_stats()
+                        self.show(metrics.format_snapshot(stats) if stats else "Query metrics are turned off")
+                        continue
+                    self.show(self.db.execute_query(user_input, origin='repl', output_func=self.show))
+                    if cache.statement_kind(user_input) not in cache.READ_STATEMENTS:
+                        # Prefetched results may predate this change
+                        self.discard_prefetched()
 
             if choice == '2':
                 self.display_menu_header("Natural Language to SQL Query Converter")
@@ -147,13 +313,15 @@ class SQLLearningSystem:
 
                 for example in examples:
                     self.display_with_delay(example, delay=0.002)
-                    time.sleep(0.05)
+                    self.pause(0.05)
 
-                print()  # Add a blank line
-                natural.prompt_natural()
+                self.show()  # Add a blank line
+                self.flush_screen()
+                natural.prompt_natural(self.db, self.input_func)
 
     def sql_learning_menu(self):
         while True:
+            self.prefetch(LESSON_QUERIES)
             self.display_menu_header("SQL Learning Options")
 
             self.display_menu_item("1. Basic SELECT statements")
@@ -163,7 +331,7 @@ class SQLLearningSystem:
             self.display_menu_item("5. GROUP BY and HAVING")
             self.display_menu_item("\n[B] Back [M] Main Menu [Q] Quit", '\033[1;35m')
 
-            choice = input("\n\033[1;32mEnter your choice: \033[0m").lower()
+            choice = self.ask("\n\033[1;32mEnter your choice: \033[0m").lower()
 
             if choice == 'b':
                 return 'back'
@@ -173,8 +341,8 @@ class SQLLearningSystem:
                 return 'quit'
 
             elif choice == '1':
-                print('\n\033[1;34m=== SELECT Statement ===\033[0m')
-                time.sleep(0.3)
+                self.show('\n\033[1;34m=== SELECT Statement ===\033[0m')
+                self.pause(0.3)
                 self.display_with_delay('\n[GENERAL EXPLANATION]', color='\033[1;37m', delay=0.005)
                 explanations = [
                     'The SELECT command is the fundamental query for retrieving data from a database.',
@@ -183,7 +351,7 @@ class SQLLearningSystem:
                 ]
                 for line in explanations:
                     self.display_with_delay(line, delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\n[Key Components]:', color='\033[1;33m', delay=0.005)
                 components = [
@@ -194,34 +362,28 @@ class SQLLearningSystem:
                 ]
                 for component in components:
                     self.display_with_delay(component, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(0.3)
+                    self.pause(0.1)
+                self.pause(0.3)
 
                 self.display_with_delay('\nExample 1: Basic SELECT', color='\033[1;33m', delay=0.005)
-                sample_command = 'SELECT FirstName, LastName, Height_cm FROM Players LIMIT 5'
+                sample_command = LESSON_QUERIES['1'][0]
                 self.display_with_delay(f'\nCommand: {sample_command}', color='\033[1;36m', delay=0.005)
                 self.display_with_delay('This command selects specific columns from the Players table.', delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\nResults:', color='\033[1;32m', delay=0.005)
-                print(self.db.execute_query(sample_command))
-                time.sleep(0.5)
+                self.show(self.run_query(sample_command))
+                self.pause(0.5)
 
                 self.display_with_delay('\nExample 2: SELECT with Column Aliases', color='\033[1;33m', delay=0.005)
-                sample_command2 = """
-SELECT 
-    FirstName as 'First Name',
-    LastName as 'Last Name',
-    PointsPerGame as 'PPG'
-FROM Players 
-LIMIT 3"""
+                sample_command2 = LESSON_QUERIES['1'][1]
                 self.display_with_delay(f'\nCommand: {sample_command2.strip()}', color='\033[1;36m', delay=0.005)
                 self.display_with_delay('This example shows how to rename columns in the output using aliases.', delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\nResults:', color='\033[1;32m', delay=0.005)
-                print(self.db.execute_query(sample_command2))
-                time.sleep(0.5)
+                self.show(self.run_query(sample_command2))
+                self.pause(0.5)
 
                 self.display_with_delay('\n[Common Mistakes to Avoid]:', color='\033[1;31m', delay=0.005)
                 mistakes = [
@@ -231,14 +393,14 @@ LIMIT 3"""
                 ]
                 for mistake in mistakes:
                     self.display_with_delay(mistake, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(1)
+                    self.pause(0.1)
+                self.pause(1)
 
                 self.inter_learning('SELECT')
 
             elif choice == '2':
-                print('\n\033[1;34m=== WHERE Clause ===\033[0m')
-                time.sleep(0.3)
+                self.show('\n\033[1;34m=== WHERE Clause ===\033[0m')
+                self.pause(0.3)
                 self.display_with_delay('\n[GENERAL EXPLANATION]', color='\033[1;37m', delay=0.005)
                 explanations = [
                     'The WHERE clause filters the result set based on specified conditions.',
@@ -247,7 +409,7 @@ LIMIT 3"""
                 ]
                 for line in explanations:
                     self.display_with_delay(line, delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\n[Key Components]:', color='\033[1;33m', delay=0.005)
                 components = [
@@ -258,21 +420,18 @@ LIMIT 3"""
                 ]
                 for component in components:
                     self.display_with_delay(component, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(0.3)
+                    self.pause(0.1)
+                self.pause(0.3)
 
                 self.display_with_delay('\nExample 1: Simple WHERE clause', color='\033[1;33m', delay=0.005)
-                sample_command = """
-SELECT FirstName, LastName, PointsPerGame 
-FROM Players 
-WHERE PointsPerGame > 25"""
+                sample_command = LESSON_QUERIES['2'][0]
                 self.display_with_delay(f'\nCommand: {sample_command.strip()}', color='\033[1;36m', delay=0.005)
                 self.display_with_delay('This finds all high-scoring players (>25 points per game).', delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\nResults:', color='\033[1;32m', delay=0.005)
-                print(self.db.execute_query(sample_command))
-                time.sleep(0.5)
+                self.show(self.run_query(sample_command))
+                self.pause(0.5)
 
                 self.display_with_delay('\n[Common Mistakes to Avoid]:', color='\033[1;31m', delay=0.005)
                 mistakes = [
@@ -282,14 +441,14 @@ WHERE PointsPerGame > 25"""
                 ]
                 for mistake in mistakes:
                     self.display_with_delay(mistake, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(1)
+                    self.pause(0.1)
+                self.pause(1)
 
                 self.inter_learning('WHERE')
 
             elif choice == '3':
-                print('\n\033[1;34m=== JOIN Operations ===\033[0m')
-                time.sleep(0.3)
+                self.show('\n\033[1;34m=== JOIN Operations ===\033[0m')
+                self.pause(0.3)
                 self.display_with_delay('\n[GENERAL EXPLANATION]', color='\033[1;37m', delay=0.005)
                 explanations = [
                     'JOIN operations combine rows from two or more tables based on related columns.',
@@ -298,7 +457,7 @@ WHERE PointsPerGame > 25"""
                 ]
                 for line in explanations:
                     self.display_with_delay(line, delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\n[Key Components]:', color='\033[1;33m', delay=0.005)
                 components = [
@@ -309,22 +468,18 @@ WHERE PointsPerGame > 25"""
                 ]
                 for component in components:
                     self.display_with_delay(component, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(0.3)
+                    self.pause(0.1)
+                self.pause(0.3)
 
                 self.display_with_delay('\nExample 1: Basic INNER JOIN', color='\033[1;33m', delay=0.005)
-                sample_command = """
-SELECT p.FirstName, p.LastName, t.TeamName 
-FROM Players p
-JOIN Teams t ON p.TeamID = t.TeamID
-LIMIT 5"""
+                sample_command = LESSON_QUERIES['3'][0]
                 self.display_with_delay(f'\nCommand: {sample_command.strip()}', color='\033[1;36m', delay=0.005)
                 self.display_with_delay('This joins Players and Teams tables to show which team each player belongs to.', delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\nResults:', color='\033[1;32m', delay=0.005)
-                print(self.db.execute_query(sample_command))
-                time.sleep(0.5)
+                self.show(self.run_query(sample_command))
+                self.pause(0.5)
 
                 self.display_with_delay('\n[Common Mistakes to Avoid]:', color='\033[1;31m', delay=0.005)
                 mistakes = [
@@ -334,14 +489,14 @@ LIMIT 5"""
                 ]
                 for mistake in mistakes:
                     self.display_with_delay(mistake, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(1)
+                    self.pause(0.1)
+                self.pause(1)
 
                 self.inter_learning('JOIN')
 
             elif choice == '4':
-                print('\n\033[1;34m=== GROUP BY and Aggregations ===\033[0m')
-                time.sleep(0.3)
+                self.show('\n\033[1;34m=== GROUP BY and Aggregations ===\033[0m')
+                self.pause(0.3)
                 self.display_with_delay('\n[GENERAL EXPLANATION]', color='\033[1;37m', delay=0.005)
                 explanations = [
                     'GROUP BY groups rows that have the same values in specified columns.',
@@ -350,7 +505,7 @@ LIMIT 5"""
                 ]
                 for line in explanations:
                     self.display_with_delay(line, delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\n[Key Components]:', color='\033[1;33m', delay=0.005)
                 components = [
@@ -361,25 +516,18 @@ LIMIT 5"""
                 ]
                 for component in components:
                     self.display_with_delay(component, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(0.3)
+                    self.pause(0.1)
+                self.pause(0.3)
 
                 self.display_with_delay('\nExample 1: Basic Grouping', color='\033[1;33m', delay=0.005)
-                sample_command = """
-SELECT 
-    TeamID,
-    COUNT(*) as PlayerCount,
-    AVG(PointsPerGame) as AvgPoints
-FROM Players
-GROUP BY TeamID
-LIMIT 5"""
+                sample_command = LESSON_QUERIES['4'][0]
                 self.display_with_delay(f'\nCommand: {sample_command.strip()}', color='\033[1;36m', delay=0.005)
                 self.display_with_delay('This shows basic grouping with multiple aggregate functions.', delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\nResults:', color='\033[1;32m', delay=0.005)
-                print(self.db.execute_query(sample_command))
-                time.sleep(0.5)
+                self.show(self.run_query(sample_command))
+                self.pause(0.5)
 
                 self.display_with_delay('\n[Common Mistakes to Avoid]:', color='\033[1;31m', delay=0.005)
                 mistakes = [
@@ -389,14 +537,14 @@ LIMIT 5"""
                 ]
                 for mistake in mistakes:
                     self.display_with_delay(mistake, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(1)
+                    self.pause(0.1)
+                self.pause(1)
 
                 self.inter_learning('GROUP BY')
 
             elif choice == '5':
-                print('\n\033[1;34m=== GROUP BY with HAVING ===\033[0m')
-                time.sleep(0.3)
+                self.show('\n\033[1;34m=== GROUP BY with HAVING ===\033[0m')
+                self.pause(0.3)
                 self.display_with_delay('\n[GENERAL EXPLANATION]', color='\033[1;37m', delay=0.005)
                 explanations = [
                     'HAVING filters groups created by the GROUP BY clause.',
@@ -406,7 +554,7 @@ LIMIT 5"""
                 ]
                 for line in explanations:
                     self.display_with_delay(line, delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\n[Key Components]:', color='\033[1;33m', delay=0.005)
                 components = [
@@ -417,25 +565,18 @@ LIMIT 5"""
                 ]
                 for component in components:
                     self.display_with_delay(component, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(0.3)
+                    self.pause(0.1)
+                self.pause(0.3)
 
                 self.display_with_delay('\nExample 1: Basic HAVING', color='\033[1;33m', delay=0.005)
-                sample_command = """
-SELECT 
-    TeamID,
-    COUNT(*) as PlayerCount,
-    AVG(PointsPerGame) as AvgPoints
-FROM Players
-GROUP BY TeamID
-HAVING AVG(PointsPerGame) > 20"""
+                sample_command = LESSON_QUERIES['5'][0]
                 self.display_with_delay(f'\nCommand: {sample_command.strip()}', color='\033[1;36m', delay=0.005)
                 self.display_with_delay('This shows teams averaging more than 20 points per player.', delay=0.005)
-                time.sleep(0.3)
+                self.pause(0.3)
 
                 self.display_with_delay('\nResults:', color='\033[1;32m', delay=0.005)
-                print(self.db.execute_query(sample_command))
-                time.sleep(0.5)
+                self.show(self.run_query(sample_command))
+                self.pause(0.5)
 
                 self.display_with_delay('\n[Common Mistakes to Avoid]:', color='\033[1;31m', delay=0.005)
                 mistakes = [
@@ -445,13 +586,13 @@ HAVING AVG(PointsPerGame) > 20"""
                 ]
                 for mistake in mistakes:
                     self.display_with_delay(mistake, delay=0.005)
-                    time.sleep(0.1)
-                time.sleep(1)
+                    self.pause(0.1)
+                self.pause(1)
 
                 self.inter_learning('HAVING')
 
             else:
-                print("\n\033[1;31mInvalid choice. Please try again.\033[0m")
+                self.show("\n\033[1;31mInvalid choice. Please try again.\033[0m")
 
     def main_menu(self):
         while True:
@@ -468,7 +609,7 @@ HAVING AVG(PointsPerGame) > 20"""
             else:
                 self.display_menu_item("\n[Q] Quit", '\033[1;35m')
 
-            choice = input("\n\033[1;32mEnter your choice: \033[0m").lower()
+            choice = self.ask("\n\033[1;32mEnter your choice: \033[0m").lower()
 
             if choice == 'q':
                 return 'quit'
@@ -507,11 +648,83 @@ HAVING AVG(PointsPerGame) > 20"""
         except KeyboardInterrupt:
             self.display_with_delay("\n\nProgram terminated by user. Goodbye!",
                                     color='\033[1;31m', delay=0.005)
+        except EOFError:
+            # End of input (Ctrl-D, or a finished script) ends the session like quitting
+            self.display_with_delay("\nThank you for using the SQL Learning System! Goodbye!",
+                                    color='\033[1;36m', delay=0.005)
         except Exception as e:
             self.display_with_delay(f"\nAn error occurred: {str(e)}", color='\033[1;31m', delay=0.005)
+        finally:
+            self.flush_screen()
+            if self._prefetcher is not None:
+                self._prefetcher.shutdown(wait=False, cancel_futures=True)
 
 
-if __name__ == "__main__":
-    chatDB.print_welcome()
-    learning_system = SQLLearningSystem()
+class ScriptedInput:
+    """Answers the tutor's prompts from a recorded list instead of the keyboard"""
+
+    def __init__(self, answers, echo: bool = True):
+        self._answers = iter(answers)
+        self.echo = echo
+        self.prompts = 0
+
+    def __call__(self, prompt: str = '') -> str:
+        try:
+            answer = next(self._answers)
+        except StopIteration:
+            raise EOFError("end of script")
+        self.prompts += 1
+        if self.echo:
+            sys.stdout.write(f"{prompt}{answer}\n")
+        return answer
+
+
+def run_script(answers, fast: bool = True, echo: bool = True, db=None) -> float:
+    """
+    Drive a whole tutor session through the real menus with a recorded list of
+    menu choices and queries, without a TTY. Returns the elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    learning_system = SQLLearningSystem(fast=fast, input_func=ScriptedInput(answers, echo), db=db)
     learning_system.run()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ChatDB SQL learning system")
+    parser.add_argument('--fast', action='store_true', help="render screens at once, without animation")
+    parser.add_argument('--script', help="file with one recorded answer per line to replay instead of the keyboard")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'],
+                        help="database to use (default: CHATDB_BACKEND, else mysql); sqlite needs no server")
+    parser.add_argument('--slow-query-log', metavar='PATH',
+                        help="append queries slower than CHATDB_SLOW_QUERY_SECONDS (default 1s) to this JSON lines file")
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help="stop queries running longer than this (default: CHATDB_QUERY_TIMEOUT, else 30; 0 for none)")
+    parser.add_argument('--guard', choices=['off', 'warn', 'limit', 'stream'],
+                        help="what to do with SQL estimated to return too many rows (default: CHATDB_GUARD, else limit)")
+    parser.add_argument('--guard-max-rows', type=int, metavar='ROWS',
+                        help="rows a query may be estimated to return before the guard acts (default 10000)")
+    args = parser.parse_args()
+    if args.timeout is not None:
+        connect.QUERY_TIMEOUT_SECONDS = args.timeout
+    if args.guard:
+        connect.COST_GUARD.action = args.guard
+    if args.guard_max_rows is not None:
+        connect.COST_GUARD.max_rows = args.guard_max_rows
+    if args.slow_query_log:
+        connect.QUERY_METRICS.slow_log = args.slow_query_log
+    if args.backend:
+        connect.set_backend(args.backend)
+
+    if args.script:
+        with open(args.script, encoding='utf-8') as script:
+            answers = [line.rstrip('\n') for line in script]
+        elapsed = run_script(answers, fast=args.fast or chatDB.FAST_MODE)
+        print(f"\nScripted session finished in {elapsed:.2f}s", file=sys.stderr)
+    else:
+        fast = args.fast or chatDB.FAST_MODE
+        chatDB.print_welcome(fast)
+        learning_system = SQLLearningSystem(fast=fast)
+        learning_system.run()